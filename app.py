@@ -7,21 +7,279 @@ POST /predict/batch
      - resultats_par_echantillon : Top-3 cultures + confiance pour chaque échantillon
      - top3_global               : Top-3 agrégé sur l'ensemble du lot
      - nb_echantillons           : nombre d'échantillons traités
+
+   Options : ?voisins=k → k plus proches échantillons d'entraînement de chaque
+             échantillon (KD-tree sur points mappés en mémoire, neighbor_index.py)
+             ?explication=true → contributions par feature du Top-3 (chemins de
+             décision de la forêt), latence ajoutée rapportée à part
+
+POST /predict/columns     : même réponse, corps colonnaire (une liste par feature)
+POST /predict/bulk        : fichier NDJSON/CSV → flux Top-3 par ligne
+POST /jobs                : fichier NDJSON/CSV → identifiant de job (scoring en arrière-plan)
+GET  /jobs/{id}           : progression et page de résultats d'un job (persistés dans SQLite)
+POST /predict/zone        : zone agro-écologique + features partielles → Top-3 (index précalculé)
+GET  /health/live         : liveness (processus vivant)
+GET  /health/ready        : readiness (modèle chargé + préchauffé, version, temps de chargement)
+GET  /metrics             : métriques Prometheus (latence par étape, compteurs, RSS)
+/admin/models             : registre multi-versions (rechargement à chaud, canary, shadow)
 """
 
+import time
+
+_T_START = time.perf_counter()   # début des imports : mesure du démarrage à froid
+
+import asyncio
+import functools
 import logging
-from typing import List
+import os
+import sys
+import uuid
+from contextlib import asynccontextmanager
+from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field, field_validator
 
-from batch_processor import predict_batch_top3
+import fast_json
+import metrics
+from batch_coalescer import MicroBatcher
+from batch_processor import (
+    FEATURE_NAMES,
+    RESPONSE_FORMATS,
+    attach_explanations,
+    cache_stats,
+    explain_matrix,
+    format_batch_result,
+    model_error,
+    model_info,
+    predict_proba_matrix,
+    registry,
+    samples_to_matrix,
+)
+from bulk_stream import (
+    BULK_FORMATS,
+    DuplexStreamingResponse,
+    LineTooLong,
+    iter_lines,
+    prefetch,
+    stream_bulk_predictions,
+)
+from inference_pool import InferencePool
+from job_queue import JobNotFound, JobQueue, JobStore, QueueFull, job_view
+from metrics import BATCH_SIZE, SAMPLES, STAGE_SECONDS, stage_timer
+from model_registry import ShadowStats, UnknownVersionError
+from neighbor_index import MAX_K as NEIGHBORS_MAX, get_neighbor_index
+from probability_grid import GRID_METHODS, predict_batch_grid
+from validation import ColumnarValidationError, columns_to_matrix
+from zone_index import get_zone_index, predict_zone
 
 # ─── Configuration ────────────────────────────────────────────────────────────
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Micro-batching inter-requêtes (désactivable avec BATCH_COALESCING=0)
+BATCH_COALESCING = os.getenv("BATCH_COALESCING", "1") != "0"
+BATCH_WINDOW_MS  = float(os.getenv("BATCH_WINDOW_MS", "2"))
+BATCH_MAX_ROWS   = int(os.getenv("BATCH_MAX_ROWS", "512"))
+
+# Pool d'inférence : "thread" ou "process", INFERENCE_WORKERS = nb de cœurs par défaut
+INFERENCE_POOL    = os.getenv("INFERENCE_POOL", "thread")
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0")) or None
+
+# Prédiction en masse : nombre de lignes scorées par appel au modèle, longueur
+# maximale d'une ligne (borne le tampon de lecture si le corps n'a pas de '\n')
+BULK_CHUNK_SIZE     = int(os.getenv("BULK_CHUNK_SIZE", "4096"))
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", str(64 * 1024)))
+
+# Jobs asynchrones (POST /jobs) : répertoire de la base SQLite et des fichiers reçus,
+# jobs exécutés simultanément, jobs en attente acceptés, rétention des jobs terminés,
+# taille maximale d'un fichier reçu
+JOBS_DIR           = os.getenv("JOBS_DIR", "jobs")
+JOBS_WORKERS       = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_MAX_QUEUED    = int(os.getenv("JOBS_MAX_QUEUED", "100"))
+JOBS_RETENTION_H   = float(os.getenv("JOBS_RETENTION_H", "72"))
+JOBS_MAX_UPLOAD_MB = float(os.getenv("JOBS_MAX_UPLOAD_MB", "512"))
+JOBS_PAGE_MAX      = 1000
+
+# Mode approché (?mode=grille) : "interpolation" ou "proche"
+GRID_METHOD = os.getenv("GRID_METHOD", "interpolation")
+if GRID_METHOD not in GRID_METHODS:
+    raise ValueError(f"GRID_METHOD inconnu : '{GRID_METHOD}' (attendu : {GRID_METHODS}).")
+
+# Schéma colonnaire (POST /predict/columns) : nombre maximal d'échantillons par requête
+COLUMNAR_MAX_ROWS = int(os.getenv("COLUMNAR_MAX_ROWS", "10000"))
+
+# Préchauffage : nombre de lots synthétiques passés dans le pipeline complet au démarrage
+WARMUP_BATCHES = int(os.getenv("WARMUP_BATCHES", "3"))
+
+# Administration du registre de modèles : désactivée tant que ADMIN_TOKEN n'est pas défini
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Comparaisons « shadow » simultanées au-delà desquelles un lot n'est pas comparé
+SHADOW_MAX_INFLIGHT = int(os.getenv("SHADOW_MAX_INFLIGHT", "32"))
+
+pool    = InferencePool(kind=INFERENCE_POOL, workers=INFERENCE_WORKERS)
+# Scoring shadow : un seul thread à part, jamais dans le pool ni les lots coalescés du trafic réel
+shadow_pool = InferencePool(kind="thread", workers=1)
+batcher = MicroBatcher(window_ms=BATCH_WINDOW_MS, max_rows=BATCH_MAX_ROWS,
+                       score=pool.predict_proba)
+
+jobs = None             # JobQueue, créée au démarrage (cf. lifespan)
+
+shadow_stats  = ShadowStats()
+_shadow_tasks = set()   # comparaisons en cours (références fortes)
+
+# État de démarrage exposé par /health/ready
+startup = {"ready": False, "erreur": None, "timings_ms": {}, "model": None, "modules_lourds": []}
+_HEAVY_MODULES = ("pandas", "sklearn", "scipy", "matplotlib", "seaborn", "pyarrow")
+
+# Échantillon synthétique (milieu des plages agronomiques) pour le préchauffage
+_WARMUP_SAMPLE = {"N": 90.0, "P": 35.0, "K": 100.0, "temperature": 26.0,
+                  "humidity": 75.0, "ph": 6.2, "rainfall": 1500.0}
+
+
+async def _warm_up():
+    """Lots synthétiques de 1 et 10 échantillons à travers tout le chemin de prédiction."""
+    for i in range(WARMUP_BATCHES):
+        samples = [dict(_WARMUP_SAMPLE, rainfall=1000.0 + 100 * j) for j in range(1 if i % 2 == 0 else 10)]
+        result  = await _score_batch(samples, "verbose")
+        if "error" in result:
+            raise RuntimeError(result["error"])
+    try:
+        # Table des variations par nœud des explications, construite au premier appel
+        await pool.run(explain_matrix, samples_to_matrix([_WARMUP_SAMPLE]), None)
+    except ValueError:
+        pass    # backend sans explications
+
+
+async def _score_batch(samples, response_format: str, version: str = None) -> dict:
+    """
+    Chemin exact de POST /predict/batch (coalescé ou direct) pour une version
+    donnée. Seul `predict_proba` passe par le pool : la mise en forme reste
+    dans ce processus, où sa durée est mesurée.
+
+    `samples` : matrice de features ou liste d'échantillons (cf. samples_to_matrix).
+    """
+    if BATCH_COALESCING:
+        return await batcher.submit(samples, response_format, version)
+    try:
+        X_batch = samples_to_matrix(samples)
+        t0 = time.perf_counter()
+        all_probas, classes = await pool.predict_proba(X_batch, version)
+        STAGE_SECONDS.labels("predict_proba").observe(time.perf_counter() - t0)
+        with stage_timer("top3"):
+            return format_batch_result(all_probas, classes, response_format)
+    except Exception as exc:
+        return model_error(exc)
+
+
+def _maybe_shadow(X_batch, result: dict, version: str, active_ms: float):
+    """
+    Si une candidate est en mode shadow, la score sur le même lot en tâche
+    de fond (hors chemin critique) et compare Top-3 et latence.
+
+    Priorité basse : le lot est scoré sur `shadow_pool` (un thread, sans
+    micro-batching) et n'est pas comparé si le pool d'inférence a du travail
+    en attente, à la soumission comme au démarrage de la comparaison ; sur
+    une machine à un cœur, le shadow ne prend que le temps CPU laissé libre.
+    """
+    routing = registry.routing()
+    candidate = routing["candidate"]
+    if not (routing["shadow"] and candidate) or version != routing["active"]:
+        return
+    if shadow_stats.candidate != candidate:
+        shadow_stats.reset(candidate)
+    if len(_shadow_tasks) >= SHADOW_MAX_INFLIGHT or pool.pending:
+        shadow_stats.skip()
+        return
+
+    async def compare():
+        if pool.pending:
+            shadow_stats.skip()
+            return
+        t0 = time.perf_counter()
+        try:
+            all_probas, classes = await shadow_pool.predict_proba(X_batch, candidate)
+            shadow = format_batch_result(all_probas, classes, "verbose")
+        except Exception as exc:
+            shadow = model_error(exc)
+        shadow_stats.record(result, shadow, active_ms, (time.perf_counter() - t0) * 1000)
+
+    task = asyncio.ensure_future(compare())
+    _shadow_tasks.add(task)
+    task.add_done_callback(_shadow_tasks.discard)
+
+
+def _record_model_load(info: dict):
+    metrics.MODEL_LOAD_SECONDS.labels(info["name"], info["backend"]).set(info["load_s"])
+    metrics.MODEL_BYTES.labels(info["name"], info["backend"]).set(info["model_bytes"])
+
+
+def _start_jobs() -> int:
+    """Ouvre la base des jobs et relance les jobs interrompus ; retourne leur nombre."""
+    global jobs
+    jobs = JobQueue(JobStore(os.path.join(JOBS_DIR, "jobs.sqlite")),
+                    functools.partial(predict_proba_matrix, use_cache=False),
+                    workers=JOBS_WORKERS, chunk_rows=BULK_CHUNK_SIZE, max_queued=JOBS_MAX_QUEUED)
+    return jobs.start(retention_s=JOBS_RETENTION_H * 3600)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timings = startup["timings_ms"]
+    timings["imports"] = round((time.perf_counter() - _T_START) * 1000, 1)
+    # Dépendances lourdes inutiles au service : doivent rester absentes (cf. import_report.py)
+    startup["modules_lourds"] = sorted(m for m in _HEAVY_MODULES if m in sys.modules)
+    try:
+        t0 = time.perf_counter()
+        await asyncio.to_thread(pool.start)      # en mode process : chaque worker charge le bundle
+        startup["model"] = await pool.run(model_info)
+        timings["chargement_modele"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        t0 = time.perf_counter()
+        await _warm_up()
+        timings["prechauffage"] = round((time.perf_counter() - t0) * 1000, 1)
+        startup["ready"] = True
+        metrics.READY.set(1)
+        _record_model_load(startup["model"])
+
+        try:
+            zones = (await asyncio.to_thread(get_zone_index)).zones
+            logger.info("Index des zones chargé : %s", zones)
+        except FileNotFoundError:
+            logger.warning("Index des zones absent : POST /predict/zone indisponible (lancer zone_index.py).")
+        try:
+            neighbors = await asyncio.to_thread(get_neighbor_index)
+            logger.info("Index des voisins chargé : %d points", neighbors.header["n_points"])
+        except FileNotFoundError:
+            logger.warning("Index des voisins absent : option ?voisins indisponible (lancer neighbor_index.py).")
+
+        resumed = await asyncio.to_thread(_start_jobs)
+        if resumed:
+            logger.info("Jobs repris après redémarrage : %d", resumed)
+    except Exception as exc:
+        # Le service reste vivant (liveness) mais n'est pas prêt (readiness = 503)
+        startup["erreur"] = str(exc)
+        logger.error("❌ Démarrage incomplet : %s", exc)
+    timings["total"] = round((time.perf_counter() - _T_START) * 1000, 1)
+    logger.info("Pool d'inférence : %s", pool.info())
+    logger.info("Démarrage à froid (ms) : %s", timings)
+    if startup["modules_lourds"]:
+        logger.warning("Modules lourds importés au démarrage : %s", startup["modules_lourds"])
+
+    yield
+
+    startup["ready"] = False
+    metrics.READY.set(0)
+    if jobs is not None:
+        await asyncio.to_thread(jobs.shutdown)   # le bloc en cours est validé, le reste reprendra
+    pool.shutdown(wait=True)
+    shadow_pool.shutdown(wait=False)
+    logger.info("Pool d'inférence arrêté.")
+
+
 app = FastAPI(
     title="Crop Recommendation API — Top-3 (Afrique sub-saharienne / Cameroun)",
     description=(
@@ -36,6 +294,7 @@ app = FastAPI(
         "name": "Bala Andegue",
         "email": "balaandeguefrancoislionnel@gmail.com",
     },
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -45,6 +304,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 # ─── Schémas Pydantic ─────────────────────────────────────────────────────────
@@ -78,6 +338,42 @@ class BatchRequest(BaseModel):
     )
 
 
+class ColumnarBatchRequest(BaseModel):
+    """
+    Lot colonnaire : une liste de valeurs par feature, toutes de même longueur.
+    Schéma documentaire : le corps est validé par `validation.columns_to_matrix`
+    (contrôles NumPy sur les colonnes entières), pas objet par objet.
+    """
+
+    N: List[float] = Field(..., description="Azote (mg/kg), > 0")
+    P: List[float] = Field(..., description="Phosphore (mg/kg), > 0")
+    K: List[float] = Field(..., description="Potassium (mg/kg), > 0")
+    temperature: List[float] = Field(..., description="Température (°C), -10 à 50")
+    humidity: List[float] = Field(..., description="Humidité relative (%), 0 à 100")
+    ph: List[float] = Field(..., description="pH du sol, 0 à 14")
+    rainfall: List[float] = Field(..., description="Pluviométrie annuelle (mm), > 0")
+
+
+class ZoneQuery(BaseModel):
+    """Zone agro-écologique et, facultativement, une partie des 7 features."""
+
+    zone: str = Field(..., description="Zone agro-écologique (ex. foret_humide, savane).")
+    N: Optional[float] = Field(None, gt=0, description="Azote (mg/kg)")
+    P: Optional[float] = Field(None, gt=0, description="Phosphore (mg/kg)")
+    K: Optional[float] = Field(None, gt=0, description="Potassium (mg/kg)")
+    temperature: Optional[float] = Field(None, description="Température (°C)")
+    humidity: Optional[float] = Field(None, ge=0, le=100, description="Humidité relative (%)")
+    ph: Optional[float] = Field(None, ge=0, le=14, description="pH du sol")
+    rainfall: Optional[float] = Field(None, gt=0, description="Pluviométrie annuelle (mm)")
+
+    @field_validator("temperature")
+    @classmethod
+    def check_temperature(cls, v: Optional[float]) -> Optional[float]:
+        if v is not None and not -10 <= v <= 50:
+            raise ValueError("Température hors plage agricole (-10 °C à 50 °C).")
+        return v
+
+
 # ─── Endpoints ────────────────────────────────────────────────────────────────
 @app.post(
     "/predict/batch",
@@ -87,7 +383,37 @@ class BatchRequest(BaseModel):
         "top3_global : Top-3 agrégé sur le lot."
     ),
 )
-async def predict_batch(request: BatchRequest):
+async def predict_batch(
+    request: BatchRequest,
+    http_request: Request,
+    format: str = Query(
+        "verbose",
+        description=(
+            "verbose (défaut) : Top-3 détaillé par échantillon ; "
+            "compact : tableaux parallèles d'indices de classes et de confiances."
+        ),
+    ),
+    mode: str = Query(
+        "exact",
+        description=(
+            "exact (défaut) : Random Forest complète ; "
+            "grille : lecture dans la grille précalculée, build optionnel (approximation ; "
+            "503 si non construite, 409 si l'accord Top-3 mesuré est sous GRID_MIN_AGREEMENT)."
+        ),
+    ),
+    voisins: int = Query(
+        0, ge=0, le=NEIGHBORS_MAX,
+        description="k > 0 : ajoute les k plus proches échantillons d'entraînement de chaque échantillon.",
+    ),
+    explication: bool = Query(
+        False,
+        description="true : contributions de chaque feature aux cultures du Top-3 (mode exact).",
+    ),
+    x_model_version: Optional[str] = Header(
+        None,
+        description="Version du registre à utiliser (sinon : active, ou candidate selon la fraction de trafic).",
+    ),
+):
     """
     ### Logique
     1. Pour **chaque** échantillon de sol → Top-3 cultures distinctes
@@ -117,26 +443,403 @@ async def predict_batch(request: BatchRequest):
       ]
     }
     ```
+
+    ### Format compact (`?format=compact`)
+    ```json
+    {
+      "classes": ["banane_plantain", "cacao", ...],
+      "indices":    [[10, 0, 3], [10, 0, 1]],
+      "confiances": [[45.3, 30.1, 12.7], [42.9, 27.7, 14.3]],
+      "top3_global": {"indices": [10, 0, 3], "confiances_agregees": [44.1, 28.9, 13.5]},
+      "nb_echantillons": 2
+    }
+    ```
+
+    ### Mode approché (`?mode=grille`)
+    Top-3 lu dans la grille précalculée, en temps constant ; le bloc
+    `approximation` rappelle le taux d'accord mesuré avec la RF exacte sur le
+    jeu de test. La grille est un build optionnel, non versionné
+    (`python probability_grid.py`) : 503 tant qu'elle n'est pas construite.
+    Refusé (409) si l'accord Top-3 mesuré est inférieur à `GRID_MIN_AGREEMENT`
+    (grille par défaut : ≈ 51 %, l'objectif de 0,9 n'est pas atteignable),
+    ou si la grille a été construite pour un autre modèle que celui servi.
+
+    ### Voisins d'entraînement (`?voisins=k`)
+    Chaque échantillon reçoit la liste `voisins` des k profils du dataset
+    d'entraînement les plus proches (features standardisées) :
+    `{"ligne": 812, "culture": "cacao", "distance": 0.214, "features": {...}}`.
+    En format compact : tableau `voisins` parallèle à `indices`.
+
+    ### Explications (`?explication=true`)
+    Chaque culture du Top-3 reçoit `base` (probabilité a priori de la forêt)
+    et `contributions` (points de %, par feature) : base + Σ contributions
+    ≈ confiance. Le bloc `explication.latence_ms` isole le coût ajouté.
+    En format compact : `bases` (n, 3) et `contributions` (n, 3, 7).
+
+    ### Versions du modèle
+    L'en-tête de réponse `X-Model-Version` indique la version du registre
+    ayant servi la requête ; l'en-tête de requête du même nom la force.
     """
+    _check_query(format, mode, explication)
+
+    # Réception du corps + validation pydantic : du début de la requête à l'entrée ici
+    STAGE_SECONDS.labels("validation").observe(time.perf_counter() - http_request.scope["metrics_t0"])
+    version = _choose_version(x_model_version)
+
     logger.info("POST /predict/batch — %d échantillon(s)", len(request.samples))
-    data   = [s.model_dump() for s in request.samples]
-    result = predict_batch_top3(data)
+    # Échantillons validés → matrice float64 préallouée (sans model_dump ni DataFrame)
+    with stage_timer("matrix"):
+        X_batch = samples_to_matrix(request.samples)
+    return await _predict_matrix(X_batch, format, mode, version, "/predict/batch",
+                                 neighbors=voisins, explain=explication)
+
+
+async def _predict_matrix(X_batch, response_format: str, mode: str, version: str,
+                          endpoint: str, fast_verbose: bool = False, neighbors: int = 0,
+                          explain: bool = False):
+    """Scoring + réponse communs à /predict/batch et /predict/columns."""
+    index = _neighbor_index() if neighbors else None
+    BATCH_SIZE.labels(endpoint).observe(len(X_batch))
+    SAMPLES.labels(endpoint, mode).inc(len(X_batch))
+    if mode == "grille":
+        result = await pool.run(predict_batch_grid, X_batch, response_format, GRID_METHOD, version)
+    else:
+        t0 = time.perf_counter()
+        result = await _score_batch(X_batch, response_format, version)
+        if "error" not in result:
+            _maybe_shadow(X_batch, result, version, (time.perf_counter() - t0) * 1000)
 
     if "error" in result:
         logger.error("❌ %s", result["error"])
-        raise HTTPException(status_code=500, detail=result["error"])
+        raise HTTPException(status_code=result.get("status", 500), detail=result["error"])
+
+    if explain:
+        with stage_timer("explanation"):
+            try:
+                explanation = await pool.run(explain_matrix, X_batch, version)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+            attach_explanations(result, explanation, response_format)
 
-    top1 = result["top3_global"][0]["culture"] if result.get("top3_global") else "?"
+    if index is not None:
+        with stage_timer("neighbors"):
+            samples = await asyncio.to_thread(index.nearest_samples, X_batch, neighbors)
+        if response_format == "compact":
+            result["voisins"] = samples
+        else:
+            for entry, nearest in zip(result["resultats_par_echantillon"], samples):
+                entry["voisins"] = nearest
+
+    if response_format == "compact":
+        top1 = result["classes"][result["top3_global"]["indices"][0]]
+        response_class = fast_json.FastJSONResponse
+    else:
+        top1 = result["top3_global"][0]["culture"] if result.get("top3_global") else "?"
+        response_class = fast_json.FastJSONResponse if fast_verbose else JSONResponse
     logger.info("✅ Top-1 global : %s", top1)
+
+    with stage_timer("serialization"):
+        return response_class(result, headers={"X-Model-Version": version})
+
+
+def _check_query(response_format: str, mode: str, explain: bool = False):
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : '{response_format}' (attendu : {list(RESPONSE_FORMATS)}).")
+    if mode not in ("exact", "grille"):
+        raise HTTPException(status_code=400, detail=f"Mode inconnu : '{mode}' (attendu : ['exact', 'grille']).")
+    if explain and mode == "grille":
+        raise HTTPException(status_code=400, detail="Les explications exigent le mode exact (la grille n'a pas de chemins de décision).")
+
+
+def _neighbor_index():
+    """Index des voisins chargé ; 503 s'il manque."""
+    try:
+        return get_neighbor_index()
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Index des voisins introuvable (lancer build_models.py).")
+
+
+def _choose_version(requested: Optional[str]) -> str:
+    try:
+        return registry.choose(requested)
+    except UnknownVersionError:
+        raise HTTPException(status_code=404, detail=f"Version de modèle inconnue : '{requested}'.")
+
+
+@app.post(
+    "/predict/columns",
+    summary="Top-3 cultures — lot au format colonnaire (une liste par feature)",
+    response_description="Même réponse que POST /predict/batch.",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": ColumnarBatchRequest.model_json_schema()}},
+        }
+    },
+)
+async def predict_columns(
+    request: Request,
+    format: str = Query("verbose", description="verbose (défaut) ou compact."),
+    mode: str = Query("exact", description="exact (défaut) ou grille."),
+    voisins: int = Query(0, ge=0, le=NEIGHBORS_MAX, description="k plus proches échantillons d'entraînement."),
+    explication: bool = Query(False, description="Contributions par feature du Top-3 (mode exact)."),
+    x_model_version: Optional[str] = Header(None, description="Version du registre à utiliser."),
+):
+    """
+    ### Entrée
+    ```json
+    {"N": [90, 20], "P": [42, 67], "K": [43, 20], "temperature": [20.8, 25.1],
+     "humidity": [82, 60], "ph": [6.5, 5.8], "rainfall": [1500, 900]}
+    ```
+    Jusqu'à `COLUMNAR_MAX_ROWS` échantillons. Les contrôles de plage de
+    `SoilSample` s'appliquent colonne par colonne (NumPy) ; une erreur 422
+    indique le champ et l'indice de ligne : `"loc": ["body", "ph", 1]`.
+
+    ### Sortie
+    Identique à POST /predict/batch (`format`, `mode`, `voisins`, `explication`, `X-Model-Version`).
+    """
+    _check_query(format, mode, explication)
+    try:
+        columns = fast_json.loads(await request.body())
+        X_batch = columns_to_matrix(columns, COLUMNAR_MAX_ROWS)
+    except ColumnarValidationError as exc:
+        return JSONResponse(status_code=422, content={"detail": exc.detail()})
+    except ValueError as exc:
+        return JSONResponse(status_code=422, content={"detail": [
+            {"loc": ["body"], "msg": f"JSON invalide : {exc}", "type": "json_invalid"}]})
+    # Réception, décodage, construction de la matrice et contrôles de plage
+    STAGE_SECONDS.labels("validation").observe(time.perf_counter() - request.scope["metrics_t0"])
+
+    version = _choose_version(x_model_version)
+    logger.info("POST /predict/columns — %d échantillon(s)", len(X_batch))
+    return await _predict_matrix(X_batch, format, mode, version, "/predict/columns",
+                                 fast_verbose=True, neighbors=voisins, explain=explication)
+
+
+@app.post(
+    "/predict/bulk",
+    summary="Top-3 cultures pour un fichier NDJSON ou CSV de taille quelconque",
+    response_description="Flux NDJSON : une ligne par échantillon, puis le top3_global.",
+)
+async def predict_bulk(
+    request: Request,
+    format: Optional[str] = Query(
+        None,
+        description="ndjson ou csv (déduit du Content-Type si absent).",
+    ),
+):
+    """
+    ### Entrée
+    Corps brut, sans limite de taille :
+    - **NDJSON** : un objet JSON par ligne avec les 7 features ;
+    - **CSV**    : en-tête contenant au moins les 7 features (ordre libre).
+
+    ### Sortie (flux `application/x-ndjson`)
+    ```
+    {"ligne": 1, "top3": [{"rang": 1, "culture": "mais", "confiance": 77.5}, ...]}
+    {"ligne": 2, "erreur": "ph : doit être compris entre 0 et 14"}
+    ...
+    {"top3_global": [...], "nb_echantillons": 99999, "nb_erreurs": 1}
+    ```
+    Le fichier est lu et scoré par blocs de `BULK_CHUNK_SIZE` lignes :
+    les résultats arrivent au fur et à mesure, à mémoire constante. Les
+    lignes ne passent pas par le cache de prédictions. Une ligne de plus de
+    `BULK_MAX_LINE_BYTES` octets est refusée (422 si c'est la première,
+    `{"error": ...}` dans le flux sinon).
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    if fmt not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : '{fmt}' (attendu : {list(BULK_FORMATS)}).")
+
+    try:
+        lines = await prefetch(iter_lines(request.stream(), BULK_MAX_LINE_BYTES))
+    except LineTooLong as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    except UnicodeDecodeError as exc:
+        raise HTTPException(status_code=422, detail=f"Corps non UTF-8 : {exc}")
+
+    logger.info("POST /predict/bulk — format %s, blocs de %d lignes", fmt, BULK_CHUNK_SIZE)
+    score = functools.partial(pool.predict_proba, use_cache=False)
+    return DuplexStreamingResponse(
+        stream_bulk_predictions(lines, fmt, score, BULK_CHUNK_SIZE),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post(
+    "/predict/zone",
+    summary="Top-3 cultures pour une zone agro-écologique et des mesures partielles",
+)
+async def predict_by_zone(
+    query: ZoneQuery,
+    x_model_version: Optional[str] = Header(None, description="Version du registre (vecteur complet seulement)."),
+):
+    """
+    ### Entrée
+    ```json
+    {"zone": "savane", "ph": 6.1, "rainfall": 900}
+    ```
+    Seule `zone` est obligatoire (cf. GET /zones).
+
+    ### Sortie
+    Top-3 lu dans l'index précalculé (`zone_index.py`), sans évaluer la
+    forêt : les features inconnues suivent la distribution de la zone.
+    `valeurs_typiques` donne les quantiles 10/50/90 % de la zone pour les
+    features manquantes ; `hors_distribution` signale les mesures hors de
+    la plage de la zone. Avec les 7 features, le Top-3 vient de la RF exacte.
+    """
+    _zone_index(query.zone)
+    features = query.model_dump(exclude={"zone"}, exclude_none=True)
+    SAMPLES.labels("/predict/zone", "index" if len(features) < len(FEATURE_NAMES) else "exact").inc()
+
+    if len(features) == len(FEATURE_NAMES):
+        version = _choose_version(x_model_version)
+        result  = await _score_batch([features], "verbose", version)
+        if "error" not in result:
+            result = {"zone": query.zone, "features_connues": FEATURE_NAMES,
+                      "top3": result["resultats_par_echantillon"][0]["top3"],
+                      "approximation": None}
+    else:
+        result = predict_zone(query.zone, features)
+
+    if "error" in result:
+        logger.error("❌ %s", result["error"])
+        raise HTTPException(status_code=result.get("status", 500), detail=result["error"])
     return result
 
 
+def _zone_index(zone: str = None):
+    """Index des zones chargé ; 503 s'il manque, 404 si `zone` n'y figure pas."""
+    try:
+        index = get_zone_index()
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Index des zones introuvable (lancer build_models.py).")
+    if zone is not None and zone not in index.zones:
+        raise HTTPException(status_code=404, detail=f"Zone inconnue : '{zone}' (attendu : {index.zones}).")
+    return index
+
+
+@app.get("/zones", tags=["Info"])
+async def zones():
+    """Zones de l'index et distribution de chaque feature par zone."""
+    index = _zone_index()
+    return {"zones": index.zones, "distributions": index.header["distributions"],
+            "model_version": index.header["model_version"]}
+
+
+# ─── Jobs asynchrones ─────────────────────────────────────────────────────────
+def _jobs_queue() -> JobQueue:
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="File de jobs indisponible (service non prêt).")
+    return jobs
+
+
+@app.post("/jobs", status_code=202, tags=["Jobs"],
+          summary="Soumet un fichier NDJSON ou CSV à scorer en arrière-plan")
+async def submit_job(
+    request: Request,
+    format: Optional[str] = Query(None, description="ndjson ou csv (déduit du Content-Type si absent)."),
+    x_model_version: Optional[str] = Header(None, description="Version du registre (figée pour tout le job)."),
+):
+    """
+    Même corps que POST /predict/bulk. Le fichier est écrit sur disque puis
+    la réponse part aussitôt, avec l'identifiant du job :
+    ```
+    {"id": "3f2a…", "statut": "en_attente", "url": "/jobs/3f2a…", ...}
+    ```
+    Le scoring se fait par blocs dans un pool de `JOBS_WORKERS` workers ;
+    suivre l'avancement avec GET /jobs/{id}.
+
+    File pleine : 429 avant lecture du corps. Fichier de plus de
+    `JOBS_MAX_UPLOAD_MB` Mo : 413 (fichier partiel supprimé).
+    """
+    queue = _jobs_queue()
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    if fmt not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : '{fmt}' (attendu : {list(BULK_FORMATS)}).")
+    version = _choose_version(x_model_version)
+
+    try:
+        await asyncio.to_thread(queue.check_capacity)      # avant de recevoir le moindre octet
+    except QueueFull as exc:
+        raise HTTPException(status_code=429, detail=f"File de jobs pleine : {exc}")
+    max_bytes = int(JOBS_MAX_UPLOAD_MB * 1024 * 1024)
+    declared  = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Fichier de plus de {JOBS_MAX_UPLOAD_MB:g} Mo.")
+
+    job_id  = uuid.uuid4().hex
+    uploads = os.path.join(JOBS_DIR, "fichiers")
+    os.makedirs(uploads, exist_ok=True)
+    path = os.path.join(uploads, f"{job_id}.{fmt}")
+    size = 0
+    try:
+        with open(path + ".part", "wb") as f:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Fichier de plus de {JOBS_MAX_UPLOAD_MB:g} Mo.")
+                await asyncio.to_thread(f.write, chunk)
+        if not size:
+            raise HTTPException(status_code=400, detail="Fichier vide.")
+    except BaseException:
+        os.remove(path + ".part")          # upload refusé ou interrompu : pas de fichier orphelin
+        raise
+    os.replace(path + ".part", path)
+
+    try:
+        job = await asyncio.to_thread(queue.submit, path, fmt, version, job_id)
+    except QueueFull as exc:
+        os.remove(path)
+        raise HTTPException(status_code=429, detail=f"File de jobs pleine : {exc}")
+    logger.info("POST /jobs — job %s (%s, %d octets, version %s)", job_id, fmt, size, version)
+    return {**job_view(job), "url": f"/jobs/{job_id}"}
+
+
+@app.get("/jobs/{job_id}", tags=["Jobs"], summary="Progression et page de résultats d'un job")
+async def get_job(
+    job_id: str,
+    offset: int = Query(0, ge=0, description="Rang du premier résultat (ordre du fichier)."),
+    limit: int = Query(100, ge=0, le=JOBS_PAGE_MAX, description="Nombre de résultats (0 : progression seule)."),
+):
+    """
+    Résultats au format de POST /predict/bulk (`{"ligne", "top3"}` ou
+    `{"ligne", "erreur"}`), disponibles au fil de l'eau pendant le scoring ;
+    `top3_global` est renseigné une fois le job terminé.
+    """
+    queue = _jobs_queue()
+
+    def read():
+        job = queue.store.get(job_id)
+        return job, queue.store.results(job_id, offset, limit) if limit else []
+
+    try:
+        job, results = await asyncio.to_thread(read)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"Job inconnu : '{job_id}'.")
+    return job_view(job, results, offset, limit)
+
+
+@app.get("/stats/jobs", tags=["Info"])
+async def jobs_stats():
+    """Workers et nombre de jobs par statut."""
+    return await asyncio.to_thread(_jobs_queue().info)
+
+
 @app.get("/", tags=["Info"])
 async def home():
     return {
         "message":   "Crop Recommendation API — Top-3 (Cameroun / Afrique sub-saharienne)",
         "version":   "2.0",
-        "endpoints": {"POST /predict/batch": "1–10 échantillons → Top-3 par sol + Top-3 global"},
+        "endpoints": {
+            "POST /predict/batch": "1–10 échantillons → Top-3 par sol + Top-3 global (?voisins=k : profils d'entraînement proches, ?explication=true : contributions par feature)",
+            "POST /predict/columns": "Lot colonnaire (une liste par feature) → même réponse que /predict/batch",
+            "POST /predict/bulk":  "Fichier NDJSON/CSV → flux Top-3 par ligne + Top-3 global",
+            "POST /jobs":          "Fichier NDJSON/CSV → job asynchrone (GET /jobs/{id} : progression, résultats)",
+            "POST /predict/zone":  "Zone agro-écologique (+ mesures partielles) → Top-3 (index précalculé)",
+        },
         "features":  ["N (mg/kg)", "P (mg/kg)", "K (mg/kg)", "temperature (°C)",
                       "humidity (%)", "ph", "rainfall (mm)"],
         "cultures":  15,
@@ -144,11 +847,131 @@ async def home():
     }
 
 
+@app.get("/health/live", tags=["Info"])
+async def health_live():
+    """Liveness : le processus répond (indépendamment du modèle)."""
+    return {"status": "alive", "service": "crops-top3-v2"}
+
+
+@app.get("/health/ready", tags=["Info"])
+async def health_ready():
+    """Readiness : modèle chargé et préchauffé ; 503 sinon."""
+    body = {
+        "status":     "ready" if startup["ready"] else "not_ready",
+        "service":    "crops-top3-v2",
+        "model":      startup["model"],
+        "timings_ms": startup["timings_ms"],
+        "modules_lourds": startup["modules_lourds"],
+    }
+    if not startup["ready"]:
+        body["erreur"] = startup["erreur"]
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
 @app.get("/health", tags=["Info"])
 async def health():
+    """Compatibilité : "healthy" seulement si le modèle est prêt (503 sinon)."""
+    if not startup["ready"]:
+        return JSONResponse(status_code=503, content={"status": "starting", "service": "crops-top3-v2"})
     return {"status": "healthy", "service": "crops-top3-v2"}
 
 
+@app.get("/stats/batching", tags=["Info"])
+async def batching_stats():
+    """Statistiques de remplissage du micro-batching inter-requêtes."""
+    return {"actif": BATCH_COALESCING, **batcher.stats(), "pool": pool.info()}
+
+
+@app.get("/metrics", tags=["Info"], response_class=Response)
+async def prometheus_metrics():
+    """
+    Métriques au format texte Prometheus : histogrammes de latence par étape
+    (validation, matrix, predict_proba, top3, serialization),
+    requêtes et échantillons, tailles de lots, chargement du modèle, RSS.
+    """
+    if startup["ready"]:
+        _record_model_load(await pool.run(model_info))
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/stats/cache", tags=["Info"])
+async def prediction_cache_stats():
+    """
+    Compteurs du cache quantifié de prédictions (hits / misses / évictions).
+    En pool "process", chaque worker a son propre cache : les compteurs
+    sont ceux du worker qui répond.
+    """
+    return await pool.run(cache_stats)
+
+
+# ─── Administration du registre de modèles ────────────────────────────────────
+class ModelRegistration(BaseModel):
+    """Fichiers d'une version à ajouter au registre."""
+
+    pickle_path: str = Field(..., description="Chemin du bundle pickle (repli).")
+    artifact_dir: Optional[str] = Field(None, description="Répertoire de l'artefact mappable (prioritaire).")
+
+
+class RoutingUpdate(BaseModel):
+    """Version candidate : fraction du trafic et/ou évaluation shadow."""
+
+    candidate: Optional[str] = Field(None, description="Version candidate (None : aucune).")
+    fraction: float = Field(0.0, ge=0, le=1, description="Fraction du trafic servie par la candidate.")
+    shadow: bool = Field(False, description="Scorer aussi la candidate hors chemin critique et comparer.")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Administration désactivée (ADMIN_TOKEN non défini).")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Jeton d'administration invalide.")
+
+
+async def _admin_call(fn, *args):
+    """Opération du registre (peut charger un modèle) hors de la boucle asyncio."""
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except UnknownVersionError as exc:
+        raise HTTPException(status_code=404, detail=f"Version de modèle inconnue : {exc}.")
+    except (ValueError, FileNotFoundError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/admin/models", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def admin_models():
+    """Versions connues, routage courant et comparaison shadow."""
+    return {**registry.info(), "shadow_stats": shadow_stats.summary()}
+
+
+@app.put("/admin/models/{name}", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def admin_register_model(name: str, body: ModelRegistration):
+    """Ajoute ou remplace une version (chargée et vérifiée avant d'être enregistrée)."""
+    return await _admin_call(registry.register, name, body.pickle_path, body.artifact_dir)
+
+
+@app.post("/admin/models/{name}/activate", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def admin_activate_model(name: str):
+    """Bascule atomique de la version active, sans redémarrage."""
+    await _admin_call(registry.activate, name)
+    logger.info("Version active : %s", name)
+    return registry.routing()
+
+
+@app.delete("/admin/models/{name}", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def admin_unregister_model(name: str):
+    await _admin_call(registry.unregister, name)
+    return registry.routing()
+
+
+@app.put("/admin/routing", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def admin_routing(body: RoutingUpdate):
+    """Fraction de trafic et mode shadow de la version candidate."""
+    await _admin_call(registry.set_candidate, body.candidate, body.fraction, body.shadow)
+    shadow_stats.reset(body.candidate)
+    return registry.routing()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
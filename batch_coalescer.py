@@ -0,0 +1,169 @@
+"""
+batch_coalescer.py — Micro-batching inter-requêtes pour POST /predict/batch
+============================================================================
+Chaque requête ne contient que 1 à 10 échantillons, mais paie le coût fixe
+complet d'un appel à la forêt. Le coalesceur regroupe les échantillons des
+requêtes concurrentes pendant une fenêtre courte (ex. 2 ms) ou jusqu'à un
+nombre maximal de lignes (ex. 512), les score en un seul appel matriciel,
+puis renvoie à chaque requête sa propre tranche :
+   → resultats_par_echantillon / top3_global / nb_echantillons
+
+Les requêtes routées vers des versions différentes du modèle (registre
+multi-versions) partagent la fenêtre mais sont scorées par version.
+
+Les statistiques de remplissage des lots sont exposées via `stats()`.
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+from batch_processor import (
+    format_batch_result,
+    model_error,
+    predict_proba_matrix,
+    samples_to_matrix,
+)
+from metrics import MODEL_CALL_ROWS, STAGE_SECONDS, stage_timer
+
+
+async def _score_inline(X_batch: np.ndarray, version: str = None) -> tuple:
+    """Scoreur par défaut : appel direct (bloquant) du moteur d'inférence."""
+    return predict_proba_matrix(X_batch, version)
+
+
+class MicroBatcher:
+    """
+    Regroupe les lots concurrents en un seul appel `predict_proba`.
+
+    Args:
+        window_ms: durée maximale d'attente après la première requête du lot.
+        max_rows:  nombre de lignes déclenchant un envoi immédiat.
+        score:     coroutine `(X, version) -> (all_probas, classes)` ; par défaut l'appel
+                   direct à `batch_processor.predict_proba_matrix`.
+    """
+
+    def __init__(self, window_ms: float = 2.0, max_rows: int = 512, score=None):
+        if window_ms < 0:
+            raise ValueError("window_ms doit être positif ou nul.")
+        if max_rows < 1:
+            raise ValueError("max_rows doit être supérieur ou égal à 1.")
+        self.window_ms = float(window_ms)
+        self.max_rows  = int(max_rows)
+        self._score    = score or _score_inline
+
+        self._pending      = []      # [(X, future, response_format, version), ...]
+        self._pending_rows = 0
+        self._timer        = None    # asyncio.TimerHandle de la fenêtre en cours
+        self._tasks        = set()   # lots en cours de scoring (références fortes)
+
+        # ── Statistiques de remplissage
+        self._batches      = 0
+        self._requests     = 0
+        self._rows         = 0
+        self._max_seen     = 0
+        self._full_batches = 0       # lots envoyés parce que max_rows atteint
+        self._size_hist    = {}      # borne supérieure (puissance de 2) → nb de lots
+
+    # ── API publique ──────────────────────────────────────────────────────────
+    async def submit(self, samples: list, response_format: str = "verbose",
+                     version: str = None) -> dict:
+        """
+        Ajoute les échantillons d'une requête (liste ou matrice déjà
+        construite, cf. `samples_to_matrix`) au lot courant et attend
+        la réponse correspondant à cette seule requête (scorée par la
+        version `version` du registre, l'active si None).
+        """
+        try:
+            X = samples_to_matrix(samples)
+        except Exception as exc:
+            return model_error(exc)
+
+        loop   = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((X, future, response_format, version))
+        self._pending_rows += len(X)
+
+        if self._pending_rows >= self.max_rows:
+            self._flush(full=True)
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000.0, self._flush)
+
+        return await future
+
+    def stats(self) -> dict:
+        """Statistiques de remplissage des lots depuis le démarrage."""
+        batches = self._batches or 1
+        return {
+            "window_ms":             self.window_ms,
+            "max_rows":              self.max_rows,
+            "lots":                  self._batches,
+            "requetes":              self._requests,
+            "echantillons":          self._rows,
+            "requetes_par_lot":      round(self._requests / batches, 2),
+            "echantillons_par_lot":  round(self._rows / batches, 2),
+            "taux_remplissage":      round(self._rows / (batches * self.max_rows), 4),
+            "lot_max":               self._max_seen,
+            "lots_pleins":           self._full_batches,
+            "histogramme_tailles":   {f"<={k}": v for k, v in sorted(self._size_hist.items())},
+        }
+
+    # ── Interne ───────────────────────────────────────────────────────────────
+    def _flush(self, full: bool = False):
+        """Détache le lot courant et lance son scoring."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        self._record(pending, full)
+        task = asyncio.ensure_future(self._run(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: list):
+        by_version = {}
+        for entry in pending:
+            by_version.setdefault(entry[3], []).append(entry)
+        if len(by_version) == 1:
+            await self._run_version(pending, pending[0][3])
+        else:
+            await asyncio.gather(*(self._run_version(group, version)
+                                   for version, group in by_version.items()))
+
+    async def _run_version(self, pending: list, version: str):
+        X_all = np.vstack([X for X, _, _, _ in pending])
+        MODEL_CALL_ROWS.labels("batch").observe(len(X_all))
+        try:
+            t0 = time.perf_counter()
+            all_probas, classes = await self._score(X_all, version)
+            STAGE_SECONDS.labels("predict_proba").observe(time.perf_counter() - t0)
+        except Exception as exc:
+            error = model_error(exc)
+            for _, future, _, _ in pending:
+                if not future.done():
+                    future.set_result(error)
+            return
+
+        # ── Redistribution des tranches à chaque requête
+        offset = 0
+        for X, future, response_format, _ in pending:
+            n = len(X)
+            if not future.done():   # requête annulée entre-temps
+                with stage_timer("top3"):
+                    result = format_batch_result(all_probas[offset:offset + n], classes, response_format)
+                future.set_result(result)
+            offset += n
+
+    def _record(self, pending: list, full: bool):
+        rows = sum(len(X) for X, _, _, _ in pending)
+        self._batches  += 1
+        self._requests += len(pending)
+        self._rows     += rows
+        self._max_seen  = max(self._max_seen, rows)
+        self._full_batches += int(full)
+        bucket = 1 << max(rows - 1, 0).bit_length()
+        self._size_hist[bucket] = self._size_hist.get(bucket, 0) + 1
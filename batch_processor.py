@@ -8,58 +8,384 @@ Pour l'ensemble du lot :
    → Top-3 agrégées (moyenne des probabilités sur tous les échantillons)
 """
 
-import pickle
+import os
+import time
+from operator import attrgetter, itemgetter
+
 import numpy as np
-import pandas as pd
+
+from metrics import MODEL_PREDICT_SECONDS
+from model_backends import backend_paths
+from model_registry import ModelRegistry, UnknownVersionError
+from prediction_cache import QuantizedLRUCache, parse_resolutions
 
 # ─── Chargement du modèle ────────────────────────────────────────────────────
-_MODEL_PATH = "model/top3_crop_model.pkl"
-_bundle     = None   # chargement paresseux
+# MODEL_BACKEND : backend servi comme version "default" (rf, hgb, knn, linear — model_backends.py).
+# rf : model/top3_crop_model.pkl, avec son artefact mappable prioritaire s'il existe (model_artifact.py).
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "rf")
+_MODEL_PATH, _ARTIFACT_DIR = backend_paths(MODEL_BACKEND)
+_REGISTRY_PATH = "model/registry.json"              # versions servies (model_registry.py)
 
 FEATURE_NAMES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
 
+# Registre multi-versions : version "default" = _MODEL_PATH / _ARTIFACT_DIR.
+# MODEL_REGISTRY_POLL_S : intervalle de détection des changements sur disque.
+registry = ModelRegistry(
+    _MODEL_PATH, _ARTIFACT_DIR, _REGISTRY_PATH,
+    poll_s=float(os.getenv("MODEL_REGISTRY_POLL_S", "2")),
+)
+
+
+def _load_bundle(version: str = None):
+    """
+    Bundle de la version demandée (active par défaut), chargé une seule fois
+    par processus puis rechargé à chaud si ses fichiers changent. Le bundle
+    contient en plus :
+        - `bundle["engine"]`  : la forêt compilée (forest_engine) utilisée pour l'inférence ;
+        - `bundle["version"]` : identifiant du modèle chargé (clé du cache) ;
+        - `bundle["backend"]`, `bundle["model_bytes"]` : type de modèle et empreinte mémoire.
+    """
+    return registry.get(version)
+
+
+def model_info(version: str = None) -> dict:
+    """Charge le modèle si nécessaire et décrit la version servie."""
+    bundle = _load_bundle(version)
+    return {
+        "name":          bundle["name"],
+        "model_version": bundle["version"],
+        "source":        bundle.get("source"),
+        "backend":       bundle["backend"],
+        "model_bytes":   bundle["model_bytes"],
+        "nb_classes":    len(bundle["classes"]),
+        "pid":           os.getpid(),
+        "load_s":        bundle["load_s"],
+        "loaded_at":     bundle["loaded_at"],
+    }
+
+
+# ─── Cache de prédictions ────────────────────────────────────────────────────
+# PREDICTION_CACHE_SIZE=0 désactive le cache. PREDICTION_CACHE_RESOLUTIONS vide (défaut) :
+# clés exactes ; "capteurs" ou "N=1,ph=0.05" : quantification approchée (prediction_cache.py).
+_cache = None
+
+
+def configure_cache(max_entries: int = 50_000, max_mb: float = None,
+                    ttl_s: float = None, resolutions: dict = None):
+    """(Re)configure le cache quantifié ; max_entries=0 le désactive."""
+    global _cache
+    _cache = (QuantizedLRUCache(FEATURE_NAMES, resolutions, max_entries, max_mb, ttl_s)
+              if max_entries > 0 else None)
+    return _cache
+
 
-def _load_bundle():
-    global _bundle
-    if _bundle is None:
-        with open(_MODEL_PATH, "rb") as f:
-            _bundle = pickle.load(f)
-    return _bundle
+# EXPLANATION_CACHE_SIZE=0 désactive le cache des explications (contributions par feature).
+_explain_cache = None
+
+
+def configure_explain_cache(max_entries: int = 10_000, resolutions: dict = None):
+    """(Re)configure le cache quantifié des contributions ; max_entries=0 le désactive."""
+    global _explain_cache
+    _explain_cache = (QuantizedLRUCache(FEATURE_NAMES, resolutions, max_entries)
+                      if max_entries > 0 else None)
+    return _explain_cache
+
+
+def cache_stats() -> dict:
+    stats = {"actif": False} if _cache is None else {"actif": True, **_cache.stats()}
+    stats["explications"] = ({"actif": False} if _explain_cache is None
+                             else {"actif": True, **_explain_cache.stats()})
+    return stats
+
+
+def _on_bundle_replaced(bundle: dict):
+    """Purge des caches quand une version est rechargée ou retirée du registre."""
+    for cache in (_cache, _explain_cache):
+        if cache is not None:
+            cache.invalidate(bundle["version"])
+
+
+registry.add_listener(_on_bundle_replaced)
+
+
+configure_cache(
+    max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "50000")),
+    max_mb=float(os.getenv("PREDICTION_CACHE_MAX_MB", "0")) or None,
+    ttl_s=float(os.getenv("PREDICTION_CACHE_TTL_S", "0")) or None,
+    resolutions=parse_resolutions(os.getenv("PREDICTION_CACHE_RESOLUTIONS", "")),
+)
+configure_explain_cache(
+    max_entries=int(os.getenv("EXPLANATION_CACHE_SIZE", "10000")),
+    resolutions=parse_resolutions(os.getenv("PREDICTION_CACHE_RESOLUTIONS", "")),
+)
 
 
 # ─── Helpers ─────────────────────────────────────────────────────────────────
-def _top3_for_sample(proba: np.ndarray, classes: list, top_k: int = 3) -> list:
-    """Retourne le Top-3 (culture, confiance) pour un vecteur de probabilités."""
-    idx = np.argsort(proba)[::-1][:top_k]
+RESPONSE_FORMATS = ("verbose", "compact")
+
+
+def _topk_indices(all_probas: np.ndarray, top_k: int = 3) -> np.ndarray:
+    """
+    Indices des top_k classes de chaque ligne, par probabilité décroissante.
+
+    Même tri que l'implémentation ligne à ligne historique
+    (`np.argsort(proba)[::-1][:top_k]`), appliqué à toute la matrice en un
+    appel : les ex æquo, fréquents parmi les faibles votes de la forêt, sont
+    départagés exactement comme avant. Avec ~15 classes, ce tri complet est
+    aussi plus rapide qu'`argpartition` suivi d'un tri des k colonnes.
+    """
+    all_probas = np.atleast_2d(all_probas)
+    return np.ascontiguousarray(np.argsort(all_probas, axis=1)[:, ::-1][:, :top_k])
+
+
+def _confidences(all_probas: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """Confiances (%) arrondies à 0,1 des classes sélectionnées."""
+    return np.round(np.take_along_axis(np.atleast_2d(all_probas), idx, axis=1) * 100, 1)
+
+
+def _top3_batch(all_probas: np.ndarray, classes: list, top_k: int = 3) -> list:
+    """Top-3 (rang, culture, confiance) de chaque ligne de la matrice de probabilités."""
+    idx  = _topk_indices(all_probas, top_k)
+    conf = _confidences(all_probas, idx).tolist()
     return [
-        {
-            "rang":       i + 1,
-            "culture":    classes[j],
-            "confiance":  round(float(proba[j]) * 100, 1),  # %
-        }
-        for i, j in enumerate(idx)
+        [
+            {
+                "rang":       r + 1,
+                "culture":    classes[j],
+                "confiance":  c,  # %
+            }
+            for r, (j, c) in enumerate(zip(row_idx, row_conf))
+        ]
+        for row_idx, row_conf in zip(idx.tolist(), conf)
     ]
 
 
+def _top3_for_sample(proba: np.ndarray, classes: list, top_k: int = 3) -> list:
+    """Retourne le Top-3 (culture, confiance) pour un vecteur de probabilités."""
+    return _top3_batch(proba[None, :], classes, top_k)[0]
+
+
 def _aggregate_top3(all_probas: np.ndarray, classes: list, top_k: int = 3) -> list:
     """
     Agrège les probabilités de tous les échantillons (moyenne).
     Retourne le Top-3 global avec confiance agrégée.
     """
-    mean_proba = all_probas.mean(axis=0)
-    idx        = np.argsort(mean_proba)[::-1][:top_k]
+    mean_proba = all_probas.mean(axis=0)[None, :]
+    idx        = _topk_indices(mean_proba, top_k)
+    conf       = _confidences(mean_proba, idx)
     return [
         {
-            "rang":               i + 1,
+            "rang":               r + 1,
             "culture":            classes[j],
-            "confiance_agregee":  round(float(mean_proba[j]) * 100, 1),  # %
+            "confiance_agregee":  c,  # %
         }
-        for i, j in enumerate(idx)
+        for r, (j, c) in enumerate(zip(idx[0].tolist(), conf[0].tolist()))
     ]
 
 
+# ─── Étapes du pipeline ──────────────────────────────────────────────────────
+def samples_to_matrix(samples) -> np.ndarray:
+    """
+    Construit la matrice de features (n_samples, 7) dans l'ordre FEATURE_NAMES.
+
+    `samples` : liste de dicts, liste d'objets portant les 7 attributs
+    (SoilSample validés, sans passer par model_dump), ou matrice déjà
+    construite (renvoyée telle quelle si elle est en float64).
+    Les valeurs sont écrites directement dans un tableau préalloué.
+    """
+    if isinstance(samples, np.ndarray):
+        return np.asarray(samples, dtype=np.float64)
+    n = len(samples)
+    if n == 0:
+        return np.empty((0, len(FEATURE_NAMES)), dtype=np.float64)
+    get = (itemgetter if isinstance(samples[0], dict) else attrgetter)(*FEATURE_NAMES)
+    X = np.fromiter(
+        (value for sample in samples for value in get(sample)),
+        dtype=np.float64, count=n * len(FEATURE_NAMES),
+    )
+    return X.reshape(n, len(FEATURE_NAMES))
+
+
+def predict_proba_matrix(X_batch: np.ndarray, version: str = None, use_cache: bool = True) -> tuple:
+    """
+    Probabilités du modèle servi pour une matrice de features déjà construite.
+
+    Les lignes déjà vues (à la résolution du cache près) ne repassent pas
+    par la forêt. `version` : nom de la version du registre (active si None).
+    `use_cache=False` pour le scoring de fichiers (bulk, jobs) : des lignes
+    presque toutes uniques n'y gagnent rien et évinceraient le cache interactif.
+
+    Returns:
+        (all_probas, classes) — all_probas de shape (n_samples, n_classes).
+    """
+    all_probas, classes, backend, seconds = timed_predict_proba(X_batch, version, use_cache)
+    observe_model_predict(backend, seconds)
+    return all_probas, classes
+
+
+def timed_predict_proba(X_batch: np.ndarray, version: str = None, use_cache: bool = True) -> tuple:
+    """
+    Comme `predict_proba_matrix`, sans observer de métrique : retourne aussi le
+    backend et la durée passée dans `predict_proba` (None si tout venait du
+    cache), que l'appelant observe dans son propre processus (pool "process").
+    """
+    bundle  = _load_bundle(version)
+    engine  = bundle["engine"]
+    elapsed = []
+
+    def predict(X):
+        t0    = time.perf_counter()
+        proba = engine.predict_proba(X)
+        elapsed.append(time.perf_counter() - t0)
+        return proba
+
+    if _cache is None or not use_cache:
+        all_probas = predict(X_batch)
+    else:
+        all_probas = _cache.predict_proba(X_batch, bundle["version"], predict)
+    return all_probas, bundle["classes"], bundle["backend"], (sum(elapsed) if elapsed else None)
+
+
+def observe_model_predict(backend: str, seconds: float):
+    """Observe crops_model_predict_seconds (rien si le modèle n'a pas été appelé)."""
+    if seconds is not None:
+        MODEL_PREDICT_SECONDS.labels(backend).observe(seconds)
+
+
+def format_batch_result(all_probas: np.ndarray, classes: list,
+                        response_format: str = "verbose") -> dict:
+    """
+    Met en forme la réponse (Top-3 par échantillon + Top-3 global).
+
+    response_format :
+        - "verbose" (défaut) : une liste de dicts par échantillon ;
+        - "compact"          : tableaux parallèles d'indices de classes et de
+                               confiances, plus la liste des classes partagée.
+    """
+    if response_format == "compact":
+        return format_compact_result(all_probas, classes)
+
+    resultats = [
+        {
+            "echantillon": i + 1,
+            "top3":        top3,
+        }
+        for i, top3 in enumerate(_top3_batch(all_probas, classes))
+    ]
+
+    return {
+        "resultats_par_echantillon": resultats,
+        "top3_global":               _aggregate_top3(all_probas, classes),
+        "nb_echantillons":           len(all_probas),
+    }
+
+
+def format_compact_result(all_probas: np.ndarray, classes: list, top_k: int = 3) -> dict:
+    """
+    Réponse compacte : `indices[i][r]` est l'indice dans `classes` de la
+    culture de rang r+1 de l'échantillon i, `confiances[i][r]` sa confiance (%).
+    Les tableaux restent des ndarray : l'encodeur JSON les sérialise directement.
+    """
+    idx        = _topk_indices(all_probas, top_k)
+    mean_proba = all_probas.mean(axis=0)[None, :]
+    global_idx = _topk_indices(mean_proba, top_k)
+    return {
+        "classes":         list(classes),
+        "indices":         idx,
+        "confiances":      _confidences(all_probas, idx),
+        "top3_global":     {
+            "indices":             global_idx[0],
+            "confiances_agregees": _confidences(mean_proba, global_idx)[0],
+        },
+        "nb_echantillons": len(all_probas),
+    }
+
+
+# ─── Explications ────────────────────────────────────────────────────────────
+def explain_matrix(X_batch: np.ndarray, version: str = None) -> dict:
+    """
+    Contributions de chaque feature aux probabilités de la forêt servie
+    (CompiledForest.contributions), mises en cache par cellule quantifiée
+    comme les probabilités : même résolution, donc même point d'évaluation.
+
+    Returns:
+        dict : "biais" (n_classes,), "contributions" (n_samples, 7, n_classes),
+        "classes", "latence_ms" (durée propre de l'explication).
+
+    Raises:
+        ValueError: si le modèle servi n'est pas une forêt compilée.
+    """
+    t0     = time.perf_counter()
+    bundle = _load_bundle(version)
+    engine = bundle["engine"]
+    if not hasattr(engine, "contributions"):
+        raise ValueError(f"Explications indisponibles pour le backend '{bundle['backend']}' "
+                         "(forêt d'arbres uniquement).")
+    if _explain_cache is None:
+        contributions = engine.contributions(X_batch)
+    else:
+        contributions = _explain_cache.predict_proba(X_batch, bundle["version"], engine.contributions)
+    return {
+        "biais":         engine.bias,
+        "contributions": contributions,
+        "classes":       bundle["classes"],
+        "latence_ms":    round((time.perf_counter() - t0) * 1000, 3),
+    }
+
+
+def attach_explanations(result: dict, explanation: dict, response_format: str = "verbose") -> dict:
+    """
+    Ajoute au résultat mis en forme les contributions (points de %) des
+    classes du Top-3 de chaque échantillon : base + Σ contributions ≈ confiance.
+
+        - "verbose" : "base" et "contributions" {feature: points} dans chaque entrée du Top-3 ;
+        - "compact" : "bases" (n, 3) et "contributions" (n, 3, 7) parallèles à `indices`.
+
+    Le bloc "explication" rapporte la latence ajoutée, hors prédiction.
+    """
+    classes       = explanation["classes"]
+    base          = np.round(explanation["biais"] * 100, 2)
+    contributions = explanation["contributions"]
+    if response_format == "compact":
+        idx = np.asarray(result["indices"])
+        result["bases"]         = base[idx]
+        result["contributions"] = np.ascontiguousarray(np.round(
+            np.take_along_axis(contributions, idx[:, None, :], axis=2).transpose(0, 2, 1) * 100, 2))
+    else:
+        position = {c: j for j, c in enumerate(classes)}
+        for entry, sample in zip(result["resultats_par_echantillon"], contributions):
+            points = np.round(sample * 100, 2)
+            for top in entry["top3"]:
+                j = position[top["culture"]]
+                top["base"]          = float(base[j])
+                top["contributions"] = dict(zip(FEATURE_NAMES, points[:, j].tolist()))
+    result["explication"] = {
+        "methode":    "chemins de décision (Saabas)",
+        "unite":      "points de pourcentage",
+        "features":   FEATURE_NAMES,
+        "latence_ms": explanation["latence_ms"],
+    }
+    return result
+
+
+def model_error(exc: Exception) -> dict:
+    """Traduit une exception d'inférence en réponse {"error": ...}."""
+    if isinstance(exc, UnknownVersionError):
+        return {"error": f"Version de modèle inconnue : {exc}."}
+    if isinstance(exc, FileNotFoundError):
+        return {
+            "error": (
+                f"Modèle introuvable : '{_MODEL_PATH}'. "
+                + ("Lancez d'abord python build_models.py." if MODEL_BACKEND == "rf"
+                   else f"Lancez d'abord python model_backends.py train {MODEL_BACKEND}.")
+            )
+        }
+    return {"error": str(exc)}
+
+
 # ─── Point d'entrée principal ─────────────────────────────────────────────────
-def predict_batch_top3(samples: list) -> dict:
+def predict_batch_top3(samples: list, response_format: str = "verbose",
+                       version: str = None, explain: bool = False) -> dict:
     """
     Prédit le Top-3 de cultures pour chaque échantillon, puis fournit
     le Top-3 agrégé sur l'ensemble du lot.
@@ -67,52 +393,34 @@ def predict_batch_top3(samples: list) -> dict:
     Args:
         samples: liste de 1 à 10 dicts avec les clés
                  [N, P, K, temperature, humidity, ph, rainfall].
+        response_format: "verbose" (défaut) ou "compact" (cf. format_batch_result).
+        version: version du registre à utiliser (active si None).
+        explain: ajoute les contributions par feature du Top-3 (cf. attach_explanations).
 
     Returns:
         dict avec :
             - "resultats_par_echantillon": list[dict] (Top-3 par échantillon)
             - "top3_global":               list[dict] (Top-3 agrégé du lot)
             - "nb_echantillons":           int
+            - "explication":               latence ajoutée (si explain)
     """
     try:
-        bundle  = _load_bundle()
-        model   = bundle["model"]
-        classes = bundle["classes"]
-
         if not (1 <= len(samples) <= 10):
             return {"error": f"Le lot doit contenir entre 1 et 10 échantillons (reçu : {len(samples)})."}
 
         # ── Construire la matrice de features
-        df      = pd.DataFrame(samples)
-        X_batch = df[FEATURE_NAMES].values
+        X_batch = samples_to_matrix(samples)
 
         # ── Probabilités RF pour tous les échantillons d'un coup
-        all_probas = model.predict_proba(X_batch)   # shape (n_samples, n_classes)
-
-        # ── Top-3 par échantillon
-        resultats = []
-        for i, proba in enumerate(all_probas):
-            top3 = _top3_for_sample(proba, classes)
-            resultats.append({
-                "echantillon": i + 1,
-                "top3":        top3,
-            })
+        all_probas, classes = predict_proba_matrix(X_batch, version)
 
-        # ── Top-3 global (agrégé)
-        top3_global = _aggregate_top3(all_probas, classes)
+        # ── Top-3 par échantillon + Top-3 global (agrégé)
+        result = format_batch_result(all_probas, classes, response_format)
 
-        return {
-            "resultats_par_echantillon": resultats,
-            "top3_global":               top3_global,
-            "nb_echantillons":           len(samples),
-        }
+        # ── Contributions par feature du Top-3 (latence rapportée à part)
+        if explain:
+            attach_explanations(result, explain_matrix(X_batch, version), response_format)
+        return result
 
-    except FileNotFoundError:
-        return {
-            "error": (
-                f"Modèle introuvable : '{_MODEL_PATH}'. "
-                "Lancez d'abord train_top3_model.ipynb."
-            )
-        }
     except Exception as exc:
-        return {"error": str(exc)}
+        return model_error(exc)
@@ -0,0 +1,355 @@
+"""
+benchmark.py — Benchmarks reproductibles du pipeline de prédiction
+===================================================================
+Mesure, à configuration égale :
+   → predict_batch_top3 (1 et 10 échantillons) et le même pipeline
+     (matrice → probabilités → Top-3) sur 1 000 et 100 000 lignes ;
+   → les helpers Top-3 (_topk_indices, _top3_batch, _aggregate_top3, format compact) ;
+   → POST /predict/batch de bout en bout via un client ASGI en processus ;
+   → le temps de chargement du modèle (artefact mappable et pickle) ;
+   → le débit de generate_research_dataset.generate_dataset ;
+   → le chargement d'un dataset en CSV, Parquet et Arrow.
+
+Les résultats (médiane, min, p95 par appel, débit) sont écrits en JSON avec
+l'environnement de mesure ; `compare` signale les régressions au-delà d'un seuil
+et sort avec le code 1 s'il y en a.
+
+Usage :
+    python benchmark.py run                       # → benchmarks/latest.json
+    python benchmark.py run --quick --only top3   # sous-ensemble, moins de répétitions
+    python benchmark.py run --save-baseline       # écrit aussi benchmarks/baseline.json
+    python benchmark.py compare                   # baseline.json vs latest.json (seuil 15 %)
+    python benchmark.py compare a.json b.json --threshold 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BENCH_DIR     = "benchmarks"
+LATEST_PATH   = os.path.join(BENCH_DIR, "latest.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# Échantillon de référence et bruit reproductible autour de lui
+_SAMPLE = {"N": 90.0, "P": 35.0, "K": 100.0, "temperature": 26.0,
+           "humidity": 75.0, "ph": 6.2, "rainfall": 1500.0}
+_SCALE  = {"N": 40.0, "P": 15.0, "K": 40.0, "temperature": 4.0,
+           "humidity": 10.0, "ph": 0.6, "rainfall": 500.0}
+
+_BENCHMARKS = []   # [(nom, fonction(quick) -> dict de résultats), ...]
+
+
+def benchmark(fn):
+    _BENCHMARKS.append((fn.__name__.removeprefix("bench_"), fn))
+    return fn
+
+
+def make_samples(n: int, seed: int = 0) -> list:
+    """n échantillons valides, identiques d'une exécution à l'autre."""
+    rng  = np.random.default_rng(seed)
+    cols = {f: np.abs(v + rng.normal(0, _SCALE[f], n)) for f, v in _SAMPLE.items()}
+    cols["humidity"] = np.clip(cols["humidity"], 0, 100)
+    cols["ph"]       = np.clip(cols["ph"], 0, 14)
+    return [dict(zip(cols, map(float, row))) for row in zip(*cols.values())]
+
+
+# ─── Mesure ──────────────────────────────────────────────────────────────────
+def _stats(times: list, items: int) -> dict:
+    times = np.asarray(times)
+    median = float(np.median(times))
+    return {
+        "median_s":    median,
+        "min_s":       float(times.min()),
+        "p95_s":       float(np.percentile(times, 95)),
+        "repetitions": len(times),
+        "items":       items,
+        "items_par_s": round(items / median, 1) if median > 0 else None,
+    }
+
+
+def measure(fn, items: int = 1, repeat: int = 50, budget_s: float = 2.0, warmup: int = 1) -> dict:
+    """Appelle `fn()` jusqu'à `repeat` fois (au moins 3) ou jusqu'à épuiser `budget_s`."""
+    for _ in range(warmup):
+        fn()
+    times, spent = [], 0.0
+    while len(times) < repeat and (len(times) < 3 or spent < budget_s):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        times.append(elapsed)
+        spent += elapsed
+    return _stats(times, items)
+
+
+async def measure_async(fn, items: int = 1, repeat: int = 200, budget_s: float = 2.0,
+                        warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        await fn()
+    times, spent = [], 0.0
+    while len(times) < repeat and (len(times) < 3 or spent < budget_s):
+        t0 = time.perf_counter()
+        await fn()
+        elapsed = time.perf_counter() - t0
+        times.append(elapsed)
+        spent += elapsed
+    return _stats(times, items)
+
+
+# ─── Benchmarks ──────────────────────────────────────────────────────────────
+@benchmark
+def bench_predict_batch(quick: bool) -> dict:
+    """
+    predict_batch_top3 pour 1 et 10 échantillons (plafond de l'API) ; au-delà,
+    le même enchaînement d'étapes (predict_batch_top3 refuse plus de 10 lignes).
+    Cache de prédictions désactivé : on mesure le modèle, pas le cache.
+    """
+    import batch_processor as bp
+
+    bp.configure_cache(max_entries=0)
+    bp._load_bundle()
+    results = {}
+    for n in (1, 10):
+        samples = make_samples(n)
+        # Pas de mesure du chemin d'erreur (modèle introuvable…) comme référence valide
+        check = bp.predict_batch_top3(samples)
+        if "error" in check:
+            raise RuntimeError(f"predict_batch_top3[{n}] : {check['error']}")
+        results[f"predict_batch_top3[{n}]"] = measure(
+            lambda: bp.predict_batch_top3(samples), items=n, repeat=50 if quick else 300)
+
+    def pipeline(samples):
+        X = bp.samples_to_matrix(samples)
+        all_probas, classes = bp.predict_proba_matrix(X)
+        return bp.format_batch_result(all_probas, classes)
+
+    for n in (1_000, 100_000):
+        samples = make_samples(n)
+        results[f"pipeline_top3[{n}]"] = measure(
+            lambda: pipeline(samples), items=n, repeat=3 if quick or n > 10_000 else 20,
+            warmup=0 if n > 10_000 else 1)
+    return results
+
+
+@benchmark
+def bench_top3_helpers(quick: bool) -> dict:
+    """Helpers Top-3 sur une matrice de probabilités synthétique (15 classes)."""
+    import batch_processor as bp
+
+    rng     = np.random.default_rng(0)
+    classes = [f"culture_{i}" for i in range(15)]
+    results = {}
+    for n in (10, 10_000):
+        probas = rng.dirichlet(np.ones(len(classes)), size=n)
+        repeat = 30 if quick else 200
+        results[f"topk_indices[{n}]"]    = measure(lambda: bp._topk_indices(probas), items=n, repeat=repeat)
+        results[f"top3_batch[{n}]"]      = measure(lambda: bp._top3_batch(probas, classes), items=n, repeat=repeat)
+        results[f"aggregate_top3[{n}]"]  = measure(lambda: bp._aggregate_top3(probas, classes), items=n, repeat=repeat)
+        results[f"format_compact[{n}]"]  = measure(lambda: bp.format_compact_result(probas, classes),
+                                                   items=n, repeat=repeat)
+    return results
+
+
+@benchmark
+def bench_endpoint(quick: bool) -> dict:
+    """POST /predict/batch via httpx.ASGITransport (lifespan compris, sans réseau)."""
+    import httpx
+
+    import batch_processor as bp
+    from app import app
+
+    bp.configure_cache(max_entries=0)
+
+    async def run() -> dict:
+        results = {}
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for n in (1, 10):
+                    for fmt in ("verbose", "compact"):
+                        body = {"samples": make_samples(n)}
+
+                        async def call():
+                            r = await client.post(f"/predict/batch?format={fmt}", json=body)
+                            r.raise_for_status()
+
+                        results[f"endpoint_{fmt}[{n}]"] = await measure_async(
+                            call, items=n, repeat=50 if quick else 300)
+
+                # 32 requêtes concurrentes de 10 échantillons (micro-batching)
+                body = {"samples": make_samples(10)}
+
+                async def burst():
+                    responses = await asyncio.gather(
+                        *(client.post("/predict/batch", json=body) for _ in range(32)))
+                    for r in responses:
+                        r.raise_for_status()
+
+                results["endpoint_concurrent[32x10]"] = await measure_async(
+                    burst, items=320, repeat=10 if quick else 50)
+        return results
+
+    return asyncio.run(run())
+
+
+@benchmark
+def bench_model_load(quick: bool) -> dict:
+    """Chargement à froid du bundle (hors registre : nouvelle lecture à chaque appel)."""
+    from batch_processor import _ARTIFACT_DIR, _MODEL_PATH
+    from model_artifact import load_artifact, load_pickle_bundle
+
+    results = {}
+    if os.path.isdir(_ARTIFACT_DIR):
+        results["model_load_artifact"] = measure(
+            lambda: load_artifact(_ARTIFACT_DIR, verify=True), repeat=5 if quick else 20, warmup=0)
+    if os.path.exists(_MODEL_PATH):
+        results["model_load_pickle"] = measure(
+            lambda: load_pickle_bundle(_MODEL_PATH), repeat=2 if quick else 5, warmup=0)
+    return results
+
+
+@benchmark
+def bench_generate_dataset(quick: bool) -> dict:
+    """Débit de generate_research_dataset.generate_dataset (lignes / s)."""
+    import generate_research_dataset as grd
+
+    per_crop = 100 if quick else 500
+    n_rows   = per_crop * len(grd.CROP_PARAMS)
+    return {
+        f"generate_dataset[{per_crop}/culture]": measure(
+            lambda: grd.generate_dataset(per_crop), items=n_rows, repeat=3 if quick else 5, warmup=0),
+    }
+
+
+@benchmark
+def bench_dataset_load(quick: bool) -> dict:
+    """Chargement de data/research_based_dataset en CSV, Parquet et Arrow (mappé)."""
+    import tempfile
+
+    from dataset_store import convert_dataset, load_dataset
+
+    src = "data/research_based_dataset.csv"
+    if not os.path.exists(src):
+        return {}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"csv": src}
+        for fmt in ("parquet", "arrow"):
+            paths[fmt] = os.path.join(tmp, f"dataset.{fmt}")
+            n_rows = convert_dataset(src, paths[fmt])
+        for fmt, path in paths.items():
+            results[f"dataset_load[{fmt}]"] = measure(
+                lambda: load_dataset(path), items=n_rows, repeat=10 if quick else 50)
+        results["dataset_load[arrow, N+label]"] = measure(
+            lambda: load_dataset(paths["arrow"], ["N", "label"]), items=n_rows, repeat=10 if quick else 50)
+    return results
+
+
+# ─── Exécution / comparaison ─────────────────────────────────────────────────
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import sklearn
+
+    return {
+        "date":       time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit":     commit,
+        "python":     platform.python_version(),
+        "numpy":      np.__version__,
+        "sklearn":    sklearn.__version__,
+        "plateforme": platform.platform(),
+        "cpu":        os.cpu_count(),
+        "config":     {k: v for k, v in os.environ.items()
+                       if k.startswith(("BATCH_", "INFERENCE_", "PREDICTION_CACHE_"))},
+    }
+
+
+def run(quick: bool = False, only: str = None) -> dict:
+    report = {"environnement": environment(), "quick": quick, "resultats": {}}
+    for name, fn in _BENCHMARKS:
+        if only and only not in name:
+            continue
+        print(f"── {name}")
+        for case, stats in fn(quick).items():
+            report["resultats"][case] = stats
+            print(f"   {case:32s} médiane {stats['median_s'] * 1000:10.3f} ms"
+                  f"   ({stats['items_par_s'] or 0:>12,.0f} items/s, n = {stats['repetitions']})")
+    return report
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.15) -> list:
+    """
+    Compare les médianes cas par cas.
+
+    Returns:
+        la liste des régressions : (cas, médiane de référence, médiane actuelle, ratio).
+    """
+    regressions = []
+    base_results, cur_results = baseline["resultats"], current["resultats"]
+    print(f"{'cas':34s} {'référence':>12s} {'actuel':>12s} {'ratio':>8s}")
+    for case in sorted(set(base_results) | set(cur_results)):
+        if case not in base_results or case not in cur_results:
+            print(f"{case:34s} {'absent de la ' + ('référence' if case not in base_results else 'mesure'):>34s}")
+            continue
+        before, after = base_results[case]["median_s"], cur_results[case]["median_s"]
+        ratio = after / before if before > 0 else float("inf")
+        flag  = ""
+        if ratio > 1 + threshold:
+            flag = "  ← RÉGRESSION"
+            regressions.append((case, before, after, ratio))
+        elif ratio < 1 - threshold:
+            flag = "  ← amélioration"
+        print(f"{case:34s} {before * 1000:10.3f}ms {after * 1000:10.3f}ms {ratio:8.2f}{flag}")
+    return regressions
+
+
+def _write(report: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def _read(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline de prédiction.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Exécute les benchmarks et écrit le rapport JSON.")
+    p_run.add_argument("--out", default=LATEST_PATH)
+    p_run.add_argument("--quick", action="store_true", help="Moins de répétitions (contrôle rapide).")
+    p_run.add_argument("--only", help="Ne lance que les benchmarks dont le nom contient cette chaîne.")
+    p_run.add_argument("--save-baseline", action="store_true", help=f"Écrit aussi {BASELINE_PATH}.")
+
+    p_cmp = sub.add_parser("compare", help="Compare deux rapports et signale les régressions.")
+    p_cmp.add_argument("baseline", nargs="?", default=BASELINE_PATH)
+    p_cmp.add_argument("current", nargs="?", default=LATEST_PATH)
+    p_cmp.add_argument("--threshold", type=float, default=0.15,
+                       help="Hausse relative de la médiane tolérée (0.15 = +15 %%).")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        report = run(args.quick, args.only)
+        _write(report, args.out)
+        print(f"✔ Rapport : {args.out}")
+        if args.save_baseline:
+            _write(report, BASELINE_PATH)
+            print(f"✔ Référence : {BASELINE_PATH}")
+    else:
+        regressions = compare(_read(args.baseline), _read(args.current), args.threshold)
+        if regressions:
+            print(f"✘ {len(regressions)} régression(s) au-delà de +{args.threshold:.0%}")
+            sys.exit(1)
+        print(f"✔ Aucune régression au-delà de +{args.threshold:.0%}")
@@ -0,0 +1,146 @@
+"""
+build_models.py — Construction des fichiers générés servis par l'API
+====================================================================
+Les fichiers de model/ (hors label_encoder_26crops.pkl) sont produits à
+partir des jeux de data/ et ne sont pas versionnés : ils doivent provenir
+d'un même entraînement pour rester cohérents entre eux (empreinte du pickle
+dans l'artefact, `model_version` de l'index des zones). Ce script les
+reconstruit dans l'ordre de leurs dépendances :
+
+   → modele   : Random Forest de référence (mêmes hyperparamètres et même
+                découpage que train_top3_model.ipynb) → model/top3_crop_model.pkl ;
+   → artefact : forêt compilée mappable + empreinte du pickle
+                → model/top3_crop_model.artifact/ (model_artifact.py) ;
+   → voisins  : index des plus proches échantillons → model/neighbors/ ;
+   → zones    : index par zone, accord mesuré sur la part de test
+                → model/zone_index.{npy,json}.
+
+Avec --if-missing, une étape n'est relancée que si sa sortie est absente
+ou périmée (artefact issu d'un autre pickle, index des zones construit pour
+une autre version du modèle). La grille de probabilités (?mode=grille)
+reste un build optionnel à part : python probability_grid.py.
+
+Usage :
+    python build_models.py                   # tout reconstruire (~1 min)
+    python build_models.py --if-missing      # au démarrage : seulement ce qui manque
+    python build_models.py --backends hgb knn   # + backends alternatifs (model_backends.py)
+"""
+
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+
+import neighbor_index
+import zone_index
+from batch_processor import _ARTIFACT_DIR, _MODEL_PATH
+from model_artifact import ArtifactError, check_source, export_artifact, read_header
+from model_backends import BACKENDS, DEFAULT_BACKEND, RANDOM_SEED, backend_paths, notebook_split, train_backend
+from train_compact_model import REFERENCES
+
+DATASET  = "data/research_based_dataset.csv"
+CV_FOLDS = 10        # validation croisée du notebook
+
+
+# ─── Étapes ──────────────────────────────────────────────────────────────────
+def train_model(dataset: str = DATASET, pickle_path: str = _MODEL_PATH, cv: int = CV_FOLDS) -> dict:
+    """Entraîne la RF de référence et écrit son bundle (mêmes clés que le notebook)."""
+    split  = notebook_split(dataset)
+    bundle = train_backend(DEFAULT_BACKEND, split)
+    bundle["references"] = REFERENCES
+    if cv > 1:
+        from sklearn.model_selection import cross_val_score
+
+        X = np.concatenate([split["train"][0], split["test"][0]])
+        y = np.concatenate([split["train"][1], split["test"][1]])
+        scores = cross_val_score(BACKENDS[DEFAULT_BACKEND](RANDOM_SEED), X, y, cv=cv, scoring="accuracy", n_jobs=-1)
+        bundle["cv_accuracy_mean"] = float(scores.mean())
+        bundle["cv_accuracy_std"]  = float(scores.std())
+
+    os.makedirs(os.path.dirname(pickle_path) or ".", exist_ok=True)
+    with open(pickle_path, "wb") as f:
+        pickle.dump(bundle, f)
+    return bundle
+
+
+def export_model(pickle_path: str = _MODEL_PATH, artifact_dir: str = _ARTIFACT_DIR) -> dict:
+    """Exporte l'artefact mappable du pickle, empreinte de la source comprise."""
+    with open(pickle_path, "rb") as f:
+        return export_artifact(pickle.load(f), artifact_dir, source_path=pickle_path)
+
+
+def _artifact_fresh(pickle_path: str, artifact_dir: str) -> bool:
+    try:
+        check_source(read_header(artifact_dir), pickle_path)
+        return True
+    except (ArtifactError, KeyError, ValueError, OSError):
+        return False
+
+
+def _neighbors_fresh(index_dir: str = neighbor_index.INDEX_DIR) -> bool:
+    try:
+        return neighbor_index.NeighborIndex(index_dir).header["n_points"] > 0
+    except (OSError, KeyError, ValueError):
+        return False
+
+
+def _zones_fresh(artifact_dir: str, header_path: str = zone_index.HEADER_PATH) -> bool:
+    try:
+        return zone_index.ZoneIndex(header_path=header_path).header["model_version"] == read_header(artifact_dir)["version"]
+    except (OSError, KeyError, ValueError, ArtifactError):
+        return False
+
+
+def build(dataset: str = DATASET, if_missing: bool = False, cv: int = CV_FOLDS, backends: tuple = ()) -> dict:
+    """
+    Reconstruit les fichiers générés, dans l'ordre des dépendances. Chaque
+    étape contrôle sa propre sortie face à celle dont elle dépend : un pickle
+    réentraîné périme l'artefact, un artefact d'une autre version périme
+    l'index des zones.
+
+    Returns:
+        {étape: durée en secondes, ou "à jour" si l'étape a été sautée}
+    """
+    report = {}
+
+    def step(name, fresh, run):
+        if if_missing and fresh():
+            report[name] = "à jour"
+            return
+        started = time.perf_counter()
+        run()
+        report[name] = round(time.perf_counter() - started, 1)
+        print(f"✔ {name:9s} {report[name]} s", flush=True)
+
+    step("modele",   lambda: os.path.exists(_MODEL_PATH), lambda: train_model(dataset, _MODEL_PATH, cv))
+    step("artefact", lambda: _artifact_fresh(_MODEL_PATH, _ARTIFACT_DIR), export_model)
+    step("voisins",  _neighbors_fresh, lambda: neighbor_index.build_index(dataset))
+    step("zones",    lambda: _zones_fresh(_ARTIFACT_DIR), zone_index.build_and_evaluate)
+    for name in backends:
+        path = backend_paths(name)[0]
+        step(name, lambda: os.path.exists(path), lambda: _train_alternative(name, dataset, path))
+    return report
+
+
+def _train_alternative(name: str, dataset: str, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(train_backend(name, notebook_split(dataset)), f)
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit le modèle, son artefact et les index servis par l'API.")
+    parser.add_argument("--dataset", default=DATASET, help="Jeu d'entraînement : .csv, .parquet ou .arrow.")
+    parser.add_argument("--if-missing", action="store_true",
+                        help="Ne reconstruit que les sorties absentes ou périmées.")
+    parser.add_argument("--cv", type=int, default=CV_FOLDS, help="Plis de validation croisée (0 : aucune).")
+    parser.add_argument("--backends", nargs="*", default=[],
+                        choices=[name for name in BACKENDS if name != DEFAULT_BACKEND],
+                        help="Backends alternatifs à entraîner en plus (model/backends/).")
+    args = parser.parse_args()
+
+    report = build(args.dataset, args.if_missing, args.cv, tuple(args.backends))
+    print(f"Fichiers générés : {report}")
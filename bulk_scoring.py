@@ -0,0 +1,185 @@
+"""
+bulk_scoring.py — Prédiction Top-3 d'un fichier entier, par blocs
+=================================================================
+Score un fichier d'échantillons (CSV, Parquet ou Arrow, voir dataset_store.py)
+bloc par bloc, sans matérialiser sa matrice de probabilités :
+
+   → colonnes reconnues comme dans fusiondata.py (alias `temp`, `pH`, `rain`…),
+     colonnes supplémentaires ignorées ;
+   → valeurs manquantes ou non numériques : ligne marquée invalide, non scorée ;
+   → par ligne, seuls les indices (int16) et confiances (float32) du Top-3 sont
+     gardés ; le Top-3 global se déduit de la somme des probabilités ;
+   → rappel de progression après chaque bloc (barre Streamlit, suivi de job).
+
+Un résultat de 100 000 lignes occupe ~5 Mo ; l'affichage se fait page par
+page (`page_frame`), jamais une ligne de widgets par échantillon.
+
+Usage :
+    python bulk_scoring.py data/research_based_dataset.csv --output top3.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from batch_processor import FEATURE_NAMES, _aggregate_top3, _topk_indices
+from dataset_store import DEFAULT_BATCH_ROWS, dataset_columns, dataset_rows, iter_dataset
+from fusiondata import COLUMN_ALIASES, SchemaError
+
+TOP_K = 3
+
+
+def feature_mapping(columns: list) -> dict:
+    """
+    {colonne source: feature} pour les 7 features.
+
+    Raises:
+        SchemaError: si une feature reste introuvable.
+    """
+    mapping = {}
+    for column in columns:
+        target = column if column in FEATURE_NAMES else COLUMN_ALIASES.get(column)
+        if target in FEATURE_NAMES and target not in mapping.values():
+            mapping[column] = target
+    missing = [f for f in FEATURE_NAMES if f not in mapping.values()]
+    if missing:
+        raise SchemaError(f"Colonnes manquantes : {missing} (colonnes du fichier : {columns}).")
+    return mapping
+
+
+def _chunk_matrix(chunk, mapping: dict) -> np.ndarray:
+    """Bloc source → matrice float64 (n, 7) ; valeurs non numériques → NaN."""
+    import pandas as pd
+
+    frame = chunk[list(mapping)].rename(columns=mapping)[FEATURE_NAMES]
+    for name in FEATURE_NAMES:
+        if not pd.api.types.is_numeric_dtype(frame[name]):
+            frame[name] = pd.to_numeric(frame[name], errors="coerce")
+    return frame.to_numpy(dtype=np.float64)
+
+
+_ROW_ARRAYS = {"features": np.nan, "top_idx": -1, "top_conf": np.nan, "valid": False}
+
+
+def _resize(result: dict, rows: int):
+    """Ajuste les tableaux par ligne à `rows` (le comptage des lignes d'un CSV n'est qu'une estimation)."""
+    for name, fill in _ROW_ARRAYS.items():
+        array = result[name]
+        if rows <= len(array):
+            result[name] = array[:rows]
+        else:
+            extra = np.full((rows - len(array),) + array.shape[1:], fill, dtype=array.dtype)
+            result[name] = np.concatenate([array, extra])
+
+
+# ─── Scoring ─────────────────────────────────────────────────────────────────
+def score_file(path: str, predict_proba, classes: list, batch_rows: int = DEFAULT_BATCH_ROWS,
+               on_progress=None, model_version: str = None) -> dict:
+    """
+    Scorer `path` bloc par bloc.
+
+    Args:
+        predict_proba: fonction X (n, 7) → probabilités (n, n_classes).
+        on_progress:   rappel optionnel (lignes traitées, lignes totales).
+
+    Returns:
+        dict de tableaux : "features" (n, 7) float32, "top_idx" (n, 3) int16
+        (-1 si invalide), "top_conf" (n, 3) float32 (%), "valid" (n,) bool,
+        "proba_sum" (n_classes,), plus "classes", "rows", "invalid", "elapsed_s".
+    """
+    mapping = feature_mapping(dataset_columns(path))
+    total   = dataset_rows(path)
+    k       = min(TOP_K, len(classes))
+    result  = {
+        "features":  np.empty((total, len(FEATURE_NAMES)), dtype=np.float32),
+        "top_idx":   np.full((total, k), -1, dtype=np.int16),
+        "top_conf":  np.full((total, k), np.nan, dtype=np.float32),
+        "valid":     np.zeros(total, dtype=bool),
+        "proba_sum": np.zeros(len(classes), dtype=np.float64),
+    }
+    started, done = time.perf_counter(), 0
+    for chunk in iter_dataset(path, columns=list(mapping), batch_rows=batch_rows):
+        X     = _chunk_matrix(chunk, mapping)
+        rows  = slice(done, done + len(X))
+        if rows.stop > len(result["valid"]):
+            _resize(result, max(rows.stop, 2 * len(result["valid"])))
+        valid = np.isfinite(X).all(axis=1)
+        result["features"][rows] = X
+        result["valid"][rows]    = valid
+        if valid.any():
+            proba = predict_proba(X[valid])
+            idx   = _topk_indices(proba, k)
+            sel   = np.flatnonzero(valid) + done
+            result["top_idx"][sel]  = idx
+            result["top_conf"][sel] = np.round(np.take_along_axis(proba, idx, axis=1) * 100, 1)
+            result["proba_sum"]    += proba.sum(axis=0)
+        done += len(X)
+        if on_progress is not None:
+            on_progress(done, max(total, done))
+
+    _resize(result, done)
+    result.update({
+        "classes":       list(classes),
+        "model_version": model_version,
+        "rows":          done,
+        "invalid":       int(done - result["valid"].sum()),
+        "elapsed_s":     round(time.perf_counter() - started, 3),
+    })
+    return result
+
+
+def global_top3(result: dict) -> list:
+    """Top-3 agrégé (moyenne des probabilités des lignes valides), comme `_aggregate_top3`."""
+    n_valid = int(result["valid"].sum())
+    if not n_valid:
+        return []
+    return _aggregate_top3((result["proba_sum"] / n_valid)[None, :], result["classes"])
+
+
+# ─── Lecture des résultats ───────────────────────────────────────────────────
+def page_frame(result: dict, start: int, stop: int, rows: np.ndarray = None):
+    """
+    DataFrame des lignes [start, stop) : features, puis culture et confiance
+    de chaque rang. `rows` : sous-ensemble d'indices (filtre), paginé de même.
+    """
+    import pandas as pd
+
+    index   = np.arange(result["rows"]) if rows is None else np.asarray(rows)
+    index   = index[start:stop]
+    classes = np.asarray(result["classes"] + ["—"], dtype=object)   # -1 → "—"
+    frame   = pd.DataFrame(result["features"][index], columns=FEATURE_NAMES, index=index + 1)
+    frame.index.name = "ligne"
+    for r in range(result["top_idx"].shape[1]):
+        frame[f"top{r + 1}"]          = classes[result["top_idx"][index, r]]
+        frame[f"confiance{r + 1}_pct"] = result["top_conf"][index, r]
+    return frame
+
+
+def rows_with_top1(result: dict, culture: str) -> np.ndarray:
+    """Indices des lignes dont la culture de rang 1 est `culture`."""
+    return np.flatnonzero(result["top_idx"][:, 0] == result["classes"].index(culture))
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    from batch_processor import _load_bundle
+    from dataset_store import save_dataset
+
+    parser = argparse.ArgumentParser(description="Top-3 de chaque ligne d'un fichier, par blocs.")
+    parser.add_argument("path", help="Fichier .csv, .parquet ou .arrow.")
+    parser.add_argument("--output", help="Écrit les résultats (.csv, .parquet ou .arrow).")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    args = parser.parse_args()
+
+    bundle = _load_bundle()
+    result = score_file(args.path, bundle["engine"].predict_proba, bundle["classes"], args.batch_rows,
+                        on_progress=lambda done, total: print(f"\r  {done:>10,d} / {total:,d} lignes",
+                                                              end="", flush=True),
+                        model_version=bundle["version"])
+    print(f"\n✔ {result['rows']} lignes en {result['elapsed_s']} s "
+          f"({result['invalid']} invalides) — Top-3 global : "
+          f"{[(t['culture'], t['confiance_agregee']) for t in global_top3(result)]}")
+    if args.output:
+        save_dataset(page_frame(result, 0, result["rows"]).reset_index(), args.output)
+        print(f"  Résultats : {args.output}")
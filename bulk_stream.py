@@ -0,0 +1,230 @@
+"""
+bulk_stream.py — Prédiction en masse par flux (NDJSON ou CSV)
+==============================================================
+Les fichiers d'enquête pédologique comptent 10^5 à 10^6 lignes : bien
+au-delà du plafond de 10 échantillons de POST /predict/batch. Ici :
+
+   1. le corps de la requête est lu au fil de l'eau, ligne par ligne ;
+   2. les lignes valides remplissent un bloc de taille fixe (chunk_size) ;
+   3. chaque bloc plein est scoré en un appel, et le Top-3 de chaque ligne
+      est renvoyé immédiatement (une ligne NDJSON par échantillon) ;
+   4. une dernière ligne porte le `top3_global` cumulé sur tout le fichier.
+
+La mémoire reste constante quelle que soit la taille du fichier : un bloc
+de features, la somme courante des probabilités et un tampon de ligne,
+borné à `max_line_bytes` (un corps sans '\n' ne s'accumule pas en mémoire).
+"""
+
+import csv
+
+import numpy as np
+from starlette.responses import StreamingResponse
+
+import fast_json
+from batch_processor import FEATURE_NAMES, _aggregate_top3, _top3_batch, model_error
+from metrics import MODEL_CALL_ROWS, SAMPLES
+from validation import range_errors
+
+BULK_FORMATS = ("ndjson", "csv")
+
+
+# ─── Réponse duplex ──────────────────────────────────────────────────────────
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse dont le générateur lit lui-même le corps de la requête.
+
+    Starlette écoute `http.disconnect` en parallèle du flux (spec ASGI < 2.4),
+    ce qui consomme les messages `http.request` attendus par `request.stream()`
+    et bloque la lecture. Ici la déconnexion est détectée par `request.stream()`
+    (ClientDisconnect), qui interrompt le générateur.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+# ─── Lecture du flux ─────────────────────────────────────────────────────────
+class LineTooLong(ValueError):
+    """Ligne (ou tampon sans '\\n') plus longue que la limite autorisée."""
+
+
+async def iter_lines(byte_chunks, max_line_bytes: int = None):
+    """
+    Découpe un flux asynchrone d'octets en lignes texte (sans le '\\n').
+
+    Raises:
+        LineTooLong: dès qu'une ligne dépasse `max_line_bytes` octets
+                     (None = sans limite).
+    """
+    buffer = b""
+    async for chunk in byte_chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if max_line_bytes and len(line) > max_line_bytes:
+                raise LineTooLong(f"Ligne de plus de {max_line_bytes} octets.")
+            yield line.decode("utf-8").rstrip("\r")
+        if max_line_bytes and len(buffer) > max_line_bytes:
+            raise LineTooLong(f"Ligne de plus de {max_line_bytes} octets (aucun saut de ligne).")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+async def prefetch(lines):
+    """
+    Lit la première ligne tout de suite (erreurs levées ici, avant l'envoi des
+    en-têtes HTTP) et retourne un itérateur équivalent à `lines`.
+    """
+    try:
+        first = await anext(lines)
+    except StopAsyncIteration:
+        first = None
+
+    async def chained():
+        if first is not None:
+            yield first
+        async for line in lines:
+            yield line
+
+    return chained()
+
+
+def parse_error(exc: Exception) -> str:
+    """Message rapporté pour une ligne que `_parse_ndjson` / `_CsvParser` ont rejetée."""
+    if isinstance(exc, KeyError):
+        return f"champ manquant : {exc.args[0]}"
+    if isinstance(exc, IndexError):
+        return "ligne illisible : moins de valeurs que de colonnes dans l'en-tête"
+    return f"ligne illisible : {exc}"
+
+
+def _parse_ndjson(line: str) -> list:
+    record = fast_json.loads(line)
+    return [float(record[f]) for f in FEATURE_NAMES]
+
+
+class _CsvParser:
+    """Parse les lignes CSV en s'appuyant sur l'en-tête (colonnes dans n'importe quel ordre)."""
+
+    def __init__(self, header_line: str):
+        header  = [h.strip() for h in next(csv.reader([header_line]))]
+        missing = [f for f in FEATURE_NAMES if f not in header]
+        if missing:
+            raise ValueError(f"Colonnes manquantes dans l'en-tête CSV : {missing}")
+        self.positions = [header.index(f) for f in FEATURE_NAMES]
+
+    def __call__(self, line: str) -> list:
+        values = next(csv.reader([line]))
+        return [float(values[p]) for p in self.positions]
+
+
+# ─── Scoring par blocs ───────────────────────────────────────────────────────
+async def stream_bulk_predictions(lines, fmt: str, score, chunk_size: int = 4096):
+    """
+    Générateur asynchrone de lignes NDJSON (bytes terminés par '\\n').
+
+    Args:
+        lines:      itérateur asynchrone de lignes texte (cf. `iter_lines`).
+        fmt:        "ndjson" ou "csv".
+        score:      coroutine `X -> (all_probas, classes)`.
+        chunk_size: nombre de lignes scorées par appel au modèle.
+
+    "ligne" numérote les lignes de données à partir de 1 dans les deux formats :
+    en CSV, l'en-tête n'est pas compté (ligne 1 = première ligne après l'en-tête).
+
+    Émet :
+        {"ligne": i, "top3": [...]}            pour chaque ligne valide ;
+        {"ligne": i, "erreur": "..."}          pour chaque ligne rejetée ;
+        {"top3_global": [...], "nb_echantillons": n, "nb_erreurs": e}  en fin de flux ;
+        {"error": "..."}  à la place du résumé si le flux doit s'interrompre
+                          (en-tête CSV invalide, modèle introuvable…).
+    """
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Format inconnu : '{fmt}' (attendu : {BULK_FORMATS}).")
+    try:
+        async for out in _stream(lines, fmt, score, chunk_size):
+            yield out
+    except Exception as exc:
+        # Les en-têtes HTTP sont déjà partis : l'erreur est signalée dans le flux
+        yield fast_json.dumps(model_error(exc)) + b"\n"
+
+
+async def _stream(lines, fmt: str, score, chunk_size: int):
+    """Corps de `stream_bulk_predictions` ; "ligne" = numéro de ligne de données."""
+    X_chunk   = np.empty((chunk_size, len(FEATURE_NAMES)), dtype=np.float64)
+    line_nos  = np.empty(chunk_size, dtype=np.int64)
+    n_chunk   = 0
+    pending   = []          # erreurs de parsing du bloc courant : (ligne, message)
+
+    proba_sum = None
+    classes   = None
+    n_valid   = 0
+    n_errors  = 0
+    parse     = _parse_ndjson if fmt == "ndjson" else None
+    line_no   = 0
+
+    async def flush():
+        """Score le bloc courant et renvoie les lignes NDJSON, dans l'ordre du fichier."""
+        nonlocal n_chunk, pending, proba_sum, classes, n_valid, n_errors
+        X = X_chunk[:n_chunk]
+
+        # ── Contrôles de plage vectorisés : les lignes invalides sont écartées
+        bad = {}
+        for i, feature, message in range_errors(X):
+            bad.setdefault(i, f"{feature} : {message}")
+        errors = pending + [(int(line_nos[i]), msg) for i, msg in bad.items()]
+        keep   = np.array([i not in bad for i in range(n_chunk)], dtype=bool)
+
+        rows = []
+        if keep.any():
+            all_probas, classes = await score(X[keep])
+            MODEL_CALL_ROWS.labels("bulk").observe(len(all_probas))
+            SAMPLES.labels("/predict/bulk", "exact").inc(len(all_probas))
+            batch_sum = all_probas.sum(axis=0)
+            proba_sum = batch_sum if proba_sum is None else proba_sum + batch_sum
+            n_valid  += len(all_probas)
+            rows = [(n, {"ligne": n, "top3": top3})
+                    for n, top3 in zip(line_nos[:n_chunk][keep].tolist(),
+                                       _top3_batch(all_probas, classes))]
+
+        n_errors += len(errors)
+        rows += [(n, {"ligne": n, "erreur": msg}) for n, msg in errors]
+        rows.sort(key=lambda r: r[0])
+        out = [fast_json.dumps(payload) + b"\n" for _, payload in rows]
+
+        n_chunk, pending = 0, []
+        return out
+
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        if parse is None:                # CSV : la première ligne non vide est l'en-tête
+            parse   = _CsvParser(line)
+            line_no = 0                  # numérotation relative aux données, comme en NDJSON
+            continue
+        try:
+            X_chunk[n_chunk] = parse(line)
+        except (ValueError, KeyError, IndexError, TypeError) as exc:
+            pending.append((line_no, parse_error(exc)))
+        else:
+            line_nos[n_chunk] = line_no
+            n_chunk += 1
+
+        if n_chunk == chunk_size or len(pending) >= chunk_size:
+            for out in await flush():
+                yield out
+
+    if n_chunk or pending:
+        for out in await flush():
+            yield out
+
+    summary = {
+        "top3_global":     (_aggregate_top3(proba_sum[None, :] / n_valid, classes)
+                            if n_valid else []),
+        "nb_echantillons": n_valid,
+        "nb_erreurs":      n_errors,
+    }
+    yield fast_json.dumps(summary) + b"\n"
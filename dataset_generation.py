@@ -0,0 +1,129 @@
+"""
+dataset_generation.py — Génération synthétique vectorisée, parallèle et par blocs
+==================================================================================
+Moteur commun à generate_research_dataset.py et generatedata.py. Pour
+chaque culture, les 7 features sont tirées en une opération NumPy par
+feature (loi uniforme sur la plage de la culture) au lieu de 7 appels
+`np.random.uniform` par ligne.
+
+Reproductibilité :
+   → le travail est découpé en blocs fixes (culture, indice de bloc) de
+     `block_rows` lignes, indépendants du nombre de workers ;
+   → chaque bloc a son propre flux `numpy.random.Generator`, issu de
+     `SeedSequence(seed, spawn_key=(culture, bloc))` ;
+   → les blocs sont émis dans l'ordre (cultures dans l'ordre des paramètres,
+     blocs croissants), quel que soit l'ordre de fin des workers.
+Le résultat est donc identique pour 1 ou N workers à graine et `block_rows`
+égaux (changer la taille des blocs change les flux, donc les valeurs).
+
+Mémoire bornée : les blocs sont produits au fil de l'eau (au plus
+2 × workers blocs en vol) et écrits en ajout dans le fichier de sortie
+(CSV, Parquet ou Arrow, voir dataset_store.py).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+FEATURE_NAMES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+BLOCK_ROWS    = 100_000   # lignes par bloc (unité de tirage et de parallélisme)
+
+
+def generate_block(params: dict, crop: str, n: int, seed: int, crop_index: int, block_index: int,
+                   decimals: int = None, integer_features: tuple = ()) -> dict:
+    """
+    Tire `n` lignes pour une culture.
+
+    Args:
+        params:           plages {feature: (min, max)} de la culture.
+        decimals:         arrondi des features continues (None = pas d'arrondi).
+        integer_features: features tirées en entiers dans [min, max[ (randint).
+
+    Returns:
+        {feature: ndarray, "label": ndarray} — colonnes du bloc.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(crop_index, block_index)))
+    block = {}
+    for f in FEATURE_NAMES:
+        low, high = params[f]
+        if f in integer_features:
+            block[f] = rng.integers(low, high, size=n)
+        else:
+            values = rng.uniform(low, high, size=n)
+            block[f] = np.round(values, decimals) if decimals is not None else values
+    block["label"] = np.full(n, crop, dtype=object)
+    return block
+
+
+def _tasks(crop_params: dict, samples_per_crop: int, block_rows: int):
+    for crop_index, (crop, params) in enumerate(crop_params.items()):
+        for block_index, start in enumerate(range(0, samples_per_crop, block_rows)):
+            n = min(block_rows, samples_per_crop - start)
+            yield params, crop, n, crop_index, block_index
+
+
+def _run_task(args: tuple) -> dict:
+    params, crop, n, crop_index, block_index, seed, decimals, integer_features = args
+    return generate_block(params, crop, n, seed, crop_index, block_index, decimals, integer_features)
+
+
+def iter_blocks(crop_params: dict, samples_per_crop: int, seed: int, workers: int = 1,
+                block_rows: int = BLOCK_ROWS, decimals: int = None, integer_features: tuple = ()):
+    """
+    Itère sur les blocs (dicts de colonnes) dans un ordre déterministe.
+
+    Args:
+        workers: 1 = dans ce processus ; > 1 = ProcessPoolExecutor.
+    """
+    # Les paramètres peuvent contenir d'autres clés (ex. "refs") : seules les features sont transmises
+    crop_params = {c: {f: p[f] for f in FEATURE_NAMES} for c, p in crop_params.items()}
+    tasks = ((*t, seed, decimals, tuple(integer_features))
+             for t in _tasks(crop_params, samples_per_crop, block_rows))
+
+    if workers <= 1:
+        for task in tasks:
+            yield _run_task(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = []
+        for task in tasks:
+            in_flight.append(executor.submit(_run_task, task))
+            if len(in_flight) >= 2 * workers:
+                yield in_flight.pop(0).result()
+        for future in in_flight:
+            yield future.result()
+
+
+def blocks_to_frame(blocks):
+    """Concatène des blocs en un seul DataFrame (jeux de données de taille modeste)."""
+    import pandas as pd
+
+    blocks = list(blocks)
+    columns = FEATURE_NAMES + ["label"]
+    if not blocks:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame({c: np.concatenate([b[c] for b in blocks]) for c in columns})
+
+
+def write_blocks(blocks, path: str, labels: list = None) -> dict:
+    """
+    Écrit les blocs par ajouts successifs (mémoire : un bloc), en CSV, Parquet
+    ou Arrow selon l'extension de `path` (voir dataset_store).
+
+    Args:
+        labels: cultures attendues, dictionnaire commun des catégories en binaire.
+
+    Returns:
+        {culture: nombre de lignes écrites}
+    """
+    from dataset_store import DatasetWriter
+
+    counts = {}
+    with DatasetWriter(path, labels) as writer:
+        for block in blocks:
+            writer.write(block)
+            n = len(block["label"])
+            if n:
+                counts[block["label"][0]] = counts.get(block["label"][0], 0) + n
+    return counts
@@ -0,0 +1,302 @@
+"""
+dataset_profile.py — Profil d'un dataset en une passe, par blocs
+================================================================
+Lit le fichier (CSV, Parquet ou Arrow, voir dataset_store.py) bloc par bloc
+et cumule, sans jamais le charger en entier :
+
+   → effectif et part de chaque classe de la colonne cible ;
+   → valeurs manquantes par colonne ;
+   → moyenne, écart-type, min et max de chaque feature numérique, par classe
+     et sur l'ensemble.
+
+Les features sont devinées sur le premier bloc ; une colonne texte entièrement
+vide dans ce bloc (lue en flottants) est retirée dès qu'un bloc suivant la
+révèle non numérique.
+
+Chaque bloc est traité en O(lignes) quel que soit le nombre de classes :
+les labels sont convertis en indices, puis `np.bincount` donne effectifs,
+sommes et écarts quadratiques de toutes les classes à la fois. Les moments
+sont cumulés à la Welford (moyenne + somme des carrés des écarts) et
+fusionnés par la formule de Chan et al. : deux profils partiels (blocs ou
+fichiers traités en parallèle) se combinent exactement avec `merge()`.
+
+Usage :
+    python dataset_profile.py data/research_based_dataset.csv
+    python dataset_profile.py data/*.csv --json profil.json --workers 4
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dataset_store import DEFAULT_BATCH_ROWS, iter_dataset
+
+MISSING_LABEL = "(manquant)"
+
+
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """Fusion de Chan et al. de deux jeux de moments (tableaux de même forme)."""
+    n     = n_a + n_b
+    delta = mean_b - mean_a
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w_b = np.where(n > 0, n_b / n, 0.0)
+    mean = mean_a + delta * w_b
+    m2   = m2_a + m2_b + delta ** 2 * n_a * w_b
+    return n, mean, m2
+
+
+class DatasetProfile:
+    """
+    Accumulateur fusionnable : `update(bloc)` pour un DataFrame, `merge(autre)`
+    pour un profil partiel, `summary()` / `report()` pour la sortie.
+
+    Statistiques par (classe, feature) dans des tableaux (k classes × F features).
+    """
+
+    def __init__(self, target: str = "label", features: list = None):
+        self.target   = target
+        self.features = list(features) if features is not None else None
+        self.classes  = []       # labels, dans l'ordre d'apparition
+        self._index   = {}
+        self.rows     = 0
+        self.missing  = {}
+        self.sources  = []
+        self.counts   = np.zeros(0, dtype=np.int64)
+        shape         = (0, len(self.features or ()))
+        self.n, self.mean, self.m2 = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        self.min, self.max         = np.full(shape, np.inf), np.full(shape, -np.inf)
+
+    def _alloc(self, k: int):
+        """Agrandit les tableaux à k classes × F features (nouvelles classes, features connues)."""
+        shape = (k, len(self.features or ()))
+        if self.n.shape == shape:
+            return
+
+        def grow(a, fill):
+            out = np.full(shape, fill)
+            out[:a.shape[0], :a.shape[1]] = a
+            return out
+
+        self.n, self.mean, self.m2 = grow(self.n, 0.0), grow(self.mean, 0.0), grow(self.m2, 0.0)
+        self.min, self.max         = grow(self.min, np.inf), grow(self.max, -np.inf)
+        self.counts = np.concatenate([self.counts, np.zeros(k - len(self.counts), dtype=np.int64)])
+
+    def _keep_features(self, keep: list):
+        """Restreint les tableaux aux features `keep` (colonnes texte démasquées)."""
+        cols = [self.features.index(f) for f in keep]
+        self.n, self.mean, self.m2 = self.n[:, cols], self.mean[:, cols], self.m2[:, cols]
+        self.min, self.max         = self.min[:, cols], self.max[:, cols]
+        self.features = list(keep)
+
+    def _class_index(self, label) -> int:
+        i = self._index.get(label)
+        if i is None:
+            i = self._index[label] = len(self.classes)
+            self.classes.append(label)
+        return i
+
+    # ─── Cumul ───────────────────────────────────────────────────────────────
+    def update(self, frame):
+        """Ajoute un bloc (DataFrame) au profil."""
+        import pandas as pd
+
+        if self.features is None:
+            self.features = [c for c in frame.columns
+                             if c != self.target and frame[c].dtype.kind in "iufb"]
+            self._alloc(len(self.classes))
+        text = [f for f in self.features if frame[f].dtype.kind not in "iufb"]
+        if text:
+            self._keep_features([f for f in self.features if f not in text])
+
+        for column, count in frame.isna().sum().items():
+            self.missing[column] = self.missing.get(column, 0) + int(count)
+        self.rows += len(frame)
+
+        # Labels → indices globaux (une entrée par catégorie du bloc, pas par ligne)
+        labels = frame[self.target]
+        labels = labels.array if isinstance(labels.dtype, pd.CategoricalDtype) else pd.Categorical(labels)
+        local  = [self._class_index(str(c)) for c in labels.categories]
+        local.append(self._class_index(MISSING_LABEL) if (labels.codes < 0).any() else -1)
+        idx    = np.asarray(local, dtype=np.intp)[labels.codes]       # code -1 → dernière entrée
+        k      = len(self.classes)
+        self._alloc(k)
+        self.counts += np.bincount(idx, minlength=k)
+
+        shape = (k, len(self.features))
+        n, mean, m2 = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        lo, hi      = np.full(shape, np.inf), np.full(shape, -np.inf)
+        for j, f in enumerate(self.features):
+            x     = frame[f].to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = ~np.isnan(x)
+            g, x  = idx[valid], x[valid]
+            n[:, j] = np.bincount(g, minlength=k)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean[:, j] = np.bincount(g, x, minlength=k) / n[:, j]
+            mean[n[:, j] == 0, j] = 0.0
+            m2[:, j] = np.bincount(g, (x - mean[g, j]) ** 2, minlength=k)
+            np.minimum.at(lo[:, j], g, x)
+            np.maximum.at(hi[:, j], g, x)
+        self._merge_arrays(n, mean, m2, lo, hi)
+        return self
+
+    def _merge_arrays(self, n, mean, m2, lo, hi):
+        self.n, self.mean, self.m2 = _merge_moments(self.n, self.mean, self.m2, n, mean, m2)
+        self.min = np.minimum(self.min, lo)
+        self.max = np.maximum(self.max, hi)
+
+    def merge(self, other: "DatasetProfile") -> "DatasetProfile":
+        """Fusionne un profil partiel (mêmes features ; classes alignées par nom)."""
+        if other.features is None:
+            return self
+        if self.features is None:
+            self.features = list(other.features)
+            self._alloc(len(self.classes))
+        if other.features != self.features:
+            # Feature retirée d'un seul côté (colonne texte vide dans un fichier) : features communes
+            common = [f for f in self.features if f in other.features]
+            known  = set(self.missing) & set(other.missing)        # colonnes présentes des deux côtés
+            if (set(self.features) ^ set(other.features)) - known:
+                raise ValueError(f"Features différentes : {self.features} ≠ {other.features}.")
+            self._keep_features(common)
+            other_cols = [other.features.index(f) for f in common]
+        else:
+            other_cols = list(range(len(self.features)))
+        rows = np.asarray([self._class_index(c) for c in other.classes], dtype=np.intp)
+        k    = len(self.classes)
+        self._alloc(k)
+
+        def spread(values, fill):
+            out = np.full((k, len(self.features)), fill)
+            out[rows] = values[:, other_cols]
+            return out
+
+        self._merge_arrays(spread(other.n, 0.0), spread(other.mean, 0.0), spread(other.m2, 0.0),
+                           spread(other.min, np.inf), spread(other.max, -np.inf))
+        np.add.at(self.counts, rows, other.counts)
+        self.rows += other.rows
+        for column, count in other.missing.items():
+            self.missing[column] = self.missing.get(column, 0) + count
+        self.sources.extend(other.sources)
+        return self
+
+    # ─── Sortie ──────────────────────────────────────────────────────────────
+    @staticmethod
+    def _stats(n, mean, m2, lo, hi) -> dict:
+        n = int(n)
+        if n == 0:
+            return {"n": 0, "moyenne": None, "ecart_type": None, "min": None, "max": None}
+        return {
+            "n":          n,
+            "moyenne":    float(mean),
+            "ecart_type": float(np.sqrt(m2 / (n - 1))) if n > 1 else 0.0,   # ddof = 1, comme pandas
+            "min":        float(lo),
+            "max":        float(hi),
+        }
+
+    def summary(self) -> dict:
+        """Résumé JSON-sérialisable."""
+        features = self.features or []
+        classes  = {}
+        for i in sorted(range(len(self.classes)), key=lambda i: self.classes[i]):
+            classes[self.classes[i]] = {
+                "effectif": int(self.counts[i]),
+                "part":     float(self.counts[i] / self.rows) if self.rows else 0.0,
+                "features": {f: self._stats(self.n[i, j], self.mean[i, j], self.m2[i, j],
+                                            self.min[i, j], self.max[i, j])
+                             for j, f in enumerate(features)},
+            }
+
+        # Ensemble : fusion des moments de toutes les classes
+        overall = {}
+        for j, f in enumerate(features):
+            n, mean, m2 = 0.0, 0.0, 0.0
+            for i in range(len(self.classes)):
+                n, mean, m2 = _merge_moments(n, mean, m2, self.n[i, j], self.mean[i, j], self.m2[i, j])
+            overall[f] = self._stats(n, mean, m2,
+                                     self.min[:, j].min(initial=np.inf), self.max[:, j].max(initial=-np.inf))
+        return {
+            "sources":   self.sources,
+            "lignes":    self.rows,
+            "cible":     self.target,
+            "manquants": self.missing,
+            "classes":   classes,
+            "features":  overall,
+        }
+
+    def report(self) -> str:
+        s     = self.summary()
+        lines = ["=" * 50, f"ANALYSE DE LA VARIABLE: '{self.target}'", "=" * 50,
+                 f"\nClasses uniques ({len(s['classes'])}):", "-" * 30]
+        for i, (label, c) in enumerate(s["classes"].items(), 1):
+            lines.append(f"{i:2d}. {label:15} | {c['effectif']:5d} échantillons | {c['part'] * 100:5.1f}%")
+        lines += ["\nRésumé:",
+                  f"- Total d'échantillons: {s['lignes']}",
+                  f"- Nombre de classes: {len(s['classes'])}"]
+        missing = {c: n for c, n in s["manquants"].items() if n}
+        for column, n in missing.items():
+            lines.append(f"- Valeurs manquantes ({column}): {n} ({n / s['lignes'] * 100:.1f}%)")
+
+        if s["features"]:
+            lines += ["\nFeatures (ensemble):", "-" * 30]
+            for f, st in s["features"].items():
+                lines.append(_format_stats(f, st))
+        return "\n".join(lines)
+
+
+def _format_stats(name: str, st: dict) -> str:
+    if not st["n"]:
+        return f"  {name:12s} (aucune valeur)"
+    return (f"  {name:12s} {st['moyenne']:10.2f} ± {st['ecart_type']:<9.2f}"
+            f" [{st['min']:.2f} ; {st['max']:.2f}]")
+
+
+# ─── Profil de fichiers ──────────────────────────────────────────────────────
+def profile_file(path: str, target: str = "label", batch_rows: int = DEFAULT_BATCH_ROWS) -> DatasetProfile:
+    """Profil d'un fichier, lu en une passe par blocs de `batch_rows` lignes."""
+    profile = DatasetProfile(target)
+    for chunk in iter_dataset(path, batch_rows=batch_rows):
+        if target not in chunk.columns:
+            raise KeyError(f"Colonne '{target}' non trouvée. Colonnes disponibles: {list(chunk.columns)}")
+        profile.update(chunk)
+    profile.sources.append(path)
+    return profile
+
+
+def profile_files(paths: list, target: str = "label", batch_rows: int = DEFAULT_BATCH_ROWS,
+                  workers: int = 1) -> DatasetProfile:
+    """Profils partiels des fichiers (en parallèle si `workers` > 1), fusionnés dans l'ordre."""
+    if workers <= 1 or len(paths) <= 1:
+        parts = [profile_file(p, target, batch_rows) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            parts = list(executor.map(profile_file, paths, [target] * len(paths), [batch_rows] * len(paths)))
+    profile = DatasetProfile(target)
+    for part in parts:
+        profile.merge(part)
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profil d'un ou plusieurs datasets en une passe.")
+    parser.add_argument("paths", nargs="+", help="Fichiers .csv, .parquet ou .arrow (fusionnés).")
+    parser.add_argument("--target", default="label", help="Colonne cible.")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument("--workers", type=int, default=1, help="Fichiers profilés en parallèle (0 = nb de cœurs).")
+    parser.add_argument("--by-class", action="store_true", help="Affiche aussi les statistiques par classe.")
+    parser.add_argument("--json", help="Écrit aussi le résumé JSON dans ce fichier.")
+    args = parser.parse_args()
+
+    profile = profile_files(args.paths, args.target, args.batch_rows, args.workers or os.cpu_count() or 1)
+    print(profile.report())
+    if args.by_class:
+        for label, c in profile.summary()["classes"].items():
+            print(f"\n{label}:")
+            for f, st in c["features"].items():
+                print(_format_stats(f, st))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(profile.summary(), f, ensure_ascii=False, indent=2)
+        print(f"\n✔ Résumé JSON : {args.json}")
@@ -0,0 +1,337 @@
+"""
+dataset_store.py — Stockage colonnaire des datasets (Parquet / Arrow)
+=====================================================================
+Les datasets de data/ sont des CSV dont chaque lecture reparse le texte des
+flottants en pleine précision. Cette couche les stocke en colonnes binaires :
+
+   → features numériques en float32 (précision des seuils des arbres
+     scikit-learn, qui travaillent déjà en float32) ;
+   → colonnes texte (label, zone, variety, …) en chaînes, rendues en
+     catégories (pandas.Categorical) à la lecture ; "label" peut recevoir un
+     dictionnaire fixe commun à tous les blocs ;
+   → types des colonnes fixés pour tout le fichier (schéma de la source ou
+     du premier bloc) : un bloc dont une colonne texte est entièrement vide
+     reste du texte ;
+   → ".arrow" / ".feather" : fichier IPC Arrow non compressé, lu par mappage
+     mémoire sans copie ; ".parquet" : compressé (zstd), plus compact.
+
+Le format est déduit de l'extension ; ".csv" reste accepté partout, pour que
+générateurs et scripts d'analyse lisent et écrivent indifféremment l'un ou
+l'autre. pyarrow n'est importé qu'à l'usage (jamais par le chemin de service).
+
+Usage :
+    python dataset_store.py convert data/*.csv                  # → data/*.arrow
+    python dataset_store.py convert data/research_based_dataset.csv --format parquet
+    python dataset_store.py info data/research_based_dataset.arrow
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+DEFAULT_BATCH_ROWS = 65_536
+
+
+def dataset_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Format de dataset inconnu : '{ext}' (attendu : {', '.join(FORMATS)}).")
+    return FORMATS[ext]
+
+
+# ─── Schéma compact ──────────────────────────────────────────────────────────
+def to_table(columns, labels: list = None, text_columns: list = None):
+    """
+    DataFrame ou {colonne: ndarray} → table Arrow compacte.
+
+    Args:
+        labels:       dictionnaire fixe des catégories de "label" (même
+                      dictionnaire pour tous les blocs d'un fichier écrit par
+                      morceaux) ; sinon "label" est stocké en chaînes.
+        text_columns: colonnes à stocker en chaînes quel que soit le dtype du
+                      bloc (colonne texte vide → NaN flottants côté pandas) ;
+                      par défaut : colonnes non numériques du bloc.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if hasattr(columns, "columns"):
+        columns = {c: columns[c] for c in columns.columns}
+    arrays = {}
+    for name, values in columns.items():
+        values = np.asarray(values) if not hasattr(values, "dtype") else values
+        text   = name in text_columns if text_columns is not None else values.dtype.kind not in "iufb"
+        if not text:
+            arrays[name] = pa.array(np.asarray(values, dtype=np.float32))
+            continue
+        # Chaînes simples : un dictionnaire par bloc est interdit dans un fichier IPC
+        array = pa.array(np.asarray(values, dtype=object), from_pandas=True).cast(pa.string())
+        if labels is not None and name == "label":
+            dictionary = pa.array(labels, type=pa.string())
+            indices    = pc.index_in(array, value_set=dictionary)
+            array      = pa.DictionaryArray.from_arrays(indices.cast(pa.int32()), dictionary)
+        arrays[name] = array
+    return pa.table(arrays)
+
+
+# ─── Lecture ─────────────────────────────────────────────────────────────────
+def dataset_columns(path: str) -> list:
+    """Noms des colonnes, sans lire les données (schéma ou en-tête CSV)."""
+    fmt = dataset_format(path)
+    if fmt == "csv":
+        with open(path, encoding="utf-8") as f:
+            return f.readline().rstrip("\r\n").split(",")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.read_schema(path).names
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def dataset_rows(path: str) -> int:
+    """Nombre de lignes : métadonnées Parquet / Arrow, sinon comptage des fins de ligne du CSV."""
+    fmt = dataset_format(path)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).metadata.num_rows
+    if fmt == "arrow":
+        return _read_table(path).num_rows
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last   = block[-1:]
+    return max(lines + (last != b"\n") - 1, 0)     # en-tête exclu
+
+
+def text_columns(path: str, batch_rows: int = DEFAULT_BATCH_ROWS) -> list:
+    """
+    Colonnes texte : schéma du fichier (Parquet / Arrow) ; pour un CSV,
+    colonnes non numériques dans au moins un bloc (un bloc isolé ne suffit
+    pas : une colonne texte vide y est lue en flottants).
+    """
+    if dataset_format(path) != "csv":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if dataset_format(path) == "parquet":
+            schema = pq.read_schema(path)
+        else:
+            with pa.memory_map(path) as source:
+                schema = pa.ipc.open_file(source).schema
+        return [f.name for f in schema
+                if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)
+                or pa.types.is_dictionary(f.type)]
+    found = set()
+    for chunk in iter_dataset(path, batch_rows=batch_rows):
+        found.update(c for c in chunk.columns if chunk[c].dtype.kind not in "iufb")
+    return [c for c in dataset_columns(path) if c in found]
+
+
+def _read_table(path: str, columns: list = None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if dataset_format(path) == "parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    # Fichier IPC mappé : les tampons de la table pointent dans la projection mémoire
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def _to_pandas(table):
+    import pyarrow as pa
+
+    for i, field in enumerate(table.schema):
+        if pa.types.is_string(field.type):
+            table = table.set_column(i, field.name, table.column(i).dictionary_encode())
+    # split_blocks : une colonne par bloc pandas, sans consolidation (donc sans copie)
+    return table.to_pandas(split_blocks=True)
+
+
+def load_dataset(path: str, columns: list = None):
+    """
+    Charge un dataset en DataFrame.
+
+    Args:
+        columns: projection (seules ces colonnes sont lues / décodées).
+
+    Un CSV est lu tel quel (types inférés par pandas) ; un fichier colonnaire
+    rend des features float32 et des colonnes texte catégorielles.
+    """
+    if dataset_format(path) == "csv":
+        import pandas as pd
+
+        return pd.read_csv(path, usecols=columns)[columns] if columns else pd.read_csv(path)
+    return _to_pandas(_read_table(path, columns))
+
+
+def iter_dataset(path: str, columns: list = None, batch_rows: int = DEFAULT_BATCH_ROWS):
+    """Itère sur le dataset par DataFrames d'au plus `batch_rows` lignes (mémoire bornée)."""
+    fmt = dataset_format(path)
+    if fmt == "csv":
+        import pandas as pd
+
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=batch_rows):
+            yield chunk[columns] if columns else chunk
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        batches = pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_rows, columns=columns)
+    else:
+        table   = _read_table(path, columns)
+        batches = table.to_batches(max_chunksize=batch_rows)
+    for batch in batches:
+        yield _to_pandas(pa.Table.from_batches([batch]))
+
+
+# ─── Écriture ────────────────────────────────────────────────────────────────
+def _csv_chunk(columns: dict, header: bool) -> bytes:
+    """Sérialise un bloc en CSV : pyarrow s'il est installé (≈ 4× plus rapide), sinon pandas."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        pa = None
+    if pa is not None:
+        table = pa.table({c: pa.array(np.asarray(v), from_pandas=True) for c, v in columns.items()})
+        sink  = pa.BufferOutputStream()
+        try:
+            pa_csv.write_csv(table, sink, pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+            # En-tête écrit à la main : pyarrow met toujours les noms de colonnes entre guillemets
+            head = (",".join(columns) + "\n").encode("utf-8") if header else b""
+            return head + sink.getvalue().to_pybytes()
+        except pa.ArrowInvalid:
+            pass     # valeur contenant une virgule ou un guillemet : pandas sait la protéger
+    import pandas as pd
+
+    return pd.DataFrame(columns).to_csv(index=False, header=header).encode("utf-8")
+
+
+class DatasetWriter:
+    """
+    Écriture par blocs dans le format déduit de `path`.
+
+        with DatasetWriter("data/x.parquet", labels=crops) as w:
+            for block in blocks:
+                w.write(block)          # {colonne: ndarray} ou DataFrame
+
+    Le schéma du fichier est celui du premier bloc ; les blocs suivants y
+    sont convertis. `text_columns` (cf. `text_columns()`) fixe les colonnes
+    texte quand le premier bloc ne suffit pas à les reconnaître.
+    """
+
+    def __init__(self, path: str, labels: list = None, text_columns: list = None):
+        self.path    = path
+        self.format  = dataset_format(path)
+        self.labels  = list(labels) if labels is not None else None
+        self.text_columns = list(text_columns) if text_columns is not None else None
+        self.rows    = 0
+        self._file   = None
+        self._writer = None
+        self._schema = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.format == "csv":
+            self._file = open(self.path, "wb")
+        return self
+
+    def write(self, columns):
+        if hasattr(columns, "columns"):
+            columns = {c: columns[c].to_numpy() for c in columns.columns}
+        if self.format == "csv":
+            self._file.write(_csv_chunk(columns, header=(self.rows == 0)))
+        else:
+            self._write_table(to_table(columns, self.labels, self.text_columns))
+        self.rows += len(next(iter(columns.values())))
+
+    def _write_table(self, table):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._schema is None:
+            # Colonne entièrement vide dans le 1er bloc (type null) : texte par défaut
+            self._schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                                      for f in table.schema])
+        table = table.cast(self._schema)
+        if self._writer is None:
+            if self.format == "parquet":
+                self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            else:
+                self._writer = pa.ipc.new_file(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+        return False
+
+
+def save_dataset(frame, path: str):
+    """Écrit un DataFrame entier (CSV, Parquet ou Arrow selon l'extension)."""
+    if dataset_format(path) == "csv":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        frame.to_csv(path, index=False)
+        return
+    with DatasetWriter(path) as writer:
+        writer.write(frame)
+
+
+def convert_dataset(src: str, dst: str, batch_rows: int = DEFAULT_BATCH_ROWS) -> int:
+    """
+    Convertit `src` vers `dst` par blocs. Colonnes texte et catégories de
+    "label" sont déterminées sur le dataset entier avant l'écriture.
+
+    Returns:
+        nombre de lignes écrites.
+    """
+    texts  = text_columns(src, batch_rows)
+    labels = None
+    if "label" in texts:
+        labels = sorted({str(v) for chunk in iter_dataset(src, ["label"], batch_rows)
+                         for v in chunk["label"].dropna().unique()})
+    with DatasetWriter(dst, labels, texts) as writer:
+        for chunk in iter_dataset(src, batch_rows=batch_rows):
+            writer.write(chunk)
+    return writer.rows
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conversion et inspection des datasets.")
+    sub    = parser.add_subparsers(dest="commande", required=True)
+
+    p_conv = sub.add_parser("convert", help="CSV ↔ Parquet ↔ Arrow.")
+    p_conv.add_argument("sources", nargs="+")
+    p_conv.add_argument("--format", choices=("arrow", "parquet", "csv"), default="arrow",
+                        help="Format cible (extension du fichier écrit à côté de la source).")
+
+    p_info = sub.add_parser("info", help="Schéma, lignes et taille d'un dataset.")
+    p_info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.commande == "convert":
+        for src in args.sources:
+            dst = os.path.splitext(src)[0] + "." + args.format
+            if os.path.abspath(dst) == os.path.abspath(src):
+                continue
+            rows = convert_dataset(src, dst)
+            print(f"✔ {src} → {dst} : {rows} lignes, "
+                  f"{os.path.getsize(src) / 1024:.0f} → {os.path.getsize(dst) / 1024:.0f} Kio")
+    else:
+        frame = load_dataset(args.path)
+        print(f"{args.path} ({dataset_format(args.path)}, {os.path.getsize(args.path) / 1024:.0f} Kio)")
+        print(f"   {len(frame)} lignes")
+        for name, dtype in frame.dtypes.items():
+            print(f"   {name:14s} {dtype}")
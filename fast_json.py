@@ -0,0 +1,48 @@
+"""
+fast_json.py — Sérialisation JSON rapide des réponses
+======================================================
+Utilise `orjson` s'il est installé (sérialisation native des ndarray NumPy,
+sans conversion en listes Python), sinon le module `json` standard avec
+conversion des types NumPy.
+"""
+
+import json
+
+import numpy as np
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:   # dépendance optionnelle
+    orjson = None
+
+
+def _to_builtin(obj):
+    """Conversion des types NumPy pour le module json standard."""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type non sérialisable en JSON : {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    """Sérialise `content` (dicts, listes, ndarray…) en JSON UTF-8."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_to_builtin, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """Désérialise un document JSON (str ou bytes)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse sérialisée par `dumps` (orjson si disponible)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
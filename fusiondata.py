@@ -0,0 +1,190 @@
+"""
+fusiondata.py — Fusion en flux de datasets hétérogènes
+======================================================
+Fusionne un nombre quelconque de fichiers (CSV, Parquet ou Arrow, voir
+dataset_store.py) vers le schéma canonique FEATURE_NAMES + label, bloc par
+bloc, sans jamais charger une source en entier :
+
+   → normalisation du schéma : colonnes renommées (ex. `crop` → `label`,
+     voir COLUMN_ALIASES), réordonnées, colonnes hors schéma ignorées
+     (`zone`, `variety`…), features converties en float64 ;
+   → lignes incomplètes (feature ou label manquant) écartées ;
+   → déduplication par empreinte du contenu (hash 64 bits vectorisé de la
+     ligne normalisée, `pandas.util.hash_pandas_object`) : seules les
+     empreintes déjà vues sont gardées, dans un tableau trié (8 octets par
+     ligne unique), pas les lignes elles-mêmes. Les features sont arrondies
+     à HASH_DIGITS chiffres significatifs avant le hash : une même ligne lue
+     depuis un CSV réécrit (dernier bit du flottant) ou un fichier float32
+     est reconnue comme doublon ; la ligne écrite garde ses valeurs d'origine ;
+   → écriture incrémentale de la sortie et compte de lignes par source.
+
+Usage :
+    python fusiondata.py data/Crop_recommendation.csv data/cameroon_crops_data.csv \\
+        data/cameroon_crop_recommendation_dataset.csv --output data/fusion.csv
+    python fusiondata.py data/*.csv --output data/fusion.arrow --json fusion.json
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from dataset_generation import FEATURE_NAMES
+from dataset_store import DEFAULT_BATCH_ROWS, DatasetWriter, dataset_columns, iter_dataset
+
+LABEL            = "label"
+CANONICAL        = FEATURE_NAMES + [LABEL]
+HASH_DIGITS      = 6       # chiffres significatifs comparés (float32 : ~7)
+COLUMN_ALIASES   = {"crop": LABEL, "culture": LABEL, "target": LABEL,
+                    "temp": "temperature", "pH": "ph", "rain": "rainfall"}
+
+
+class SchemaError(ValueError):
+    """Source dont les colonnes ne couvrent pas le schéma canonique."""
+
+
+def column_mapping(columns: list, aliases: dict = None) -> dict:
+    """
+    {colonne source: colonne canonique} pour les colonnes retenues.
+
+    Raises:
+        SchemaError: si une colonne canonique reste introuvable.
+    """
+    aliases = {**COLUMN_ALIASES, **(aliases or {})}
+    mapping = {}
+    for column in columns:
+        target = column if column in CANONICAL else aliases.get(column)
+        if target in CANONICAL and target not in mapping.values():
+            mapping[column] = target
+    missing = [c for c in CANONICAL if c not in mapping.values()]
+    if missing:
+        raise SchemaError(f"Colonnes manquantes : {missing} (colonnes de la source : {columns}).")
+    return mapping
+
+
+def normalize_chunk(chunk, mapping: dict):
+    """Bloc source → bloc canonique (ordre, types) et nombre de lignes incomplètes écartées."""
+    frame = chunk[list(mapping)].rename(columns=mapping)[CANONICAL]
+    frame = frame.astype({f: np.float64 for f in FEATURE_NAMES})
+    frame[LABEL] = frame[LABEL].astype(object).where(frame[LABEL].notna(), None)
+    frame[LABEL] = frame[LABEL].map(lambda v: None if v is None else str(v).strip() or None)
+    complete = frame.notna().all(axis=1).to_numpy()
+    return frame[complete].reset_index(drop=True), int((~complete).sum())
+
+
+class SeenHashes:
+    """Ensemble d'empreintes 64 bits : tableau trié, recherche dichotomique vectorisée."""
+
+    def __init__(self):
+        self._sorted = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """Masque des lignes dont l'empreinte est nouvelle (1re occurrence du bloc) ; les ajoute."""
+        _, first = np.unique(hashes, return_index=True)
+        new      = np.zeros(len(hashes), dtype=bool)
+        new[first] = True
+        pos  = np.searchsorted(self._sorted, hashes)
+        seen = (pos < len(self._sorted)) & (self._sorted[np.minimum(pos, len(self._sorted) - 1)] == hashes) \
+            if len(self._sorted) else np.zeros(len(hashes), dtype=bool)
+        new &= ~seen
+        self._sorted = np.union1d(self._sorted, hashes[new])
+        return new
+
+
+def row_hashes(frame, digits: int = HASH_DIGITS) -> np.ndarray:
+    """Empreintes 64 bits des lignes canoniques (features arrondies à `digits` chiffres significatifs, 0 = exact)."""
+    from pandas.util import hash_pandas_object
+
+    if digits:
+        X = frame[FEATURE_NAMES].to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            exponent = np.where(X == 0, 0, np.floor(np.log10(np.abs(X))))
+        scale = 10.0 ** (digits - 1 - exponent)
+        frame = frame.assign(**{f: np.round(X[:, j] * scale[:, j]) / scale[:, j]
+                                for j, f in enumerate(FEATURE_NAMES)})
+    return hash_pandas_object(frame, index=False).to_numpy()
+
+
+def merge_datasets(sources: list, output: str, dedup: bool = True, batch_rows: int = DEFAULT_BATCH_ROWS,
+                   aliases: dict = None, on_chunk=None, hash_digits: int = HASH_DIGITS) -> dict:
+    """
+    Fusionne `sources` dans `output` (format déduit de l'extension).
+
+    Args:
+        aliases:  renommages supplémentaires {colonne source: colonne canonique}.
+        on_chunk: rappel optionnel appelé sur chaque bloc écrit (DataFrame canonique).
+        hash_digits: précision de la comparaison des features (0 = égalité exacte).
+
+    Returns:
+        {"sources": {chemin: compteurs}, "lignes_ecrites": n, "doublons": n}
+    """
+    mappings = {path: column_mapping(dataset_columns(path), aliases) for path in sources}   # échec avant écriture
+    seen     = SeenHashes()
+    stats    = {}
+    with DatasetWriter(output) as writer:
+        for path in sources:
+            mapping = mappings[path]
+            counts  = stats[path] = {
+                "lues": 0, "ecrites": 0, "doublons": 0, "incompletes": 0,
+                "renommees":  {src: dst for src, dst in mapping.items() if src != dst},
+                "ignorees":   [c for c in dataset_columns(path) if c not in mapping],
+            }
+            for chunk in iter_dataset(path, columns=list(mapping), batch_rows=batch_rows):
+                counts["lues"] += len(chunk)
+                frame, incomplete = normalize_chunk(chunk, mapping)
+                counts["incompletes"] += incomplete
+                if dedup and len(frame):
+                    keep  = seen.add_new(row_hashes(frame, hash_digits))
+                    counts["doublons"] += int((~keep).sum())
+                    frame = frame[keep]
+                if len(frame):
+                    writer.write(frame)
+                    counts["ecrites"] += len(frame)
+                    if on_chunk is not None:
+                        on_chunk(frame)
+    return {
+        "sources":        stats,
+        "lignes_ecrites": sum(s["ecrites"] for s in stats.values()),
+        "doublons":       sum(s["doublons"] for s in stats.values()),
+        "sortie":         output,
+    }
+
+
+def _parse_aliases(specs: list) -> dict:
+    aliases = {}
+    for spec in specs or ():
+        source, _, target = spec.partition("=")
+        if target not in CANONICAL:
+            raise SchemaError(f"Colonne canonique inconnue : '{target}' (attendu : {CANONICAL}).")
+        aliases[source] = target
+    return aliases
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fusion en flux de datasets vers le schéma canonique.")
+    parser.add_argument("sources", nargs="+", help="Fichiers .csv, .parquet ou .arrow, dans l'ordre de priorité.")
+    parser.add_argument("--output", required=True, help="Fichier de sortie : .csv, .parquet ou .arrow.")
+    parser.add_argument("--rename", action="append", metavar="SOURCE=CANONIQUE",
+                        help="Renommage supplémentaire, ex. --rename culture_nom=label (répétable).")
+    parser.add_argument("--no-dedup", action="store_true", help="Conserve les doublons.")
+    parser.add_argument("--hash-digits", type=int, default=HASH_DIGITS,
+                        help="Chiffres significatifs comparés pour les doublons (0 = égalité exacte).")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS)
+    parser.add_argument("--json", help="Écrit aussi les compteurs JSON dans ce fichier.")
+    args = parser.parse_args()
+
+    report = merge_datasets(args.sources, args.output, not args.no_dedup, args.batch_rows,
+                            _parse_aliases(args.rename), hash_digits=args.hash_digits)
+    print(f"{'source':52s} {'lues':>8s} {'écrites':>8s} {'doublons':>8s} {'incompl.':>8s}")
+    for path, s in report["sources"].items():
+        print(f"{path:52s} {s['lues']:8d} {s['ecrites']:8d} {s['doublons']:8d} {s['incompletes']:8d}")
+        if s["renommees"] or s["ignorees"]:
+            print(f"   renommées : {s['renommees'] or '—'} | ignorées : {s['ignorees'] or '—'}")
+    print(f"\n✔ {report['lignes_ecrites']} lignes écrites dans '{args.output}' "
+          f"({report['doublons']} doublons écartés)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
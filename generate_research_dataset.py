@@ -12,14 +12,19 @@ Objectif : Dataset orienté Afrique sub-saharienne / Cameroun.
            Seules les cultures référencées dans les 4 sources sont incluses.
 """
 
-import pandas as pd
+import argparse
+import os
+
 import numpy as np
 
+from dataset_generation import BLOCK_ROWS, FEATURE_NAMES, blocks_to_frame, iter_blocks, write_blocks
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  Graine aléatoire pour la reproductibilité
+#  (flux numpy.random.Generator dérivés par SeedSequence, cf. dataset_generation.py ;
+#   l'état global de np.random n'est plus modifié à l'import)
 # ─────────────────────────────────────────────────────────────────────────────
 RANDOM_SEED = 42
-np.random.seed(RANDOM_SEED)
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  Paramètres agronomiques par culture
@@ -213,60 +218,94 @@ CROP_PARAMS = {
 SAMPLES_PER_CROP = 500   # nombre d'échantillons générés par culture
 
 
-def generate_sample(params: dict, crop_name: str) -> dict:
-    """Génère un échantillon pour une culture donnée."""
-    return {
-        "N":           round(np.random.uniform(params["N"][0],           params["N"][1]),           2),
-        "P":           round(np.random.uniform(params["P"][0],           params["P"][1]),           2),
-        "K":           round(np.random.uniform(params["K"][0],           params["K"][1]),           2),
-        "temperature": round(np.random.uniform(params["temperature"][0], params["temperature"][1]), 2),
-        "humidity":    round(np.random.uniform(params["humidity"][0],     params["humidity"][1]),    2),
-        "ph":          round(np.random.uniform(params["ph"][0],           params["ph"][1]),          2),
-        "rainfall":    round(np.random.uniform(params["rainfall"][0],     params["rainfall"][1]),    2),
-        "label":       crop_name,
-    }
+def generate_sample(params: dict, crop_name: str, rng: np.random.Generator = None) -> dict:
+    """Génère un échantillon pour une culture donnée (usage ponctuel ; cf. generate_dataset)."""
+    rng = rng or np.random.default_rng()
+    sample = {f: round(float(rng.uniform(*params[f])), 2) for f in FEATURE_NAMES}
+    sample["label"] = crop_name
+    return sample
+
+
+def iter_dataset_blocks(samples_per_crop: int = SAMPLES_PER_CROP, seed: int = RANDOM_SEED,
+                        workers: int = 1, block_rows: int = BLOCK_ROWS):
+    """Blocs {colonne: ndarray} du dataset, dans un ordre déterministe (cf. dataset_generation)."""
+    return iter_blocks(CROP_PARAMS, samples_per_crop, seed, workers, block_rows, decimals=2)
 
 
-def generate_dataset(samples_per_crop: int = SAMPLES_PER_CROP) -> pd.DataFrame:
+def generate_dataset(samples_per_crop: int = SAMPLES_PER_CROP, seed: int = RANDOM_SEED,
+                     workers: int = 1):
     """Génère le dataset complet.
 
     Args:
         samples_per_crop: Nombre d'échantillons à générer par culture.
+        seed:             Graine ; même résultat quel que soit `workers`.
+        workers:          Nombre de processus de génération.
 
     Returns:
         DataFrame avec colonnes [N, P, K, temperature, humidity, ph, rainfall, label].
     """
-    rows = []
-    for crop, params in CROP_PARAMS.items():
-        for _ in range(samples_per_crop):
-            rows.append(generate_sample(params, crop))
-    return pd.DataFrame(rows)
+    return blocks_to_frame(iter_dataset_blocks(samples_per_crop, seed, workers))
+
+
+def write_dataset(path: str, samples_per_crop: int = SAMPLES_PER_CROP, seed: int = RANDOM_SEED,
+                  workers: int = 1, block_rows: int = BLOCK_ROWS, on_block=None) -> dict:
+    """
+    Génère et écrit le dataset bloc par bloc (mémoire bornée, taille quelconque).
+
+    Args:
+        on_block: rappel optionnel appelé sur chaque bloc avant écriture.
+
+    Returns:
+        {culture: nombre d'échantillons écrits}
+    """
+    blocks = iter_dataset_blocks(samples_per_crop, seed, workers, block_rows)
+    if on_block is not None:
+        blocks = (on_block(b) or b for b in blocks)
+    return write_blocks(blocks, path, labels=list(CROP_PARAMS))
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  Point d'entrée principal
 # ─────────────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère le dataset synthétique FAO/IITA/IRAD/CIRAD.")
+    parser.add_argument("--samples-per-crop", type=int, default=SAMPLES_PER_CROP)
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED)
+    parser.add_argument("--workers", type=int, default=1, help="Processus de génération (0 = nb de cœurs).")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS, help="Lignes par bloc écrit.")
+    parser.add_argument("--output", default="data/research_based_dataset.csv",
+                        help="Fichier de sortie : .csv, .parquet ou .arrow.")
+    args = parser.parse_args()
+
     print("=" * 70)
     print("  Génération du Dataset — Sources : FAO / IITA / IRAD / CIRAD")
     print("=" * 70)
 
-    df = generate_dataset()
+    # Statistiques N, P, K cumulées au fil des blocs (le dataset n'est jamais entier en mémoire)
+    npk = {f: {"n": 0, "somme": 0.0, "min": np.inf, "max": -np.inf} for f in ("N", "P", "K")}
+
+    def accumulate(block):
+        for f, acc in npk.items():
+            acc["n"]     += len(block[f])
+            acc["somme"] += float(block[f].sum())
+            acc["min"]    = min(acc["min"], float(block[f].min()))
+            acc["max"]    = max(acc["max"], float(block[f].max()))
+
+    counts = write_dataset(args.output, args.samples_per_crop, args.seed,
+                           args.workers or os.cpu_count() or 1, args.block_rows, accumulate)
 
-    print(f"\n✔ Nombre total d'échantillons : {len(df)}")
-    print(f"✔ Nombre de cultures         : {df['label'].nunique()}")
-    print(f"✔ Cultures incluses          :\n  {list(df['label'].unique())}")
+    print(f"\n✔ Nombre total d'échantillons : {sum(counts.values())}")
+    print(f"✔ Nombre de cultures         : {len(counts)}")
+    print(f"✔ Cultures incluses          :\n  {list(counts)}")
 
     # Vérifie qu'aucune arachide n'est incluse
-    arachides = [c for c in df["label"].unique() if "arachide" in c.lower()]
+    arachides = [c for c in counts if "arachide" in c.lower()]
     assert len(arachides) == 0, f"Arachides inattendues : {arachides}"
     print("\n✔ Vérification : Aucune arachide n'est présente.")
 
     # Statistiques sommaires pour N, P, K
     print("\n── Statistiques N, P, K (mg/kg) ──")
-    print(df[["N", "P", "K"]].describe().round(2).to_string())
+    for f, acc in npk.items():
+        print(f"  {f}: moyenne {acc['somme'] / acc['n']:.2f} | min {acc['min']:.2f} | max {acc['max']:.2f}")
 
-    # Sauvegarde
-    output_path = "data/research_based_dataset.csv"
-    df.to_csv(output_path, index=False)
-    print(f"\n✔ Dataset sauvegardé dans '{output_path}'")
+    print(f"\n✔ Dataset sauvegardé dans '{args.output}'")
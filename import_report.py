@@ -0,0 +1,83 @@
+"""
+import_report.py — Coût d'import par module au démarrage
+=========================================================
+Lance `python -X importtime -c "import <module>"` dans un processus neuf
+(caches d'import du système de fichiers chauds, aucun module préchargé) et
+résume la sortie :
+
+   → temps cumulé de chaque module du projet (app, batch_processor, …) ;
+   → temps propre agrégé par paquet de premier niveau (fastapi, numpy, …) ;
+   → paquets lourds présents alors que le service n'en a pas besoin.
+
+Usage :
+    python import_report.py                 # rapport pour app.py
+    python import_report.py batch_processor --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Paquets que le chemin de service ne doit pas importer (chargés à la demande ailleurs)
+HEAVY_PACKAGES = ("pandas", "sklearn", "scipy", "matplotlib", "seaborn", "pyarrow")
+
+
+def import_times(module: str) -> list:
+    """
+    Returns:
+        [(nom, temps propre µs, temps cumulé µs, profondeur), ...] dans l'ordre
+        de la sortie de -X importtime.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def report(module: str, top: int = 10) -> dict:
+    rows     = import_times(module)
+    project  = {os.path.splitext(f)[0] for f in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+                if f.endswith(".py")}
+    by_package = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + self_us
+    return {
+        "module":    module,
+        "total_ms":  round(next((c for name, _, c, d in rows if d == 0 and name == module), 0) / 1000, 1),
+        "projet_ms": {name: round(c / 1000, 1) for name, _, c, _ in rows if name in project},
+        "paquets_ms": {p: round(us / 1000, 1)
+                       for p, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]},
+        "lourds":    sorted({name.split(".")[0] for name, *_ in rows} & set(HEAVY_PACKAGES)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coût d'import par module.")
+    parser.add_argument("module", nargs="?", default="app")
+    parser.add_argument("--top", type=int, default=10, help="Nombre de paquets affichés.")
+    args = parser.parse_args()
+
+    r = report(args.module, args.top)
+    print(f"Import de '{r['module']}' : {r['total_ms']} ms")
+    print("\n── Modules du projet (temps cumulé, ms)")
+    for name, ms in sorted(r["projet_ms"].items(), key=lambda kv: -kv[1]):
+        print(f"   {name:28s} {ms:8.1f}")
+    print(f"\n── Paquets (temps propre agrégé, top {args.top}, ms)")
+    for name, ms in r["paquets_ms"].items():
+        print(f"   {name:28s} {ms:8.1f}")
+    if r["lourds"]:
+        print(f"\n✘ Paquets lourds importés : {', '.join(r['lourds'])}")
+    else:
+        print("\n✔ Aucun paquet lourd importé")
@@ -0,0 +1,109 @@
+"""
+inference_pool.py — Exécuteur dédié pour l'inférence (hors boucle asyncio)
+===========================================================================
+L'inférence RF est CPU-bound : appelée directement dans un endpoint
+`async def`, elle bloque la boucle d'événements d'uvicorn (et donc /health
+et toutes les autres requêtes en vol). Ce module l'exécute dans un pool :
+
+   → "thread"  : ThreadPoolExecutor  (NumPy relâche le GIL sur les gros calculs)
+   → "process" : ProcessPoolExecutor (chaque worker charge le bundle une fois)
+
+Les endpoints attendent le résultat avec `await pool.predict_proba(X)` ;
+`shutdown()` arrête proprement les workers à l'arrêt de l'application.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import batch_processor
+
+POOL_KINDS = ("thread", "process")
+
+
+def _init_worker():
+    """Initialiseur des workers process : charge le bundle une seule fois."""
+    try:
+        batch_processor._load_bundle()
+    except FileNotFoundError:
+        # L'erreur sera renvoyée proprement à la première requête
+        pass
+
+
+class InferencePool:
+    """
+    Pool d'inférence à taille configurable.
+
+    Args:
+        kind:    "thread" ou "process".
+        workers: nombre de workers (défaut : nombre de cœurs).
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = None):
+        if kind not in POOL_KINDS:
+            raise ValueError(f"Type de pool inconnu : '{kind}' (attendu : {POOL_KINDS}).")
+        self.kind     = kind
+        self.workers  = workers or os.cpu_count() or 1
+        self._executor = None
+        self.pending  = 0       # appels soumis et non terminés (boucle asyncio, sans verrou)
+
+    # ── Cycle de vie ──────────────────────────────────────────────────────────
+    @property
+    def executor(self):
+        """Exécuteur créé à la première utilisation (et après un shutdown)."""
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="inference",
+                )
+        return self._executor
+
+    def start(self):
+        """Démarre les workers (en mode process, chacun charge le bundle)."""
+        executor = self.executor
+        if self.kind == "process":
+            # Force le démarrage de tous les workers plutôt qu'à la demande
+            for future in [executor.submit(os.getpid) for _ in range(self.workers)]:
+                future.result()
+        return self
+
+    def shutdown(self, wait: bool = True):
+        """Arrête les workers ; les tâches déjà soumises sont terminées si `wait`."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+    # ── Exécution ─────────────────────────────────────────────────────────────
+    async def run(self, fn, *args):
+        """Exécute `fn(*args)` dans le pool et attend le résultat sans bloquer la boucle."""
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def predict_proba(self, X_batch: np.ndarray, version: str = None, use_cache: bool = True) -> tuple:
+        """
+        Équivalent asynchrone de `batch_processor.predict_proba_matrix`. La durée
+        de `predict_proba` mesurée dans le worker est observée ici, dans le
+        processus qui sert /metrics (sinon perdue en pool "process").
+        """
+        all_probas, classes, backend, seconds = await self.run(
+            batch_processor.timed_predict_proba, X_batch, version, use_cache)
+        batch_processor.observe_model_predict(backend, seconds)
+        return all_probas, classes
+
+    def info(self) -> dict:
+        return {"type": self.kind, "workers": self.workers, "demarre": self._executor is not None,
+                "en_cours": self.pending}
@@ -0,0 +1,409 @@
+"""
+job_queue.py — Prédictions asynchrones : file de jobs persistée dans SQLite
+===========================================================================
+POST /predict/bulk garde la connexion HTTP ouverte pendant tout le scoring.
+Pour les très gros fichiers d'enquête, POST /jobs enregistre le fichier sur
+disque et rend aussitôt un identifiant ; un pool local de workers (taille
+bornée, JOBS_WORKERS) le score ensuite par blocs, comme /predict/bulk :
+
+   → mêmes parseurs NDJSON / CSV et mêmes contrôles de plage (bulk_stream,
+     validation) ; version du modèle figée à la soumission ;
+   → après chaque bloc, résultats et point de reprise (octet lu, compteurs,
+     somme des probabilités) sont écrits dans la même transaction SQLite ;
+   → au redémarrage, les jobs en attente ou interrompus reprennent au dernier
+     bloc validé : aucune ligne perdue ni dupliquée ;
+   → GET /jobs/{id} lit la progression et une page de résultats (accès par
+     rang, en O(log n) quelle que soit la page).
+
+Par ligne, seuls les indices et confiances du Top-3 sont stockés. Le fichier
+source est supprimé à la fin du job ; les jobs terminés sont purgés après
+JOBS_RETENTION_H heures.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import fast_json
+from batch_processor import FEATURE_NAMES, _aggregate_top3, _confidences, _topk_indices, model_error
+from bulk_stream import BULK_FORMATS, _CsvParser, _parse_ndjson, parse_error
+from metrics import MODEL_CALL_ROWS, SAMPLES
+from validation import range_errors
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("en_attente", "en_cours", "termine", "echec")
+TOP_K        = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    statut        TEXT NOT NULL,
+    format        TEXT NOT NULL,
+    fichier       TEXT NOT NULL,
+    version       TEXT NOT NULL,
+    model_version TEXT,
+    classes       TEXT,
+    cree_le       REAL NOT NULL,
+    debut         REAL,
+    fin           REAL,
+    octets_total  INTEGER NOT NULL,
+    octets_lus    INTEGER NOT NULL DEFAULT 0,
+    lignes_lues   INTEGER NOT NULL DEFAULT 0,
+    nb_resultats  INTEGER NOT NULL DEFAULT 0,
+    nb_valides    INTEGER NOT NULL DEFAULT 0,
+    nb_erreurs    INTEGER NOT NULL DEFAULT 0,
+    proba_sum     BLOB,
+    top3_global   TEXT,
+    erreur        TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_statut ON jobs (statut, cree_le);
+CREATE TABLE IF NOT EXISTS resultats (
+    job_id  TEXT    NOT NULL,
+    rang    INTEGER NOT NULL,
+    ligne   INTEGER NOT NULL,
+    top1    INTEGER, conf1 REAL,
+    top2    INTEGER, conf2 REAL,
+    top3    INTEGER, conf3 REAL,
+    erreur  TEXT,
+    PRIMARY KEY (job_id, rang)
+) WITHOUT ROWID;
+"""
+
+
+class JobNotFound(KeyError):
+    """Identifiant de job inconnu."""
+
+
+class QueueFull(RuntimeError):
+    """Trop de jobs en attente : la soumission est refusée."""
+
+
+def _iso(timestamp):
+    return None if timestamp is None else time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(timestamp))
+
+
+# ─── Stockage ────────────────────────────────────────────────────────────────
+class JobStore:
+    """Jobs et résultats dans une base SQLite (une connexion par thread, journal WAL)."""
+
+    def __init__(self, path: str):
+        self.path   = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db().executescript(_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def create(self, job_id: str, fmt: str, path: str, version: str) -> dict:
+        with self._db() as db:
+            db.execute(
+                "INSERT INTO jobs (id, statut, format, fichier, version, cree_le, octets_total) "
+                "VALUES (?, 'en_attente', ?, ?, ?, ?, ?)",
+                (job_id, fmt, path, version, time.time(), os.path.getsize(path)),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict:
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobNotFound(job_id)
+        return dict(row)
+
+    def count(self, status: str) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM jobs WHERE statut = ?", (status,)).fetchone()[0]
+
+    def unfinished(self) -> list:
+        """Jobs à (re)lancer, du plus ancien au plus récent."""
+        rows = self._db().execute(
+            "SELECT id FROM jobs WHERE statut IN ('en_attente', 'en_cours') ORDER BY cree_le"
+        ).fetchall()
+        return [r["id"] for r in rows]
+
+    def mark_running(self, job_id: str):
+        with self._db() as db:
+            db.execute("UPDATE jobs SET statut = 'en_cours', debut = COALESCE(debut, ?) WHERE id = ?",
+                       (time.time(), job_id))
+
+    def checkpoint(self, job_id: str, rows: list, state: dict):
+        """Résultats d'un bloc et nouvel état de reprise, dans une seule transaction."""
+        with self._db() as db:
+            db.executemany(
+                "INSERT INTO resultats (job_id, rang, ligne, top1, conf1, top2, conf2, top3, conf3, erreur) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(job_id,) + row for row in rows],
+            )
+            db.execute(
+                "UPDATE jobs SET octets_lus = ?, lignes_lues = ?, nb_resultats = ?, nb_valides = ?, "
+                "nb_erreurs = ?, proba_sum = ?, classes = ?, model_version = ? WHERE id = ?",
+                (state["octets_lus"], state["lignes_lues"], state["nb_resultats"], state["nb_valides"],
+                 state["nb_erreurs"], state["proba_sum"], state["classes"], state["model_version"], job_id),
+            )
+
+    def finish(self, job_id: str, status: str, top3_global: list = None, error: str = None):
+        with self._db() as db:
+            db.execute("UPDATE jobs SET statut = ?, fin = ?, top3_global = ?, erreur = ? WHERE id = ?",
+                       (status, time.time(), None if top3_global is None else fast_json.dumps(top3_global).decode(),
+                        error, job_id))
+
+    def results(self, job_id: str, offset: int, limit: int) -> list:
+        return [dict(r) for r in self._db().execute(
+            "SELECT * FROM resultats WHERE job_id = ? AND rang >= ? AND rang < ? ORDER BY rang",
+            (job_id, offset, offset + limit),
+        )]
+
+    def purge(self, older_than_s: float) -> int:
+        """Supprime les jobs terminés (ou en échec) depuis plus de `older_than_s` secondes."""
+        limit = time.time() - older_than_s
+        with self._db() as db:
+            ids = [r["id"] for r in db.execute(
+                "SELECT id FROM jobs WHERE statut IN ('termine', 'echec') AND fin < ?", (limit,))]
+            db.executemany("DELETE FROM resultats WHERE job_id = ?", [(i,) for i in ids])
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids])
+        return len(ids)
+
+
+# ─── Mise en forme ───────────────────────────────────────────────────────────
+def job_view(job: dict, results: list = None, offset: int = 0, limit: int = 0) -> dict:
+    """Représentation JSON d'un job (progression, Top-3 global, page de résultats)."""
+    classes = fast_json.loads(job["classes"]) if job["classes"] else []
+    view = {
+        "id":            job["id"],
+        "statut":        job["statut"],
+        "format":        job["format"],
+        "version":       job["version"],
+        "model_version": job["model_version"],
+        "cree_le":       _iso(job["cree_le"]),
+        "debut":         _iso(job["debut"]),
+        "fin":           _iso(job["fin"]),
+        "progression": {
+            "pourcentage":     round(100 * job["octets_lus"] / job["octets_total"], 1)
+                               if job["octets_total"] else 100.0,
+            "octets_lus":      job["octets_lus"],
+            "octets_total":    job["octets_total"],
+            "lignes_lues":     job["lignes_lues"],
+            "nb_echantillons": job["nb_valides"],
+            "nb_erreurs":      job["nb_erreurs"],
+        },
+        "top3_global":   fast_json.loads(job["top3_global"]) if job["top3_global"] else None,
+        "erreur":        job["erreur"],
+    }
+    if results is not None:
+        view["resultats"] = [_result_view(r, classes) for r in results]
+        view["page"] = {"offset": offset, "limit": limit, "total": job["nb_resultats"]}
+    return view
+
+
+def _result_view(row: dict, classes: list) -> dict:
+    if row["erreur"] is not None:
+        return {"ligne": row["ligne"], "erreur": row["erreur"]}
+    top3 = []
+    for rang in range(1, TOP_K + 1):
+        j = row[f"top{rang}"]
+        if j is not None:
+            top3.append({"rang": rang, "culture": classes[j], "confiance": row[f"conf{rang}"]})
+    return {"ligne": row["ligne"], "top3": top3}
+
+
+# ─── Exécution ───────────────────────────────────────────────────────────────
+class JobQueue:
+    """
+    Pool borné de workers (threads) qui exécutent les jobs du `JobStore`.
+
+    Args:
+        score:      fonction `(X, version) -> (all_probas, classes)`
+                    (batch_processor.predict_proba_matrix).
+        workers:    jobs exécutés simultanément.
+        chunk_rows: lignes scorées par appel au modèle (et par transaction).
+        max_queued: jobs en attente au-delà desquels `submit` lève QueueFull.
+    """
+
+    def __init__(self, store: JobStore, score, workers: int = 2, chunk_rows: int = 4096,
+                 max_queued: int = 100):
+        self.store      = store
+        self.score      = score
+        self.workers    = workers
+        self.chunk_rows = chunk_rows
+        self.max_queued = max_queued
+        self._executor  = None
+        self._stopping  = threading.Event()
+
+    # ── Cycle de vie ──────────────────────────────────────────────────────────
+    def start(self, retention_s: float = None) -> int:
+        """Démarre les workers et relance les jobs non terminés ; retourne leur nombre."""
+        if retention_s:
+            purged = self.store.purge(retention_s)
+            if purged:
+                logger.info("Jobs purgés : %d", purged)
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="jobs")
+        pending = self.store.unfinished()
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+        return len(pending)
+
+    def shutdown(self):
+        """Arrête les workers : un job en cours s'interrompt au bloc suivant et reprendra au redémarrage."""
+        self._stopping.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def check_capacity(self):
+        """Lève QueueFull si la file est pleine (à appeler aussi avant de recevoir le fichier)."""
+        if self.store.count("en_attente") >= self.max_queued:
+            raise QueueFull(f"{self.max_queued} jobs déjà en attente.")
+
+    def submit(self, path: str, fmt: str, version: str, job_id: str = None) -> dict:
+        """Enregistre le job (fichier déjà écrit dans `path`) et le place dans la file."""
+        if fmt not in BULK_FORMATS:
+            raise ValueError(f"Format inconnu : '{fmt}' (attendu : {BULK_FORMATS}).")
+        self.check_capacity()
+        job = self.store.create(job_id or uuid.uuid4().hex, fmt, path, version)
+        self._executor.submit(self._run, job["id"])
+        return job
+
+    def info(self) -> dict:
+        return {"workers": self.workers, "bloc": self.chunk_rows,
+                **{status: self.store.count(status) for status in JOB_STATUSES}}
+
+    # ── Un job ────────────────────────────────────────────────────────────────
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        self.store.mark_running(job_id)
+        try:
+            done = self._process(job)
+        except Exception as exc:
+            logger.warning("Job %s en échec : %s", job_id, exc)
+            self.store.finish(job_id, "echec", error=model_error(exc)["error"])
+            _remove(job["fichier"])
+            return
+        if not done:
+            return                                       # arrêt demandé : reprise au redémarrage
+        job = self.store.get(job_id)
+        top3 = (_aggregate_top3(np.frombuffer(job["proba_sum"])[None, :] / job["nb_valides"],
+                                fast_json.loads(job["classes"]))
+                if job["nb_valides"] else [])
+        self.store.finish(job_id, "termine", top3_global=top3)
+        _remove(job["fichier"])
+
+    def _process(self, job: dict) -> bool:
+        """Score le fichier depuis le dernier point de reprise ; False si interrompu."""
+        state = {
+            "octets_lus":    job["octets_lus"],
+            "lignes_lues":   job["lignes_lues"],
+            "nb_resultats":  job["nb_resultats"],
+            "nb_valides":    job["nb_valides"],
+            "nb_erreurs":    job["nb_erreurs"],
+            "proba_sum":     job["proba_sum"],
+            "classes":       job["classes"],
+            "model_version": job["model_version"],
+        }
+        X_chunk  = np.empty((self.chunk_rows, len(FEATURE_NAMES)), dtype=np.float64)
+        line_nos = np.empty(self.chunk_rows, dtype=np.int64)
+        n_chunk, pending = 0, []
+        parse    = _parse_ndjson if job["format"] == "ndjson" else None
+
+        with open(job["fichier"], "rb") as f:
+            if parse is None and state["octets_lus"]:
+                # Reprise d'un CSV : l'en-tête est relu, les lignes déjà traitées sautées
+                parse = _CsvParser(_first_line(f))
+            f.seek(state["octets_lus"])
+            offset, line_no = state["octets_lus"], state["lignes_lues"]
+            for raw in f:
+                offset  += len(raw)
+                line_no += 1
+                line     = raw.decode("utf-8").rstrip("\r\n")
+                if line.strip():
+                    if parse is None:
+                        parse   = _CsvParser(line)
+                        line_no = 0          # lignes de données, en-tête exclu (cf. bulk_stream)
+                    else:
+                        try:
+                            X_chunk[n_chunk] = parse(line)
+                        except (ValueError, KeyError, IndexError, TypeError) as exc:
+                            pending.append((line_no, parse_error(exc)))
+                        else:
+                            line_nos[n_chunk] = line_no
+                            n_chunk += 1
+                if n_chunk == self.chunk_rows or len(pending) >= self.chunk_rows:
+                    self._flush(job, state, X_chunk[:n_chunk], line_nos[:n_chunk], pending, offset, line_no)
+                    n_chunk, pending = 0, []
+                    if self._stopping.is_set():
+                        return False
+            self._flush(job, state, X_chunk[:n_chunk], line_nos[:n_chunk], pending, offset, line_no)
+        return True
+
+    def _flush(self, job: dict, state: dict, X: np.ndarray, line_nos: np.ndarray, pending: list,
+               offset: int, line_no: int):
+        """Score un bloc et valide résultats + point de reprise (même logique que bulk_stream)."""
+        bad = {}
+        for i, feature, message in range_errors(X):
+            bad.setdefault(i, f"{feature} : {message}")
+        keep = np.ones(len(X), dtype=bool)
+        keep[list(bad)] = False
+
+        rows = [(n, None, None, None, None, None, None, msg) for n, msg in pending]
+        rows += [(int(line_nos[i]), None, None, None, None, None, None, msg) for i, msg in bad.items()]
+        if keep.any():
+            all_probas, classes = self.score(X[keep], job["version"])
+            MODEL_CALL_ROWS.labels("jobs").observe(len(all_probas))
+            SAMPLES.labels("/jobs", "exact").inc(len(all_probas))
+            if state["classes"] is None:
+                state["classes"]       = fast_json.dumps(list(classes)).decode()
+                state["model_version"] = _bundle_version(job["version"])
+            idx   = _topk_indices(all_probas, TOP_K)
+            conf  = _confidences(all_probas, idx)
+            total = all_probas.sum(axis=0)
+            if state["proba_sum"] is not None:
+                total += np.frombuffer(state["proba_sum"])
+            state["proba_sum"]   = total.tobytes()
+            state["nb_valides"] += len(all_probas)
+            padded_idx  = [list(r) + [None] * (TOP_K - len(r)) for r in idx.tolist()]
+            padded_conf = [list(r) + [None] * (TOP_K - len(r)) for r in conf.tolist()]
+            rows += [(n, i[0], c[0], i[1], c[1], i[2], c[2], None)
+                     for n, i, c in zip(line_nos[keep].tolist(), padded_idx, padded_conf)]
+
+        rows.sort(key=lambda r: r[0])
+        rank = state["nb_resultats"]
+        state["nb_erreurs"]   += len(pending) + len(bad)
+        state["nb_resultats"] += len(rows)
+        state["octets_lus"], state["lignes_lues"] = offset, line_no
+        self.store.checkpoint(job["id"], [(rank + k,) + row for k, row in enumerate(rows)], state)
+
+
+def _first_line(f) -> str:
+    """Première ligne non vide du fichier (en-tête CSV)."""
+    f.seek(0)
+    for raw in f:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if line.strip():
+            return line
+    return ""
+
+
+def _bundle_version(version: str) -> str:
+    from batch_processor import registry
+
+    return registry.get(version)["version"]
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,297 @@
+"""
+metrics.py — Métriques Prometheus du service (format texte, sans dépendance)
+=============================================================================
+Compteurs, jauges et histogrammes à seaux fixes, rendus au format
+d'exposition texte de Prometheus (version 0.0.4) par `render()`.
+
+Coût d'une observation : une recherche dichotomique dans les bornes et trois
+incréments sous verrou (≈ 1 µs) — assez faible pour rester actif en production.
+
+Les métriques sont enregistrées dans le processus uvicorn, seul à servir
+/metrics : les étapes du chemin /predict/batch y sont mesurées, et le pool
+d'inférence n'exécute que `predict_proba`, dont la durée (mesurée dans le
+worker) est renvoyée avec le résultat et observée côté appelant
+(crops_model_predict_seconds, visible en pool "thread" comme "process").
+"""
+
+import bisect
+import os
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bornes des histogrammes de durée (secondes) : de 50 µs à 10 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+_REGISTRY = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._children  = {}
+        self._lock      = threading.Lock()
+        _REGISTRY.append(self)
+
+    def labels(self, *values):
+        """Série correspondant aux valeurs d'étiquettes (dans l'ordre de `labelnames`)."""
+        key   = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class Gauge(Counter):
+    """Jauge : valeur fixée par `set()` ou lue à chaque rendu via `set_function()`."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._function = None
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, fn):
+        self._function = fn
+
+    def render(self) -> list:
+        if self._function is not None:
+            value = self._function()
+            if value is not None:
+                self.labels().set(value)
+        return super().render()
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)      # dernier seau : +Inf
+        self.sum    = 0.0
+        self.count  = 0
+        self._lock  = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum       += value
+            self.count     += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, key, child):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class stage_timer:
+    """`with stage_timer("matrix"):` → observe la durée dans STAGE_SECONDS."""
+
+    __slots__ = ("_child", "_t0")
+
+    def __init__(self, stage: str):
+        self._child = STAGE_SECONDS.labels(stage)
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._t0)
+        return False
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : durée et nombre de requêtes par route (gabarit de chemin,
+    ex. /admin/models/{name}, pour borner la cardinalité) et code de statut.
+    Dépose aussi `scope["metrics_t0"]`, début de la requête, pour les endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        t0     = scope["metrics_t0"] = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "non_routee")
+            REQUEST_SECONDS.labels(route, scope["method"]).observe(time.perf_counter() - t0)
+            REQUESTS.labels(route, scope["method"], status).inc()
+
+
+def render() -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ─── Mémoire du processus ────────────────────────────────────────────────────
+def process_rss_bytes():
+    """RSS courant (Linux : /proc/self/statm), sinon le maximum atteint (getrusage)."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+# ─── Métriques du service ────────────────────────────────────────────────────
+STAGE_SECONDS = Histogram(
+    "crops_stage_duration_seconds",
+    "Durée de chaque étape de POST /predict/batch.",
+    ("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "crops_http_request_duration_seconds",
+    "Durée des requêtes HTTP, de la réception à la fin de la réponse.",
+    ("route", "method"),
+)
+REQUESTS = Counter(
+    "crops_http_requests_total",
+    "Requêtes HTTP traitées.",
+    ("route", "method", "status"),
+)
+SAMPLES = Counter(
+    "crops_samples_total",
+    "Échantillons de sol scorés.",
+    ("endpoint", "mode"),
+)
+BATCH_SIZE = Histogram(
+    "crops_batch_size",
+    "Nombre d'échantillons par requête (/predict/batch : ≤ 10, /predict/columns : ≤ 10 000).",
+    ("endpoint",),
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000),
+)
+MODEL_CALL_ROWS = Histogram(
+    "crops_model_call_rows",
+    "Lignes par appel au modèle (lots coalescés, blocs du flux en masse).",
+    ("source",),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "crops_model_load_seconds",
+    "Durée du dernier chargement de chaque version du registre (une série par nom, "
+    "écrasée à chaque rechargement).",
+    ("name", "backend"),
+)
+MODEL_PREDICT_SECONDS = Histogram(
+    "crops_model_predict_seconds",
+    "Durée de predict_proba par backend de modèle (mesurée dans le worker d'inférence).",
+    ("backend",),
+)
+MODEL_BYTES = Gauge(
+    "crops_model_bytes",
+    "Empreinte mémoire de chaque version chargée du modèle (octets).",
+    ("name", "backend"),
+)
+READY = Gauge("crops_ready", "1 si le modèle est chargé et préchauffé.")
+PROCESS_RSS = Gauge("process_resident_memory_bytes", "Mémoire résidente du processus (octets).")
+PROCESS_RSS.set_function(process_rss_bytes)
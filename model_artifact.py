@@ -0,0 +1,235 @@
+"""
+model_artifact.py — Artefact de modèle versionné et mappable en mémoire
+========================================================================
+`pickle.load` de model/top3_crop_model.pkl désérialise les 200 arbres dans
+chaque processus (copie privée, plusieurs secondes). L'artefact stocke à la
+place la forêt compilée (forest_engine) sous forme de tableaux .npy bruts :
+
+    model/top3_crop_model.artifact/
+        header.json     ← version du format, métadonnées (classes, features,
+                          accuracies…), dtype/shape/sha256 de chaque tableau
+        feature.npy  threshold.npy  left.npy  right.npy  value.npy
+        roots.npy    is_leaf.npy
+
+Au chargement, les tableaux sont ouverts avec `np.load(mmap_mode="r")` :
+aucune copie, et les workers d'une même machine partagent les pages via
+le cache du système. Les sommes de contrôle sont vérifiées avant usage ;
+en cas d'artefact absent, invalide ou d'une version inconnue, le chargeur
+revient au pickle existant.
+
+L'en-tête garde l'empreinte du pickle exporté (taille, mtime, sha256) : un
+pickle réentraîné sans nouvel export rend l'artefact périmé, et le chargeur
+sert alors le pickle (avertissement : relancer l'export).
+
+Usage :
+    python model_artifact.py export     # pkl → artefact
+    python model_artifact.py verify     # contrôle des sommes
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from forest_engine import CompiledForest, compile_model
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+HEADER_FILE    = "header.json"
+ENGINE_ARRAYS  = ("feature", "threshold", "left", "right", "value", "roots", "is_leaf")
+
+# Clés du bundle pickle recopiées telles quelles dans l'en-tête
+METADATA_KEYS = (
+    "feature_names", "classes", "cv_accuracy_mean", "cv_accuracy_std",
+    "test_accuracy", "top_k", "units", "references", "training",
+)
+
+
+class ArtifactError(Exception):
+    """Artefact absent, corrompu ou de version non supportée."""
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(pickle_path: str) -> dict:
+    """Empreinte du pickle source : taille, date de modification et sha256."""
+    stat = os.stat(pickle_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": _sha256(pickle_path)}
+
+
+def check_source(header: dict, pickle_path: str):
+    """
+    Vérifie que l'artefact provient du pickle actuel. Taille et mtime égaux
+    suffisent ; sinon (copie, checkout…) le sha256 tranche.
+
+    Raises:
+        ArtifactError: empreinte absente ou différente (artefact périmé).
+    """
+    if not pickle_path or not os.path.exists(pickle_path):
+        return                          # déploiement sans pickle : rien à comparer
+    source = header.get("source")
+    if not source:
+        raise ArtifactError("empreinte du pickle source absente (artefact antérieur) : réexporter")
+    stat = os.stat(pickle_path)
+    if (stat.st_size, stat.st_mtime_ns) == (source["size"], source["mtime_ns"]):
+        return
+    if stat.st_size != source["size"] or _sha256(pickle_path) != source["sha256"]:
+        raise ArtifactError(f"'{pickle_path}' a changé depuis l'export : artefact périmé, réexporter")
+
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+def export_artifact(bundle: dict, out_dir: str, source_path: str = None) -> dict:
+    """
+    Écrit l'artefact de `bundle` (bundle pickle : forêt sklearn + métadonnées).
+
+    Args:
+        source_path: pickle d'où vient `bundle` ; son empreinte est enregistrée
+                     pour détecter un réentraînement sans nouvel export.
+
+    Returns:
+        l'en-tête écrit dans out_dir/header.json.
+    """
+    engine = compile_model(bundle["model"])
+    if not isinstance(engine, CompiledForest):
+        raise ArtifactError("Seules les forêts d'arbres sklearn peuvent être exportées.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {}
+    for name in ENGINE_ARRAYS:
+        array = getattr(engine, name)
+        path  = os.path.join(out_dir, f"{name}.npy")
+        np.save(path, array)
+        arrays[name] = {
+            "file":   f"{name}.npy",
+            "dtype":  array.dtype.str,
+            "shape":  list(array.shape),
+            "sha256": _sha256(path),
+        }
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "metadata":       {k: bundle[k] for k in METADATA_KEYS if k in bundle},
+        "engine":         {
+            "max_depth":      engine.max_depth,
+            "n_trees":        engine.n_trees,
+            "classes_":       engine.classes_.tolist(),
+            "n_features_in_": engine.n_features_in_,
+        },
+        "arrays":         arrays,
+        "source":         source_fingerprint(source_path) if source_path else None,
+    }
+    # Version = empreinte des tableaux : change dès que le modèle change
+    header["version"] = hashlib.sha256(
+        "".join(a["sha256"] for a in arrays.values()).encode()
+    ).hexdigest()[:16]
+
+    with open(os.path.join(out_dir, HEADER_FILE), "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+    return header
+
+
+# ─── Chargement ──────────────────────────────────────────────────────────────
+def read_header(artifact_dir: str) -> dict:
+    path = os.path.join(artifact_dir, HEADER_FILE)
+    if not os.path.exists(path):
+        raise ArtifactError(f"En-tête introuvable : '{path}'.")
+    with open(path, encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(
+            f"Version de format non supportée : {header.get('format_version')} "
+            f"(attendue : {FORMAT_VERSION})."
+        )
+    return header
+
+
+def load_artifact(artifact_dir: str, verify: bool = True) -> dict:
+    """
+    Charge l'artefact sous forme de bundle (mêmes clés que le pickle, plus
+    "engine" et "version" ; "model" vaut None : la forêt sklearn n'est pas
+    reconstruite).
+    """
+    header = read_header(artifact_dir)
+    arrays = {}
+    for name in ENGINE_ARRAYS:
+        spec = header["arrays"][name]
+        path = os.path.join(artifact_dir, spec["file"])
+        if verify and _sha256(path) != spec["sha256"]:
+            raise ArtifactError(f"Somme de contrôle invalide : '{path}'.")
+        array = np.load(path, mmap_mode="r")
+        if array.dtype.str != spec["dtype"] or list(array.shape) != spec["shape"]:
+            raise ArtifactError(f"Tableau inattendu (dtype/shape) : '{path}'.")
+        arrays[name] = array
+
+    meta   = header["engine"]
+    engine = CompiledForest(
+        feature=arrays["feature"],
+        threshold=arrays["threshold"],
+        left=arrays["left"],
+        right=arrays["right"],
+        value=arrays["value"],
+        roots=arrays["roots"],
+        max_depth=meta["max_depth"],
+        classes_=meta["classes_"],
+        n_features_in_=meta["n_features_in_"],
+        is_leaf=arrays["is_leaf"],
+    )
+    return {
+        **header["metadata"],
+        "model":   None,
+        "engine":  engine,
+        "version": header["version"],
+        "source":  "artifact",
+    }
+
+
+def load_pickle_bundle(pickle_path: str) -> dict:
+    """Chargement historique : pickle + compilation de la forêt."""
+    stat = os.stat(pickle_path)
+    with open(pickle_path, "rb") as f:
+        bundle = pickle.load(f)
+    bundle["engine"]  = compile_model(bundle["model"])
+    bundle["version"] = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    bundle["source"]  = "pickle"
+    return bundle
+
+
+def load_model_bundle(pickle_path: str, artifact_dir: str, verify: bool = True) -> dict:
+    """Artefact si présent, valide et issu du pickle actuel, sinon repli sur le pickle."""
+    if artifact_dir and os.path.isdir(artifact_dir):
+        try:
+            check_source(read_header(artifact_dir), pickle_path)
+            return load_artifact(artifact_dir, verify=verify)
+        except (ArtifactError, KeyError, ValueError, OSError) as exc:
+            logger.warning("Artefact '%s' ignoré (%s) : repli sur le pickle.", artifact_dir, exc)
+    return load_pickle_bundle(pickle_path)
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    from batch_processor import _ARTIFACT_DIR, _MODEL_PATH
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if command == "export":
+        with open(_MODEL_PATH, "rb") as f:
+            header = export_artifact(pickle.load(f), _ARTIFACT_DIR, source_path=_MODEL_PATH)
+        size_mb = sum(
+            os.path.getsize(os.path.join(_ARTIFACT_DIR, a["file"])) for a in header["arrays"].values()
+        ) / 1024 / 1024
+        print(f"✔ Artefact exporté : {_ARTIFACT_DIR} (version {header['version']}, {size_mb:.1f} Mo)")
+    elif command == "verify":
+        header = load_artifact(_ARTIFACT_DIR, verify=True)
+        print(f"✔ Artefact valide : version {header['version']}")
+    else:
+        sys.exit(f"Commande inconnue : '{command}' (export | verify)")
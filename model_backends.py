@@ -0,0 +1,267 @@
+"""
+model_backends.py — Backends de modèle interchangeables et comparaison à la RF
+===============================================================================
+Le service n'exige du modèle qu'une méthode `predict_proba(X)` dont les
+colonnes suivent `bundle["classes"]` : la forêt sklearn est compilée
+(forest_engine), tout autre classifieur est servi tel quel. Ce module
+déclare les backends entraînables sur research_based_dataset.csv :
+
+   → "rf"     : Random Forest de référence (200 arbres, comme le notebook) ;
+   → "hgb"    : HistGradientBoostingClassifier ;
+   → "knn"    : k plus proches voisins (KD-tree) sur features standardisées ;
+   → "linear" : régression logistique multinomiale sur features standardisées.
+
+Sélection par configuration : MODEL_BACKEND=hgb (batch_processor) sert
+model/backends/hgb.pkl comme version "default" ; un backend peut aussi être
+enregistré comme version du registre (PUT /admin/models/{nom}). Chaque
+bundle chargé porte "backend" et "model_bytes" ; la latence de predict_proba
+est mesurée par backend (crops_model_predict_seconds).
+
+`compare` mesure, sur le jeu de test du notebook (20 %, stratifié, graine 42),
+l'accord Top-1 / Top-3 de chaque backend avec la RF de référence, sa
+précision, sa latence et son débit, puis désigne le backend le moins coûteux
+assez proche de la RF.
+
+Usage :
+    python model_backends.py train hgb knn linear     # → model/backends/<nom>.pkl
+    python model_backends.py compare --metric recouvrement_top3 --min-agreement 0.9
+"""
+
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+FEATURES        = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+TARGET          = "label"
+RANDOM_SEED     = 42
+BACKENDS_DIR    = "model/backends"
+DEFAULT_BACKEND = "rf"
+REFERENCE_PATHS = ("model/top3_crop_model.pkl", "model/top3_crop_model.artifact")
+
+
+# ─── Déclaration des backends ────────────────────────────────────────────────
+def _rf(seed):
+    from sklearn.ensemble import RandomForestClassifier
+
+    return RandomForestClassifier(n_estimators=200, random_state=seed, n_jobs=-1)
+
+
+def _hgb(seed):
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    return HistGradientBoostingClassifier(max_iter=200, learning_rate=0.1, early_stopping=True,
+                                          random_state=seed)
+
+
+def _knn(seed):
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return make_pipeline(StandardScaler(),
+                         KNeighborsClassifier(n_neighbors=25, weights="distance", algorithm="kd_tree"))
+
+
+def _linear(seed):
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return make_pipeline(StandardScaler(), LogisticRegression(max_iter=2000, random_state=seed))
+
+
+BACKENDS = {"rf": _rf, "hgb": _hgb, "knn": _knn, "linear": _linear}
+
+
+def backend_paths(name: str) -> tuple:
+    """(pickle, artefact) servis pour le backend `name` ("rf" : modèle historique)."""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend inconnu : '{name}' (attendu : {', '.join(BACKENDS)}).")
+    if name == DEFAULT_BACKEND:
+        return REFERENCE_PATHS
+    return os.path.join(BACKENDS_DIR, f"{name}.pkl"), ""
+
+
+def backend_name(bundle: dict) -> str:
+    """Backend d'un bundle chargé : clé "backend", sinon déduit du modèle."""
+    if bundle.get("backend"):
+        return bundle["backend"]
+    from forest_engine import CompiledForest
+
+    if isinstance(bundle.get("engine"), CompiledForest):
+        return "rf"
+    model = bundle.get("model")
+    return type(model[-1] if hasattr(model, "steps") else model).__name__
+
+
+def model_bytes(engine) -> int:
+    """Empreinte mémoire du modèle servi : tableaux de la forêt compilée, sinon taille du pickle."""
+    from forest_engine import CompiledForest
+
+    if isinstance(engine, CompiledForest):
+        from model_artifact import ENGINE_ARRAYS
+
+        return int(sum(getattr(engine, name).nbytes for name in ENGINE_ARRAYS))
+    return len(pickle.dumps(engine, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+# ─── Entraînement ────────────────────────────────────────────────────────────
+def notebook_split(dataset: str, seed: int = RANDOM_SEED) -> dict:
+    """Même découpage que train_top3_model.ipynb (test stratifié de 20 %)."""
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    from dataset_store import load_dataset
+
+    df = load_dataset(dataset, FEATURES + [TARGET])
+    X  = df[FEATURES].to_numpy(dtype=np.float64)
+    le = LabelEncoder()
+    y  = le.fit_transform(df[TARGET].astype(str))
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+    return {"label_encoder": le, "train": (X_train, y_train), "test": (X_test, y_test)}
+
+
+def train_backend(name: str, split: dict, seed: int = RANDOM_SEED) -> dict:
+    """Entraîne le backend et retourne son bundle (mêmes clés que le notebook, plus "backend")."""
+    X_train, y_train = split["train"]
+    X_test, y_test   = split["test"]
+    le               = split["label_encoder"]
+    started = time.perf_counter()
+    model   = BACKENDS[name](seed).fit(X_train, y_train)
+    return {
+        "model":         model,
+        "label_encoder": le,
+        "feature_names": FEATURES,
+        "classes":       list(le.classes_),
+        "test_accuracy": float((model.predict(X_test) == y_test).mean()),
+        "top_k":         3,
+        "units":         "N, P, K en mg/kg",
+        "backend":       name,
+        "training":      {"backend": name, "fit_s": round(time.perf_counter() - started, 2)},
+    }
+
+
+# ─── Comparaison ─────────────────────────────────────────────────────────────
+def _top3(proba: np.ndarray) -> np.ndarray:
+    return np.sort(np.argpartition(-proba, 2, axis=1)[:, :3], axis=1)
+
+
+def _latency(engine, X: np.ndarray, batch: int, repeat: int) -> np.ndarray:
+    starts = np.random.default_rng(0).integers(0, len(X) - batch + 1, size=repeat)
+    for start in starts[:5]:
+        engine.predict_proba(X[start:start + batch])
+    times = np.empty(repeat)
+    for i, start in enumerate(starts):
+        t0 = time.perf_counter()
+        engine.predict_proba(X[start:start + batch])
+        times[i] = time.perf_counter() - t0
+    return times
+
+
+def compare_backends(bundles: dict, reference: dict, split: dict, repeat: int = 200) -> dict:
+    """
+    Args:
+        bundles:   {nom: bundle chargé (avec "engine")}.
+        reference: bundle de la RF de référence.
+
+    Returns:
+        {nom: mesures} — accords avec la RF, précisions, latences, débit, mémoire.
+    """
+    X_test, y_test = split["test"]
+    ref_proba      = reference["engine"].predict_proba(X_test)
+    ref_top1, ref_top3 = ref_proba.argmax(1), _top3(ref_proba)
+
+    report = {}
+    for name, bundle in bundles.items():
+        engine = bundle["engine"]
+        if list(bundle["classes"]) != list(reference["classes"]):
+            raise ValueError(f"Backend '{name}' : classes différentes de la référence.")
+        proba   = engine.predict_proba(X_test)
+        top3    = _top3(proba)
+        single  = _latency(engine, X_test, 1, repeat)
+        t0      = time.perf_counter()
+        engine.predict_proba(X_test)
+        bulk_s  = time.perf_counter() - t0
+        report[name] = {
+            "accord_top1":      round(float((proba.argmax(1) == ref_top1).mean()), 4),
+            "accord_top3":      round(float((top3 == ref_top3).all(axis=1).mean()), 4),
+            "recouvrement_top3": round(float((top3[:, :, None] == ref_top3[:, None, :]).any(2).mean()), 4),
+            "precision_top1":   round(float((proba.argmax(1) == y_test).mean()), 4),
+            "precision_top3":   round(float((top3 == y_test[:, None]).any(1).mean()), 4),
+            "p50_ms":           round(float(np.percentile(single, 50)) * 1000, 4),
+            "p99_ms":           round(float(np.percentile(single, 99)) * 1000, 4),
+            "lignes_par_s":     round(len(X_test) / bulk_s),
+            "model_bytes":      model_bytes(engine),
+        }
+    return report
+
+
+AGREEMENT_METRICS = ("accord_top3", "recouvrement_top3", "accord_top1")
+
+
+def cheapest(report: dict, min_agreement: float, metric: str = "accord_top3",
+             reference: str = DEFAULT_BACKEND):
+    """
+    Backend le moins coûteux (p99 puis mémoire) dont l'accord atteint le seuil.
+
+    metric : "accord_top3" (même ensemble Top-3 que la RF), "recouvrement_top3"
+             (part des cultures du Top-3 RF retrouvées) ou "accord_top1".
+    """
+    eligible = [n for n, r in report.items() if n != reference and r[metric] >= min_agreement]
+    return min(eligible, key=lambda n: (report[n]["p99_ms"], report[n]["model_bytes"]), default=None)
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backends de modèle : entraînement et comparaison.")
+    sub    = parser.add_subparsers(dest="commande", required=True)
+
+    p_train = sub.add_parser("train", help="Entraîne des backends → model/backends/<nom>.pkl.")
+    p_train.add_argument("names", nargs="+", choices=[n for n in BACKENDS if n != DEFAULT_BACKEND])
+    p_train.add_argument("--dataset", default="data/research_based_dataset.csv")
+
+    p_cmp = sub.add_parser("compare", help="Accord Top-3 et débit des backends face à la RF.")
+    p_cmp.add_argument("--dataset", default="data/research_based_dataset.csv")
+    p_cmp.add_argument("--min-agreement", type=float, default=0.95)
+    p_cmp.add_argument("--metric", choices=AGREEMENT_METRICS, default="accord_top3")
+    p_cmp.add_argument("--repeat", type=int, default=200, help="Lots d'un échantillon mesurés.")
+    p_cmp.add_argument("--json", help="Écrit aussi le rapport JSON dans ce fichier.")
+    args = parser.parse_args()
+
+    split = notebook_split(args.dataset)
+    if args.commande == "train":
+        os.makedirs(BACKENDS_DIR, exist_ok=True)
+        for name in args.names:
+            bundle = train_backend(name, split)
+            path   = backend_paths(name)[0]
+            with open(path, "wb") as f:
+                pickle.dump(bundle, f)
+            print(f"✔ {name:7s} → {path} (accuracy test {bundle['test_accuracy']:.2%}, "
+                  f"{bundle['training']['fit_s']} s)")
+    else:
+        from model_artifact import load_model_bundle
+
+        reference = load_model_bundle(*REFERENCE_PATHS)
+        bundles   = {DEFAULT_BACKEND: reference}
+        for name in BACKENDS:
+            path = backend_paths(name)[0]
+            if name != DEFAULT_BACKEND and os.path.exists(path):
+                bundles[name] = load_model_bundle(path, "")
+        report = compare_backends(bundles, reference, split, args.repeat)
+
+        print(f"{'backend':8s} {'accord top1':>11s} {'accord top3':>11s} {'recouvr.':>9s} {'préc. top3':>10s} "
+              f"{'p50 ms':>8s} {'p99 ms':>8s} {'lignes/s':>10s} {'Kio':>9s}")
+        for name, r in report.items():
+            print(f"{name:8s} {r['accord_top1']:11.2%} {r['accord_top3']:11.2%} {r['recouvrement_top3']:9.2%} "
+                  f"{r['precision_top3']:10.2%} "
+                  f"{r['p50_ms']:8.3f} {r['p99_ms']:8.3f} {r['lignes_par_s']:10,d} {r['model_bytes'] / 1024:9.1f}")
+        choice = cheapest(report, args.min_agreement, args.metric)
+        print(f"\n→ Backend retenu ({args.metric} ≥ {args.min_agreement:.0%}) : "
+              f"{choice or 'aucun, garder la RF'}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"backends": report, "retenu": choice}, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,360 @@
+"""
+model_registry.py — Registre multi-versions avec rechargement à chaud
+======================================================================
+Permet de servir plusieurs bundles à la fois, sans redémarrer uvicorn :
+
+   → version active : servie par défaut, échangée atomiquement
+     (appel admin ou modification du fichier du modèle sur disque — un pickle
+     réentraîné est servi même si son artefact n'a pas été réexporté) ;
+   → version candidate : reçoit une fraction configurable du trafic, ou les
+     requêtes portant l'en-tête X-Model-Version, et peut être évaluée en
+     « shadow » (scorée hors chemin critique, sans être renvoyée).
+
+La configuration (versions connues, active, candidate, fraction, shadow) est
+persistée dans model/registry.json, remplacé atomiquement (os.replace). Chaque
+processus — y compris les workers du pool "process" — relit ce fichier et les
+dates de modification des modèles au plus toutes les `poll_s` secondes : un
+changement se propage donc à tous les workers sans coordination.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from model_artifact import HEADER_FILE, load_model_bundle
+from model_backends import backend_name, model_bytes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VERSION = "default"
+
+
+def _stamp(*paths) -> tuple:
+    """Empreinte (mtime, taille) des fichiers ; change dès qu'un fichier est remplacé."""
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+class UnknownVersionError(KeyError):
+    """Version absente du registre."""
+
+
+class ModelRegistry:
+    """
+    Args:
+        pickle_path:  pickle de la version "default".
+        artifact_dir: artefact mappable de la version "default".
+        config_path:  fichier de configuration partagé entre processus.
+        poll_s:       intervalle minimal entre deux vérifications des fichiers.
+    """
+
+    def __init__(self, pickle_path: str, artifact_dir: str,
+                 config_path: str = "model/registry.json", poll_s: float = 2.0):
+        self.config_path = config_path
+        self.poll_s      = poll_s
+        self._default    = {"pickle": pickle_path, "artifact": artifact_dir}
+        self._config     = self._default_config()
+        self._config_stamp = None
+        self._bundles    = {}     # nom → bundle chargé
+        self._stamps     = {}     # nom → empreinte des fichiers au chargement
+        self._next_poll  = {"config": 0.0, "models": 0.0}
+        self._lock       = threading.RLock()
+        self._sync_lock  = threading.Lock()   # une seule synchronisation à la fois
+        self._listeners  = []     # callbacks(bundle) appelés quand un bundle est remplacé/retiré
+
+    def _default_config(self) -> dict:
+        return {
+            "versions":  {DEFAULT_VERSION: dict(self._default)},
+            "active":    DEFAULT_VERSION,
+            "candidate": None,
+            "fraction":  0.0,
+            "shadow":    False,
+        }
+
+    # ── Lecture ───────────────────────────────────────────────────────────────
+    def get(self, name: str = None) -> dict:
+        """Bundle de la version `name` (active par défaut), chargé au besoin."""
+        self._maybe_sync()
+        config = self._config                      # instantané : échange atomique
+        name   = name or config["active"]
+        if name not in config["versions"]:
+            raise UnknownVersionError(name)
+        bundle = self._bundles.get(name)
+        if bundle is None:
+            with self._lock:
+                bundle = self._bundles.get(name)
+                if bundle is None:
+                    bundle = self._load(name, config["versions"][name])
+        return bundle
+
+    def routing(self) -> dict:
+        """Instantané de la configuration de routage."""
+        self._maybe_sync(models=False)
+        config = self._config
+        return {k: config[k] for k in ("active", "candidate", "fraction", "shadow")}
+
+    def choose(self, requested: str = None) -> str:
+        """
+        Version à utiliser pour une requête : en-tête explicite, sinon tirage
+        selon la fraction de trafic de la candidate, sinon l'active.
+        Ne charge aucun modèle : appelable depuis la boucle asyncio.
+        """
+        self._maybe_sync(models=False)
+        config = self._config
+        if requested:
+            if requested not in config["versions"]:
+                raise UnknownVersionError(requested)
+            return requested
+        if config["candidate"] and config["fraction"] > 0 and random.random() < config["fraction"]:
+            return config["candidate"]
+        return config["active"]
+
+    def info(self) -> dict:
+        self._maybe_sync(models=False)
+        config = self._config
+        versions = {}
+        for name, paths in config["versions"].items():
+            bundle = self._bundles.get(name)
+            versions[name] = {
+                **paths,
+                "charge":        bundle is not None,
+                "model_version": bundle and bundle["version"],
+                "source":        bundle and bundle.get("source"),
+                "backend":       bundle and bundle.get("backend"),
+                "model_bytes":   bundle and bundle.get("model_bytes"),
+                "load_s":        bundle and bundle.get("load_s"),
+                "artefact_perime": bundle and bundle.get("artefact_perime"),
+                "loaded_at":     bundle and bundle.get("loaded_at"),
+            }
+        return {**self.routing(), "versions": versions, "pid": os.getpid()}
+
+    def add_listener(self, callback):
+        """`callback(bundle)` est appelé quand un bundle chargé est remplacé ou retiré."""
+        self._listeners.append(callback)
+
+    # ── Administration (écrit la configuration partagée) ──────────────────────
+    def register(self, name: str, pickle_path: str, artifact_dir: str = None) -> dict:
+        """Ajoute (ou remplace) une version après l'avoir chargée avec succès."""
+        paths  = {"pickle": pickle_path, "artifact": artifact_dir or ""}
+        bundle = self._load(name, paths)
+        with self._lock:
+            config = json.loads(json.dumps(self._config))
+            config["versions"][name] = paths
+            self._write(config)
+        return {"name": name, "model_version": bundle["version"], "source": bundle.get("source")}
+
+    def activate(self, name: str):
+        """Échange atomique de la version active."""
+        self.get(name)                      # vérifie qu'elle se charge avant de basculer
+        promoted = self._config["candidate"] == name
+        self._update(active=name, **({"candidate": None, "fraction": 0.0, "shadow": False}
+                                     if promoted else {}))
+
+    def set_candidate(self, name: str = None, fraction: float = 0.0, shadow: bool = False):
+        if name is not None:
+            self.get(name)
+        if not 0.0 <= fraction <= 1.0:
+            raise ValueError("La fraction de trafic doit être comprise entre 0 et 1.")
+        self._update(candidate=name, fraction=fraction if name else 0.0, shadow=bool(name and shadow))
+
+    def unregister(self, name: str):
+        config = self._config
+        if name == config["active"]:
+            raise ValueError("Impossible de retirer la version active.")
+        if name not in config["versions"]:
+            raise UnknownVersionError(name)
+        with self._lock:
+            config = json.loads(json.dumps(config))
+            del config["versions"][name]
+            if config["candidate"] == name:
+                config.update(candidate=None, fraction=0.0, shadow=False)
+            self._write(config)
+            self._drop(name)
+
+    # ── Interne ───────────────────────────────────────────────────────────────
+    def _paths(self, paths: dict) -> list:
+        return [paths["pickle"], os.path.join(paths["artifact"], HEADER_FILE) if paths["artifact"] else ""]
+
+    def _load(self, name: str, paths: dict) -> dict:
+        stamp   = _stamp(*self._paths(paths))
+        started = time.perf_counter()
+        bundle  = load_model_bundle(paths["pickle"], paths["artifact"])
+        bundle["load_s"]      = round(time.perf_counter() - started, 4)
+        bundle["loaded_at"]   = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        bundle["name"]        = name
+        bundle["backend"]     = backend_name(bundle)
+        bundle["model_bytes"] = model_bytes(bundle["engine"])
+        # Artefact présent mais pickle servi : empreinte du pickle différente de celle de l'export
+        bundle["artefact_perime"] = bool(paths["artifact"] and os.path.isdir(paths["artifact"])
+                                         and bundle.get("source") == "pickle")
+        with self._lock:
+            previous = self._bundles.get(name)
+            self._bundles[name] = bundle          # échange atomique de la référence
+            self._stamps[name]  = stamp
+        if previous is not None and previous["version"] != bundle["version"]:
+            self._notify(previous)
+        logger.info("Modèle '%s' chargé (%s, version %s, %.3f s).",
+                    name, bundle.get("source"), bundle["version"], bundle["load_s"])
+        if bundle["artefact_perime"]:
+            logger.warning("Modèle '%s' : artefact '%s' périmé, pickle servi (relancer l'export).",
+                           name, paths["artifact"])
+        return bundle
+
+    def _drop(self, name: str):
+        previous = self._bundles.pop(name, None)
+        self._stamps.pop(name, None)
+        if previous is not None:
+            self._notify(previous)
+
+    def _notify(self, bundle: dict):
+        if any(b["version"] == bundle["version"] for b in self._bundles.values()):
+            return                      # même modèle encore servi sous un autre nom
+        for callback in self._listeners:
+            callback(bundle)
+
+    def _update(self, **changes):
+        with self._lock:
+            config = json.loads(json.dumps(self._config))
+            config.update(changes)
+            self._write(config)
+
+    def _write(self, config: dict):
+        """Écriture atomique : fichier temporaire puis os.replace."""
+        directory = os.path.dirname(self.config_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.config_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.config_path)
+        self._config       = config
+        self._config_stamp = _stamp(self.config_path)
+
+    def _maybe_sync(self, models: bool = True):
+        """
+        Relit la configuration partagée et, si `models`, recharge les versions
+        dont les fichiers ont changé (au plus une fois toutes les `poll_s` s).
+        """
+        now   = time.monotonic()
+        kinds = ("config", "models") if models else ("config",)
+        due   = [k for k in kinds if now >= self._next_poll[k]]
+        if not due or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            for kind in due:
+                self._next_poll[kind] = now + self.poll_s
+                if kind == "config":
+                    self._sync_config()
+                else:
+                    self._sync_models()
+        except Exception as exc:
+            # Un fichier en cours d'écriture ou invalide ne doit pas interrompre le service
+            logger.warning("Synchronisation du registre ignorée : %s", exc)
+        finally:
+            self._sync_lock.release()
+
+    def _sync_config(self):
+        """Configuration partagée modifiée par un autre processus ?"""
+        stamp = _stamp(self.config_path)
+        if stamp == self._config_stamp:
+            return
+        if stamp[0] is None:
+            config = self._default_config()
+        else:
+            with open(self.config_path, encoding="utf-8") as f:
+                config = json.load(f)
+        with self._lock:
+            self._config       = config
+            self._config_stamp = stamp
+            for name in list(self._bundles):
+                if name not in config["versions"]:
+                    self._drop(name)
+
+    def _sync_models(self):
+        """Fichiers de modèle remplacés sur disque → rechargement puis échange."""
+        for name, bundle_stamp in list(self._stamps.items()):
+            paths = self._config["versions"].get(name)
+            if paths and _stamp(*self._paths(paths)) != bundle_stamp:
+                logger.info("Modèle '%s' modifié sur disque : rechargement.", name)
+                previous = self._bundles.get(name)
+                bundle   = self._load(name, paths)
+                if previous is not None and previous["version"] == bundle["version"]:
+                    logger.warning("Modèle '%s' : fichiers modifiés mais version servie inchangée (%s).",
+                                   name, bundle["version"])
+
+
+class ShadowStats:
+    """Accord Top-3 et latences active vs candidate sur le trafic « shadow »."""
+
+    def __init__(self, max_samples: int = 10_000):
+        self._lock = threading.Lock()
+        self.max_samples = max_samples
+        self.reset()
+
+    def reset(self, candidate: str = None):
+        self.candidate     = candidate
+        self.samples       = 0
+        self.top1_agree    = 0
+        self.top3_agree    = 0
+        self.errors        = 0
+        self.skipped       = 0
+        self._lat_active   = []
+        self._lat_candidate = []
+
+    @staticmethod
+    def top3_names(result: dict) -> list:
+        """Cultures du Top-3 de chaque échantillon, quel que soit le format de réponse."""
+        if "indices" in result:
+            classes = result["classes"]
+            return [[classes[j] for j in row] for row in result["indices"].tolist()]
+        return [[x["culture"] for x in r["top3"]] for r in result["resultats_par_echantillon"]]
+
+    def record(self, active: dict, candidate: dict, active_ms: float, candidate_ms: float):
+        """Compare deux réponses de POST /predict/batch pour le même lot."""
+        if "error" in candidate:
+            with self._lock:
+                self.errors += 1
+            return
+        pairs = zip(self.top3_names(active), self.top3_names(candidate))
+        with self._lock:
+            for a_top, c_top in pairs:
+                self.samples    += 1
+                self.top1_agree += a_top[0] == c_top[0]
+                self.top3_agree += set(a_top) == set(c_top)
+            for series, value in ((self._lat_active, active_ms), (self._lat_candidate, candidate_ms)):
+                series.append(value)
+                del series[:-self.max_samples]
+
+    def skip(self):
+        """Lot non comparé (trop de comparaisons en cours, ou pool d'inférence occupé)."""
+        with self._lock:
+            self.skipped += 1
+
+    def summary(self) -> dict:
+        def pct(series, q):
+            if not series:
+                return None
+            ordered = sorted(series)
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+        n = self.samples or 1
+        return {
+            "candidate":       self.candidate,
+            "echantillons":    self.samples,
+            "accord_top1":     round(self.top1_agree / n, 4),
+            "accord_top3":     round(self.top3_agree / n, 4),
+            "erreurs":         self.errors,
+            "ignores":         self.skipped,
+            "latence_ms":      {
+                "active":    {"p50": pct(self._lat_active, 0.5), "p95": pct(self._lat_active, 0.95)},
+                "candidate": {"p50": pct(self._lat_candidate, 0.5), "p95": pct(self._lat_candidate, 0.95)},
+            },
+        }
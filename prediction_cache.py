@@ -0,0 +1,208 @@
+"""
+prediction_cache.py — Cache LRU quantifié des probabilités RF
+==============================================================
+Les applications terrain renvoient sans cesse des vecteurs identiques. Par
+défaut, la clé d'une ligne est la valeur float32 de chaque feature — la
+valeur que les arbres comparent à leurs seuils : un hit rend exactement les
+probabilités du modèle sur cette ligne (cache exact).
+
+Quantification (optionnelle, APPROXIMATION) : une résolution > 0 par feature
+
+   clé = round(x / résolution)  (par feature)
+
+regroupe les vecteurs quasi identiques ; le modèle est alors évalué au
+centre de la cellule (clé × résolution), si bien que deux vecteurs de la
+même cellule reçoivent les mêmes probabilités quel que soit l'ordre
+d'arrivée — mais pas celles de la forêt sur la ligne réelle. Aux
+résolutions SENSOR_RESOLUTIONS (précision des capteurs), sur
+research_based_dataset.csv : Top-1 modifié pour ~0,2 % des lignes,
+ensemble du Top-3 pour ~13 %. Seuls les défauts de cache sont envoyés au
+modèle.
+
+Éviction LRU (nombre d'entrées et mémoire bornés) et TTL. Les clés portent
+la version du modèle : plusieurs versions servies en parallèle (registre
+multi-versions) partagent le cache, et les entrées d'une version remplacée
+ou retirée sont purgées via `invalidate(version)`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_ENTRY_OVERHEAD = 200   # octets estimés par entrée hors tableau (clé, tuple, OrderedDict)
+
+# Par défaut : clés exactes (0 = pas de quantification pour la feature)
+DEFAULT_RESOLUTIONS = dict.fromkeys(("N", "P", "K", "temperature", "humidity", "ph", "rainfall"), 0.0)
+
+# Quantification approchée ≈ précision des capteurs / des relevés terrain ("capteurs")
+SENSOR_RESOLUTIONS = {
+    "N":           0.5,    # mg/kg
+    "P":           0.5,    # mg/kg
+    "K":           0.5,    # mg/kg
+    "temperature": 0.1,    # °C
+    "humidity":    0.5,    # %
+    "ph":          0.01,
+    "rainfall":    1.0,    # mm/an
+}
+
+
+def parse_resolutions(spec: str) -> dict:
+    """
+    Parse "N=1,ph=0.05" → {"N": 1.0, "ph": 0.05} (features non citées : exactes).
+    "capteurs" sélectionne SENSOR_RESOLUTIONS (approximation), complétable :
+    "capteurs,ph=0.05".
+    """
+    resolutions = dict(DEFAULT_RESOLUTIONS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        if item == "capteurs":
+            resolutions.update(SENSOR_RESOLUTIONS)
+            continue
+        name, _, value = item.partition("=")
+        if name not in resolutions:
+            raise ValueError(f"Feature inconnue pour la résolution du cache : '{name}'.")
+        resolutions[name] = float(value)
+    return resolutions
+
+
+class QuantizedLRUCache:
+    """
+    Cache borné {cellule quantifiée → vecteur de probabilités}.
+
+    Args:
+        feature_names: ordre des colonnes de X.
+        resolutions:   pas de quantification par feature (0 : clé exacte).
+        max_entries:   nombre maximal d'entrées (éviction LRU au-delà).
+        max_mb:        mémoire maximale estimée en Mo (None = bornée par max_entries seul).
+        ttl_s:         durée de vie d'une entrée en secondes (None = illimitée).
+    """
+
+    def __init__(self, feature_names: list, resolutions: dict = None,
+                 max_entries: int = 50_000, max_mb: float = None, ttl_s: float = None):
+        resolutions = {**DEFAULT_RESOLUTIONS, **(resolutions or {})}
+        self.feature_names = list(feature_names)
+        self.resolutions   = np.array([resolutions[f] for f in self.feature_names], dtype=np.float64)
+        if (self.resolutions < 0).any():
+            raise ValueError("Les résolutions du cache doivent être positives (0 : clé exacte).")
+        self._exact = self.resolutions == 0
+        self.max_entries = int(max_entries)
+        self.max_bytes   = None if max_mb is None else int(max_mb * 1024 * 1024)
+        self.ttl_s       = ttl_s
+        self._entry_bytes = 0           # taille estimée d'une entrée (connue au 1er stockage)
+
+        self._entries = OrderedDict()   # (version, cellule en bytes) → (probas, expire_à)
+        self._lock    = threading.Lock()
+
+        self.hits          = 0
+        self.misses        = 0
+        self.evictions     = 0
+        self.expirations   = 0
+        self.invalidations = 0
+
+    # ── API publique ──────────────────────────────────────────────────────────
+    @property
+    def exact(self) -> bool:
+        """True si aucune feature n'est quantifiée (hits identiques au modèle)."""
+        return bool(self._exact.all())
+
+    def quantize(self, X: np.ndarray) -> tuple:
+        """
+        (cellules, points évalués) pour chaque ligne de X. Features exactes :
+        cellule = valeur float32, point évalué = la ligne elle-même.
+        """
+        X       = np.asarray(X, dtype=np.float64)
+        exact32 = X.astype(np.float32).astype(np.float64)
+        steps   = np.where(self._exact, 1.0, self.resolutions)
+        cells   = np.where(self._exact, exact32, np.round(X / steps))
+        return cells, np.where(self._exact, X, cells * steps)
+
+    def predict_proba(self, X: np.ndarray, token, score) -> np.ndarray:
+        """
+        Probabilités pour chaque ligne de X, en n'appelant `score` que sur
+        les cellules absentes du cache (dédupliquées).
+
+        Args:
+            X:     matrice de features (n_samples, n_features).
+            token: version du modèle ; fait partie de la clé.
+            score: fonction `X -> all_probas` appelée sur les défauts.
+        """
+        cells, centers = self.quantize(X)
+        keys = [(token, row.tobytes()) for row in cells]
+        now  = time.monotonic()
+
+        found   = {}
+        missing = {}                    # clé → indice de la première ligne concernée
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in found or key in missing:
+                    continue
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing[key] = i
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+            self.misses += len(missing)
+            self.hits   += len(keys) - len(missing)
+
+        if missing:
+            rows   = list(missing.values())
+            probas = score(centers[rows])
+            expire = None if self.ttl_s is None else now + self.ttl_s
+            with self._lock:
+                self._entry_bytes = probas[0].nbytes + len(keys[0][1]) + _ENTRY_OVERHEAD
+                for key, proba in zip(missing, probas):
+                    self._entries[key] = (proba.copy(), expire)
+                    self._entries.move_to_end(key)
+                self._evict()
+            found.update(zip(missing, probas))
+
+        return np.stack([found[key] for key in keys])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, token):
+        """Purge les entrées produites par la version `token` du modèle."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == token]
+            for key in stale:
+                del self._entries[key]
+            if stale:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entrees":       len(self._entries),
+            "max_entrees":   self.max_entries,
+            "memoire_mo":    round(len(self._entries) * self._entry_bytes / 1024 / 1024, 2),
+            "max_mo":        None if self.max_bytes is None else round(self.max_bytes / 1024 / 1024, 2),
+            "ttl_s":         self.ttl_s,
+            "hits":          self.hits,
+            "misses":        self.misses,
+            "taux_hit":      round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions":     self.evictions,
+            "expirations":   self.expirations,
+            "invalidations": self.invalidations,
+            "exact":         self.exact,
+            "resolutions":   dict(zip(self.feature_names, self.resolutions.tolist())),
+        }
+
+    # ── Interne (appelé sous verrou) ──────────────────────────────────────────
+    def _capacity(self) -> int:
+        if self.max_bytes is None or not self._entry_bytes:
+            return self.max_entries
+        return min(self.max_entries, self.max_bytes // self._entry_bytes)
+
+    def _evict(self):
+        capacity = self._capacity()
+        while len(self._entries) > capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
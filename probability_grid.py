@@ -0,0 +1,351 @@
+"""
+probability_grid.py — Grille précalculée de probabilités (inférence approchée en O(1))
+=======================================================================================
+Les 7 features ont des plages agronomiques bornées (validateurs de `SoilSample`,
+plages de `generate_research_dataset.CROP_PARAMS`). La forêt est évaluée hors
+ligne sur une grille à résolution propre à chaque feature ; les probabilités
+(float16) sont stockées dans un fichier .npy mappé en mémoire.
+
+Résolution variable le long de chaque axe : les nœuds intérieurs sont placés
+aux quantiles des features du jeu d'entraînement (pas fin là où se trouvent
+les sols, large dans les marges), les extrémités aux bornes agronomiques.
+`--spacing uniforme` rétablit des nœuds équidistants.
+
+En service, le Top-3 se lit dans la grille :
+   → "proche"         : nœud de grille le plus proche ;
+   → "interpolation"  : interpolation multilinéaire entre les 2^7 nœuds voisins.
+
+Le taux d'accord avec la RF exacte sur le jeu de test (même découpage que
+train_top3_model.ipynb) est mesuré au build et stocké dans l'en-tête JSON.
+
+La grille n'atteint pas l'objectif de précision : une grille de ~3,5 M nœuds
+(~100 Mo) ne suit pas les frontières de décision de la forêt en 7 dimensions.
+Accord mesuré ≈ 85 % sur le Top-1 mais ≈ 51 % sur l'ensemble du Top-3
+(interpolation, nœuds aux quantiles ; 80 % / 40 % en uniforme), et moins de
+1 % des cellules ont leurs 2^7 coins d'accord sur le Top-3 : raffiner les
+axes ne suffit pas à approcher le seuil de 0,9. En conséquence :
+
+   → la grille est une construction optionnelle (`python probability_grid.py`),
+     non versionnée ; sans elle, ?mode=grille répond 503 ;
+   → même construite, le mode n'est servi que si l'accord Top-3 mesuré atteint
+     GRID_MIN_AGREEMENT (0,9 par défaut), sinon 409 : l'activer suppose
+     d'abaisser explicitement ce seuil en connaissance de cause.
+
+Usage :
+    python probability_grid.py                                   # grille par défaut
+    python probability_grid.py --points N=12,rainfall=16 --evaluate
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+
+from batch_processor import (
+    FEATURE_NAMES,
+    _load_bundle,
+    format_batch_result,
+    model_error,
+    samples_to_matrix,
+)
+
+GRID_PATH   = "model/proba_grid.npy"
+HEADER_PATH = "model/proba_grid.json"
+GRID_METHODS = ("interpolation", "proche")
+GRID_SPACINGS = ("quantiles", "uniforme")
+DATASET      = "data/research_based_dataset.csv"
+
+# Accord Top-3 (ensemble) minimal mesuré pour servir ?mode=grille
+GRID_MIN_AGREEMENT = float(os.getenv("GRID_MIN_AGREEMENT", "0.9"))
+
+# Nombre de nœuds par feature : plus fin là où la feature discrimine le plus
+DEFAULT_POINTS = {
+    "N":           9,
+    "P":           7,
+    "K":           9,
+    "temperature": 9,
+    "humidity":    9,
+    "ph":          7,
+    "rainfall":    11,
+}
+
+# Bornes des validateurs de SoilSample (app.py)
+_VALIDATOR_BOUNDS = {
+    "temperature": (-10.0, 50.0),
+    "humidity":    (0.0, 100.0),
+    "ph":          (0.0, 14.0),
+}
+
+
+# ─── Construction ────────────────────────────────────────────────────────────
+def agronomic_bounds(margin: float = 0.1) -> dict:
+    """
+    Enveloppe des plages de CROP_PARAMS (toutes cultures), élargie de `margin`
+    (fraction de l'étendue) puis bornée par les validateurs de SoilSample.
+    """
+    from generate_research_dataset import CROP_PARAMS
+
+    bounds = {}
+    for f in FEATURE_NAMES:
+        low  = min(p[f][0] for p in CROP_PARAMS.values())
+        high = max(p[f][1] for p in CROP_PARAMS.values())
+        pad  = (high - low) * margin
+        low, high = low - pad, high + pad
+        v_low, v_high = _VALIDATOR_BOUNDS.get(f, (0.0, np.inf))
+        bounds[f] = (max(low, v_low), min(high, v_high))
+    return bounds
+
+
+def _split(dataset: str = DATASET, seed: int = 42) -> tuple:
+    """(X_train, X_test) : découpage 80/20 stratifié du notebook."""
+    from sklearn.model_selection import train_test_split
+
+    from dataset_store import load_dataset
+
+    df = load_dataset(dataset, FEATURE_NAMES + ["label"])
+    return train_test_split(df[FEATURE_NAMES].values, test_size=0.2, random_state=seed, stratify=df["label"])
+
+
+def grid_axes(points: dict, spacing: str = "quantiles", dataset: str = DATASET) -> list:
+    """
+    Nœuds de chaque axe, des bornes agronomiques incluses : équidistants
+    ("uniforme") ou aux quantiles du jeu d'entraînement ("quantiles").
+    """
+    if spacing not in GRID_SPACINGS:
+        raise ValueError(f"Espacement inconnu : '{spacing}' (attendu : {GRID_SPACINGS}).")
+    bounds = agronomic_bounds()
+    if spacing == "uniforme":
+        return [np.linspace(*bounds[f], points[f]) for f in FEATURE_NAMES]
+    X_train = _split(dataset)[0]
+    axes    = []
+    for j, f in enumerate(FEATURE_NAMES):
+        axis = np.quantile(X_train[:, j], np.linspace(0, 1, points[f]))
+        axis[0], axis[-1] = min(axis[0], bounds[f][0]), max(axis[-1], bounds[f][1])
+        axes.append(np.unique(axis))        # nœuds confondus (feature discrète) fusionnés
+    return axes
+
+
+def build_grid(points: dict = None, grid_path: str = GRID_PATH,
+               header_path: str = HEADER_PATH, chunk_rows: int = 65_536,
+               spacing: str = "quantiles", dataset: str = DATASET) -> dict:
+    """
+    Évalue la forêt sur toute la grille et écrit les probabilités (float16)
+    dans `grid_path`, bloc par bloc, sans matérialiser la grille en mémoire.
+
+    Returns:
+        l'en-tête (dict) écrit dans `header_path`.
+    """
+    points = {**DEFAULT_POINTS, **(points or {})}
+    bundle = _load_bundle()
+    engine = bundle["engine"]
+    axes   = grid_axes(points, spacing, dataset)
+    shape  = tuple(len(a) for a in axes)
+    n_cells = int(np.prod(shape))
+
+    grid = np.lib.format.open_memmap(
+        grid_path, mode="w+", dtype=np.float16, shape=(n_cells, len(bundle["classes"]))
+    )
+    started = time.perf_counter()
+    for start in range(0, n_cells, chunk_rows):
+        flat  = np.arange(start, min(start + chunk_rows, n_cells))
+        index = np.unravel_index(flat, shape)
+        X     = np.column_stack([axis[i] for axis, i in zip(axes, index)])
+        grid[start:start + len(flat)] = engine.predict_proba(X)
+        print(f"\r  {start + len(flat):>10,d} / {n_cells:,d} nœuds", end="", flush=True)
+    grid.flush()
+    print()
+
+    header = {
+        "format":        1,
+        "model_version": bundle["version"],
+        "classes":       list(bundle["classes"]),
+        "feature_names": FEATURE_NAMES,
+        "axes":          {f: a.tolist() for f, a in zip(FEATURE_NAMES, axes)},
+        "spacing":       spacing,
+        "shape":         list(shape),
+        "dtype":         "float16",
+        "build_s":       round(time.perf_counter() - started, 1),
+    }
+    _write_header(header, header_path)
+    return header
+
+
+def _write_header(header: dict, header_path: str):
+    with open(header_path, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+
+
+# ─── Lecture ─────────────────────────────────────────────────────────────────
+class ProbabilityGrid:
+    """Grille de probabilités mappée en mémoire (lecture seule)."""
+
+    def __init__(self, grid_path: str = GRID_PATH, header_path: str = HEADER_PATH):
+        with open(header_path, encoding="utf-8") as f:
+            self.header = json.load(f)
+        self.classes = self.header["classes"]
+        self.axes    = [np.asarray(self.header["axes"][f]) for f in FEATURE_NAMES]
+        self.shape   = tuple(self.header["shape"])
+        flat         = np.load(grid_path, mmap_mode="r")
+        self.values  = flat.reshape(self.shape + (flat.shape[1],))
+
+        # Coins de l'hypercube autour d'un point : 2^7 combinaisons de {0, 1}
+        self._corners = np.array(list(itertools.product((0, 1), repeat=len(self.axes))))
+
+    def _positions(self, X: np.ndarray) -> tuple:
+        """Position continue de chaque valeur sur son axe (bornée à la grille)."""
+        X = np.asarray(X, dtype=np.float64)
+        pos = np.empty_like(X)
+        for j, axis in enumerate(self.axes):
+            pos[:, j] = np.interp(X[:, j], axis, np.arange(len(axis)))
+        outside = np.zeros(len(X), dtype=bool)
+        for j, axis in enumerate(self.axes):
+            outside |= (X[:, j] < axis[0]) | (X[:, j] > axis[-1])
+        return pos, outside
+
+    def predict_proba(self, X: np.ndarray, method: str = "interpolation") -> np.ndarray:
+        if method not in GRID_METHODS:
+            raise ValueError(f"Méthode inconnue : '{method}' (attendu : {GRID_METHODS}).")
+        pos, _ = self._positions(X)
+
+        if method == "proche":
+            idx = np.rint(pos).astype(np.intp)
+            return self.values[tuple(idx.T)].astype(np.float64)
+
+        upper = np.array(self.shape) - 1
+        low   = np.minimum(np.floor(pos).astype(np.intp), np.maximum(upper - 1, 0))
+        frac  = pos - low                                    # (n, 7) ∈ [0, 1]
+        idx   = np.minimum(low[:, None, :] + self._corners[None], upper)  # (n, 128, 7)
+        w     = np.where(self._corners[None], frac[:, None, :], 1 - frac[:, None, :]).prod(axis=2)
+        vals  = self.values[tuple(np.moveaxis(idx, 2, 0))].astype(np.float64)  # (n, 128, C)
+        proba = np.einsum("nk,nkc->nc", w, vals)
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def out_of_grid(self, X: np.ndarray) -> np.ndarray:
+        """Masque des lignes dont au moins une feature sort de la grille (valeur bornée)."""
+        return self._positions(X)[1]
+
+
+_grid = None
+
+
+def get_grid() -> ProbabilityGrid:
+    """Grille chargée paresseusement (une fois par processus)."""
+    global _grid
+    if _grid is None:
+        _grid = ProbabilityGrid()
+    return _grid
+
+
+def predict_batch_grid(samples: list, response_format: str = "verbose",
+                       method: str = "interpolation", version: str = None) -> dict:
+    """
+    Équivalent approché de `predict_batch_top3` : lecture dans la grille.
+    La réponse porte en plus un bloc "approximation" (méthode, accord mesuré).
+    Refusée ({"error", "status": 409}) si la grille n'a pas été construite
+    avec le modèle servi pour `version` (registre, MODEL_BACKEND) ou si
+    l'accord Top-3 mesuré est inférieur à GRID_MIN_AGREEMENT.
+    """
+    try:
+        grid       = get_grid()
+        served     = _load_bundle(version)["version"]
+        if grid.header["model_version"] != served:
+            return {
+                "error": (f"Grille construite pour le modèle {grid.header['model_version']}, "
+                          f"modèle servi : {served}. Relancer probability_grid.py ou utiliser le mode exact."),
+                "status": 409,
+            }
+        agreement  = grid.header.get("accord", {}).get(method, {})
+        if agreement.get("top3") is None or agreement["top3"] < GRID_MIN_AGREEMENT:
+            return {
+                "error": (f"Mode grille désactivé : accord Top-3 mesuré {agreement.get('top3')} "
+                          f"(Top-1 : {agreement.get('top1')}) < GRID_MIN_AGREEMENT = {GRID_MIN_AGREEMENT}. "
+                          "Utiliser le mode exact, ou abaisser GRID_MIN_AGREEMENT en connaissance de cause."),
+                "status": 409,
+            }
+        X_batch    = samples_to_matrix(samples)
+        all_probas = grid.predict_proba(X_batch, method)
+        result     = format_batch_result(all_probas, grid.classes, response_format)
+        result["approximation"] = {
+            "methode":        method,
+            "accord_top1":    agreement.get("top1"),
+            "accord_top3":    agreement.get("top3"),
+            "hors_grille":    int(grid.out_of_grid(X_batch).sum()),
+            "model_version":  grid.header["model_version"],
+        }
+        return result
+    except FileNotFoundError:
+        return {"error": (f"Grille non construite : '{GRID_PATH}' (mode optionnel, "
+                          "python probability_grid.py). Utiliser le mode exact."),
+                "status": 503}
+    except Exception as exc:
+        return model_error(exc)
+
+
+# ─── Accord avec la RF exacte ────────────────────────────────────────────────
+def evaluate_agreement(grid: ProbabilityGrid, dataset: str = DATASET, seed: int = 42) -> dict:
+    """
+    Compare grille et RF exacte sur le jeu de test du notebook (20 %, stratifié).
+
+    Returns:
+        {méthode: {"top1": accord du Top-1, "top3": accord de l'ensemble Top-3}}
+    """
+    from batch_processor import _topk_indices
+
+    X_test    = _split(dataset, seed)[1]
+    exact     = _load_bundle()["engine"].predict_proba(X_test)
+    exact_top = np.sort(_topk_indices(exact), axis=1)
+
+    report = {}
+    for method in GRID_METHODS:
+        approx     = grid.predict_proba(X_test, method)
+        approx_top = np.sort(_topk_indices(approx), axis=1)
+        report[method] = {
+            "top1": round(float((approx.argmax(1) == exact.argmax(1)).mean()), 4),
+            "top3": round(float((approx_top == exact_top).all(axis=1).mean()), 4),
+            "n":    len(X_test),
+        }
+    return report
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+def _parse_points(spec: str) -> dict:
+    points = {}
+    for item in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name not in DEFAULT_POINTS:
+            raise ValueError(f"Feature inconnue : '{name}'.")
+        points[name] = int(value)
+    return points
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit la grille de probabilités RF.")
+    parser.add_argument("--points", default="", help="Nœuds par feature, ex. N=12,rainfall=16")
+    parser.add_argument("--evaluate", action="store_true",
+                        help="Mesure seulement l'accord de la grille existante.")
+    parser.add_argument("--spacing", choices=GRID_SPACINGS, default="quantiles",
+                        help="Placement des nœuds : quantiles du jeu d'entraînement (défaut) ou uniforme.")
+    parser.add_argument("--dataset", default=DATASET,
+                        help="Jeu d'entraînement / d'évaluation : .csv, .parquet ou .arrow.")
+    args = parser.parse_args()
+
+    if not args.evaluate:
+        points = {**DEFAULT_POINTS, **_parse_points(args.points)}
+        print(f"Construction de la grille : {points} "
+              f"({int(np.prod(list(points.values()))):,d} nœuds)")
+        build_grid(points, spacing=args.spacing, dataset=args.dataset)
+
+    grid   = ProbabilityGrid()
+    report = evaluate_agreement(grid, args.dataset)
+    grid.header["accord"] = report
+    _write_header(grid.header, HEADER_PATH)
+
+    size_mb = os.path.getsize(GRID_PATH) / 1024 / 1024
+    print(f"✔ Grille : {GRID_PATH} ({size_mb:.1f} Mo)")
+    for method, r in report.items():
+        print(f"  {method:14s} accord Top-1 : {r['top1'] * 100:.2f} % | "
+              f"Top-3 : {r['top3'] * 100:.2f} % (n = {r['n']})"
+              + ("" if r["top3"] >= GRID_MIN_AGREEMENT else f"  → refusé en service (< {GRID_MIN_AGREEMENT})"))
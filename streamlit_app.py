@@ -2,13 +2,32 @@
 # ==============================================================================
 # Pour chaque échantillon de sol : Top-3 cultures + niveau de confiance (probas RF)
 # Pour le lot complet            : Top-3 agrégé (moyenne des probabilités sur N)
+# Mode import (CSV / Parquet)    : scoring par blocs (bulk_scoring.py), résultats
+#                                  en cache par empreinte du fichier + version du
+#                                  modèle, tableau paginé
 # ==============================================================================
 
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pickle
-from collections import Counter
+
+from batch_processor import _ARTIFACT_DIR, _MODEL_PATH, _aggregate_top3, _top3_batch
+from bulk_scoring import global_top3, page_frame, rows_with_top1, score_file
+from dataset_store import DEFAULT_BATCH_ROWS
+from fusiondata import SchemaError
+from model_artifact import load_model_bundle
+
+BULK_BATCH_ROWS    = int(os.getenv("BULK_BATCH_ROWS", str(DEFAULT_BATCH_ROWS)))
+BULK_CACHE_ENTRIES = int(os.getenv("BULK_CACHE_ENTRIES", "8"))   # fichiers scorés gardés en mémoire
+BULK_PAGE_SIZES    = (50, 100, 500, 1000)
+MODE_MANUAL        = "✍️ Saisie manuelle (≤ 10 échantillons)"
+MODE_FILE          = "📂 Import de fichier (CSV / Parquet)"
 
 # ─── Config page ──────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -46,46 +65,24 @@ st.markdown("""
 # ─── Chargement du modèle ────────────────────────────────────────────────────
 @st.cache_resource
 def load_bundle():
-    with open("model/top3_crop_model.pkl", "rb") as f:
-        bundle = pickle.load(f)
-    return bundle["model"], list(bundle["classes"])
+    # Artefact mappable (ou pickle en repli) → forêt compilée, sans dispatch joblib
+    bundle = load_model_bundle(_MODEL_PATH, _ARTIFACT_DIR)
+    return bundle["engine"], list(bundle["classes"]), bundle["version"]
 
 try:
-    model, classes = load_bundle()
+    model, classes, model_version = load_bundle()
 except FileNotFoundError:
     st.error("❌ Modèle introuvable : `model/top3_crop_model.pkl`.\n\n"
-             "Veuillez d'abord entraîner le modèle via `train_top3_model.ipynb`.")
+             "Veuillez d'abord construire le modèle : `python build_models.py`.")
     st.stop()
 
 FEATURE_NAMES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
 
 # ─── Helpers ─────────────────────────────────────────────────────────────────
 
-def top3_for_sample(proba: np.ndarray) -> list:
-    """Retourne le Top-3 (rang, culture, confiance %) trié par confiance décroissante."""
-    idx = np.argsort(proba)[::-1][:3]
-    return [
-        {
-            "rang":      i + 1,
-            "culture":   classes[j],
-            "confiance": round(float(proba[j]) * 100, 1),
-        }
-        for i, j in enumerate(idx)
-    ]
-
-
 def aggregate_top3(all_probas: np.ndarray) -> list:
     """Agrège les probabilités (moyenne) → Top-3 global du lot."""
-    mean_proba = all_probas.mean(axis=0)
-    idx        = np.argsort(mean_proba)[::-1][:3]
-    return [
-        {
-            "rang":              i + 1,
-            "culture":           classes[j],
-            "confiance_agregee": round(float(mean_proba[j]) * 100, 1),
-        }
-        for i, j in enumerate(idx)
-    ]
+    return _aggregate_top3(all_probas, classes)
 
 
 MEDALS = {1: "🥇", 2: "🥈", 3: "🥉"}
@@ -105,71 +102,13 @@ def render_top3_cards(top3: list):
         )
 
 
-# ─── Titre ────────────────────────────────────────────────────────────────────
-st.title("🌾 Recommandation de Cultures — Top-3")
-st.markdown(
-    "### Pour **chaque échantillon de sol** → Top-3 cultures adaptées + confiance  \n"
-    "### Pour le **lot complet (N vecteurs)** → Top-3 agrégé par moyenne des probabilités"
-)
-st.info(
-    "📐 Unités : **N, P, K en mg/kg** | **Température en °C** | "
-    "**Humidité en %** | **pH** | **Pluviométrie en mm/an**"
-)
-
-# ─── Formulaire ───────────────────────────────────────────────────────────────
-with st.form(key="batch_form"):
-    st.subheader("Paramètres des échantillons de sol")
-    num_samples = st.slider(
-        "Nombre d'échantillons (vecteurs de caractéristiques)",
-        min_value=1, max_value=10, value=3,
-        help="Chaque ligne correspond à un vecteur de caractéristiques de sol indépendant."
-    )
-
-    # En-têtes du tableau manuel
-    header_cols = st.columns([1, 1, 1, 1, 1, 1, 1])
-    labels = ["N (mg/kg)", "P (mg/kg)", "K (mg/kg)", "Temp (°C)", "Humidité (%)", "pH", "Pluie (mm)"]
-    for col, lbl in zip(header_cols, labels):
-        col.markdown(f"**{lbl}**")
-
-    samples = []
-    for i in range(num_samples):
-        cols = st.columns([1, 1, 1, 1, 1, 1, 1])
-        N    = cols[0].number_input(f"N_{i}",    min_value=0.0,   max_value=500.0,  value=90.0,  step=1.0,  key=f"N_{i}",    label_visibility="collapsed")
-        P    = cols[1].number_input(f"P_{i}",    min_value=0.0,   max_value=500.0,  value=42.0,  step=1.0,  key=f"P_{i}",    label_visibility="collapsed")
-        K    = cols[2].number_input(f"K_{i}",    min_value=0.0,   max_value=500.0,  value=43.0,  step=1.0,  key=f"K_{i}",    label_visibility="collapsed")
-        temp = cols[3].number_input(f"temp_{i}", min_value=-10.0, max_value=50.0,   value=20.0,  step=0.5,  key=f"temp_{i}", label_visibility="collapsed")
-        hum  = cols[4].number_input(f"hum_{i}",  min_value=0.0,   max_value=100.0,  value=82.0,  step=1.0,  key=f"hum_{i}",  label_visibility="collapsed")
-        ph   = cols[5].number_input(f"ph_{i}",   min_value=0.0,   max_value=14.0,   value=6.5,   step=0.1,  key=f"ph_{i}",   label_visibility="collapsed")
-        rain = cols[6].number_input(f"rain_{i}", min_value=0.0,   max_value=5000.0, value=200.0, step=5.0,  key=f"rain_{i}", label_visibility="collapsed")
-        samples.append({
-            "N": N, "P": P, "K": K,
-            "temperature": temp, "humidity": hum,
-            "ph": ph, "rainfall": rain,
-        })
-
-    submitted = st.form_submit_button("🚀 Lancer la prédiction Top-3", use_container_width=True)
-
-# ─── Prédiction ───────────────────────────────────────────────────────────────
-if submitted:
-    with st.spinner("Calcul des probabilités RF en cours..."):
-        df         = pd.DataFrame(samples)
-        X_batch    = df[FEATURE_NAMES].values
-        all_probas = model.predict_proba(X_batch)   # (n_samples, n_classes)
-
-        # Top-3 par échantillon
-        per_sample = [top3_for_sample(proba) for proba in all_probas]
-
-        # Top-3 agrégé (moyenne)
-        top3_global = aggregate_top3(all_probas)
-
-    st.success(f"✅ {len(samples)} échantillon(s) traité(s).")
-
-    # ── Résultat global ─────────────────────────────────────────────────────
+def render_global_top3(top3_global: list, n_samples: int, mean_proba: np.ndarray):
+    """Top-3 agrégé du lot et distribution des probabilités moyennes."""
     st.markdown("---")
     st.markdown('<div class="global-box">', unsafe_allow_html=True)
     st.subheader("🌍 Top-3 Global (agrégé sur l'ensemble du lot)")
     st.caption(
-        f"Agrégation par **moyenne des probabilités RF** sur les **{len(samples)} vecteur(s)**."
+        f"Agrégation par **moyenne des probabilités RF** sur les **{n_samples} vecteur(s)**."
     )
 
     gcols = st.columns(3)
@@ -185,50 +124,208 @@ if submitted:
 
     # Graphique des probabilités agrégées (tous les crops)
     st.markdown("#### Distribution des probabilités moyennes (toutes cultures)")
-    mean_proba = all_probas.mean(axis=0)
     proba_df   = pd.DataFrame({
         "Culture":   [c.replace("_", " ").title() for c in classes],
         "Confiance (%)": np.round(mean_proba * 100, 2),
     }).sort_values("Confiance (%)", ascending=False)
     st.bar_chart(proba_df.set_index("Culture")["Confiance (%)"], height=300)
 
-    # ── Résultats par échantillon ────────────────────────────────────────────
+
+# ─── Mode import : scoring par blocs, cache, pagination ──────────────────────
+@st.cache_resource
+def bulk_results_cache():
+    """Résultats partagés entre sessions : (empreinte du fichier, version du modèle) → résultat (LRU)."""
+    return OrderedDict(), threading.Lock()
+
+
+def score_upload(upload) -> tuple:
+    """
+    (résultat, clé de cache, vient du cache) du fichier importé : cache, sinon
+    scoring par blocs avec barre de progression.
+    """
+    data         = upload.getvalue()
+    key          = (hashlib.sha256(data).hexdigest(), model_version)
+    cache, lock  = bulk_results_cache()
+    with lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key], key, True
+
+    # Fichier temporaire : dataset_store lit CSV / Parquet / Arrow par blocs depuis un chemin
+    suffix = os.path.splitext(upload.name)[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(data)
+    bar = st.progress(0.0, text="Calcul des probabilités RF par blocs...")
+    try:
+        result = score_file(
+            tmp.name, model.predict_proba, classes, BULK_BATCH_ROWS,
+            on_progress=lambda done, total: bar.progress(done / max(total, 1),
+                                                         text=f"{done:,d} / {total:,d} lignes"),
+            model_version=model_version,
+        )
+    finally:
+        bar.empty()
+        os.remove(tmp.name)
+
+    with lock:
+        cache[key] = result
+        while len(cache) > BULK_CACHE_ENTRIES:
+            cache.popitem(last=False)
+    return result, key, False
+
+
+def render_bulk_mode():
+    upload = st.file_uploader(
+        "Fichier d'échantillons : colonnes N, P, K, temperature, humidity, ph, rainfall "
+        "(colonnes supplémentaires ignorées)",
+        type=["csv", "parquet", "arrow", "feather"],
+    )
+    if upload is None:
+        return
+    try:
+        result, key, cached = score_upload(upload)
+    except SchemaError as exc:
+        st.error(f"❌ {exc}")
+        return
+    except Exception as exc:
+        st.error(f"❌ Fichier illisible : {exc}")
+        return
+
+    origin = "résultat en cache" if cached else f"{result['elapsed_s']} s"
+    st.success(f"✅ {result['rows']:,d} ligne(s) traitée(s) ({origin}) — "
+               f"{result['invalid']:,d} ligne(s) invalide(s) ignorée(s).")
+    n_valid = result["rows"] - result["invalid"]
+    if n_valid:
+        render_global_top3(global_top3(result), n_valid, result["proba_sum"] / n_valid)
+
+    # ── Résultats par échantillon : une page du tableau, jamais un widget par ligne ──
     st.markdown("---")
     st.subheader("📋 Résultats par échantillon (Top-3 individuel)")
+    fcol, scol, pcol = st.columns([2, 1, 1])
+    culture = fcol.selectbox("Filtrer par culture de rang 1", ["(toutes)"] + sorted(classes))
+    rows    = None if culture == "(toutes)" else rows_with_top1(result, culture)
+    n_rows  = result["rows"] if rows is None else len(rows)
+    size    = scol.selectbox("Lignes par page", BULK_PAGE_SIZES, index=1)
+    n_pages = max(1, -(-n_rows // size))
+    page    = pcol.number_input(f"Page (sur {n_pages:,d})", min_value=1, max_value=n_pages, value=1)
+    start   = (page - 1) * size
+    st.caption(f"Lignes {min(start + 1, n_rows):,d}–{min(start + size, n_rows):,d} sur {n_rows:,d}")
+    st.dataframe(page_frame(result, start, start + size, rows), use_container_width=True)
+
+    # Export complet construit à la demande (pas à chaque interaction)
+    export_key = ("bulk_export",) + key
+    if st.button("📥 Préparer l'export CSV complet"):
+        st.session_state[export_key] = page_frame(result, 0, result["rows"]).to_csv().encode("utf-8")
+    if export_key in st.session_state:
+        st.download_button("Télécharger les résultats (CSV)", st.session_state[export_key],
+                           file_name=f"top3_{os.path.splitext(upload.name)[0]}.csv", mime="text/csv")
 
-    for i, (sample, top3) in enumerate(zip(samples, per_sample)):
-        with st.expander(f"Échantillon {i+1}  —  Top-1 : **{top3[0]['culture'].replace('_',' ').title()}** ({top3[0]['confiance']}%)", expanded=(len(samples) <= 3)):
-            ecol1, ecol2 = st.columns([1, 1])
-            with ecol1:
-                render_top3_cards(top3)
-            with ecol2:
-                mini_df = pd.DataFrame(top3).rename(columns={
-                    "rang": "Rang", "culture": "Culture", "confiance": "Confiance (%)"
-                })
-                mini_df["Culture"] = mini_df["Culture"].str.replace("_", " ").str.title()
-                st.dataframe(mini_df.set_index("Rang"), use_container_width=True)
-                # Mini bar chart confiance
-                st.bar_chart(mini_df.set_index("Culture")["Confiance (%)"], height=150)
-
-    # ── Tableau récapitulatif ────────────────────────────────────────────────
-    st.markdown("---")
-    st.subheader("📊 Tableau récapitulatif")
-    rows = []
-    for i, (sample, top3) in enumerate(zip(samples, per_sample)):
-        row = {
-            "Échantillon": f"#{i+1}",
-            "N": sample["N"], "P": sample["P"], "K": sample["K"],
-            "Temp": sample["temperature"], "Hum": sample["humidity"],
-            "pH": sample["ph"], "Pluie": sample["rainfall"],
-            "Top-1": f"{top3[0]['culture']} ({top3[0]['confiance']}%)",
-            "Top-2": f"{top3[1]['culture']} ({top3[1]['confiance']}%)" if len(top3) > 1 else "—",
-            "Top-3": f"{top3[2]['culture']} ({top3[2]['confiance']}%)" if len(top3) > 2 else "—",
-        }
-        rows.append(row)
-    recap_df = pd.DataFrame(rows).set_index("Échantillon")
-    st.dataframe(recap_df, use_container_width=True)
-
-    st.balloons()
+
+# ─── Titre ────────────────────────────────────────────────────────────────────
+st.title("🌾 Recommandation de Cultures — Top-3")
+st.markdown(
+    "### Pour **chaque échantillon de sol** → Top-3 cultures adaptées + confiance  \n"
+    "### Pour le **lot complet (N vecteurs)** → Top-3 agrégé par moyenne des probabilités"
+)
+st.info(
+    "📐 Unités : **N, P, K en mg/kg** | **Température en °C** | "
+    "**Humidité en %** | **pH** | **Pluviométrie en mm/an**"
+)
+
+# ─── Mode de saisie ───────────────────────────────────────────────────────────
+mode = st.radio("Mode", [MODE_MANUAL, MODE_FILE], horizontal=True, label_visibility="collapsed")
+
+if mode == MODE_FILE:
+    render_bulk_mode()
+else:
+    # ─── Formulaire ───────────────────────────────────────────────────────────
+    with st.form(key="batch_form"):
+        st.subheader("Paramètres des échantillons de sol")
+        num_samples = st.slider(
+            "Nombre d'échantillons (vecteurs de caractéristiques)",
+            min_value=1, max_value=10, value=3,
+            help="Chaque ligne correspond à un vecteur de caractéristiques de sol indépendant."
+        )
+
+        # En-têtes du tableau manuel
+        header_cols = st.columns([1, 1, 1, 1, 1, 1, 1])
+        labels = ["N (mg/kg)", "P (mg/kg)", "K (mg/kg)", "Temp (°C)", "Humidité (%)", "pH", "Pluie (mm)"]
+        for col, lbl in zip(header_cols, labels):
+            col.markdown(f"**{lbl}**")
+
+        samples = []
+        for i in range(num_samples):
+            cols = st.columns([1, 1, 1, 1, 1, 1, 1])
+            N    = cols[0].number_input(f"N_{i}",    min_value=0.0,   max_value=500.0,  value=90.0,  step=1.0,  key=f"N_{i}",    label_visibility="collapsed")
+            P    = cols[1].number_input(f"P_{i}",    min_value=0.0,   max_value=500.0,  value=42.0,  step=1.0,  key=f"P_{i}",    label_visibility="collapsed")
+            K    = cols[2].number_input(f"K_{i}",    min_value=0.0,   max_value=500.0,  value=43.0,  step=1.0,  key=f"K_{i}",    label_visibility="collapsed")
+            temp = cols[3].number_input(f"temp_{i}", min_value=-10.0, max_value=50.0,   value=20.0,  step=0.5,  key=f"temp_{i}", label_visibility="collapsed")
+            hum  = cols[4].number_input(f"hum_{i}",  min_value=0.0,   max_value=100.0,  value=82.0,  step=1.0,  key=f"hum_{i}",  label_visibility="collapsed")
+            ph   = cols[5].number_input(f"ph_{i}",   min_value=0.0,   max_value=14.0,   value=6.5,   step=0.1,  key=f"ph_{i}",   label_visibility="collapsed")
+            rain = cols[6].number_input(f"rain_{i}", min_value=0.0,   max_value=5000.0, value=200.0, step=5.0,  key=f"rain_{i}", label_visibility="collapsed")
+            samples.append({
+                "N": N, "P": P, "K": K,
+                "temperature": temp, "humidity": hum,
+                "ph": ph, "rainfall": rain,
+            })
+
+        submitted = st.form_submit_button("🚀 Lancer la prédiction Top-3", use_container_width=True)
+
+    # ─── Prédiction ───────────────────────────────────────────────────────────
+    if submitted:
+        with st.spinner("Calcul des probabilités RF en cours..."):
+            df         = pd.DataFrame(samples)
+            X_batch    = df[FEATURE_NAMES].values
+            all_probas = model.predict_proba(X_batch)   # (n_samples, n_classes)
+
+            # Top-3 par échantillon (sélection vectorisée sur toute la matrice)
+            per_sample = _top3_batch(all_probas, classes)
+
+            # Top-3 agrégé (moyenne)
+            top3_global = aggregate_top3(all_probas)
+
+        st.success(f"✅ {len(samples)} échantillon(s) traité(s).")
+
+        # ── Résultat global ─────────────────────────────────────────────────────
+        render_global_top3(top3_global, len(samples), all_probas.mean(axis=0))
+
+        # ── Résultats par échantillon ────────────────────────────────────────────
+        st.markdown("---")
+        st.subheader("📋 Résultats par échantillon (Top-3 individuel)")
+
+        for i, (sample, top3) in enumerate(zip(samples, per_sample)):
+            with st.expander(f"Échantillon {i+1}  —  Top-1 : **{top3[0]['culture'].replace('_',' ').title()}** ({top3[0]['confiance']}%)", expanded=(len(samples) <= 3)):
+                ecol1, ecol2 = st.columns([1, 1])
+                with ecol1:
+                    render_top3_cards(top3)
+                with ecol2:
+                    mini_df = pd.DataFrame(top3).rename(columns={
+                        "rang": "Rang", "culture": "Culture", "confiance": "Confiance (%)"
+                    })
+                    mini_df["Culture"] = mini_df["Culture"].str.replace("_", " ").str.title()
+                    st.dataframe(mini_df.set_index("Rang"), use_container_width=True)
+                    # Mini bar chart confiance
+                    st.bar_chart(mini_df.set_index("Culture")["Confiance (%)"], height=150)
+
+        # ── Tableau récapitulatif ────────────────────────────────────────────────
+        st.markdown("---")
+        st.subheader("📊 Tableau récapitulatif")
+        rows = []
+        for i, (sample, top3) in enumerate(zip(samples, per_sample)):
+            row = {
+                "Échantillon": f"#{i+1}",
+                "N": sample["N"], "P": sample["P"], "K": sample["K"],
+                "Temp": sample["temperature"], "Hum": sample["humidity"],
+                "pH": sample["ph"], "Pluie": sample["rainfall"],
+                "Top-1": f"{top3[0]['culture']} ({top3[0]['confiance']}%)",
+                "Top-2": f"{top3[1]['culture']} ({top3[1]['confiance']}%)" if len(top3) > 1 else "—",
+                "Top-3": f"{top3[2]['culture']} ({top3[2]['confiance']}%)" if len(top3) > 2 else "—",
+            }
+            rows.append(row)
+        recap_df = pd.DataFrame(rows).set_index("Échantillon")
+        st.dataframe(recap_df, use_container_width=True)
+
+        st.balloons()
 
 # ─── Sidebar ──────────────────────────────────────────────────────────────────
 with st.sidebar:
@@ -0,0 +1,44 @@
+"""
+Fixtures communes : une petite forêt entraînée sur des données synthétiques
+(7 features dans les plages agronomiques), sans dépendre des fichiers
+générés de model/ (cf. build_models.py).
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Bornes des 7 features (N, P, K, temperature, humidity, ph, rainfall)
+LOW  = np.array([0, 5, 5, 8, 14, 3.5, 20], dtype=np.float64)
+HIGH = np.array([140, 145, 205, 44, 100, 9.9, 3000], dtype=np.float64)
+
+
+def random_samples(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.round(LOW + rng.random((n, len(LOW))) * (HIGH - LOW), 2)
+
+
+@pytest.fixture(scope="session")
+def forest():
+    from sklearn.ensemble import RandomForestClassifier
+
+    X = random_samples(600)
+    # 5 classes définies par des seuils croisés : des arbres de profondeur variable
+    y = (X[:, 0] > 70).astype(int) + 2 * (X[:, 5] > 6.5) + (X[:, 6] > 1500)
+    return RandomForestClassifier(n_estimators=25, random_state=0).fit(X, y)
+
+
+@pytest.fixture(scope="session")
+def bundle(forest):
+    """Bundle pickle au format du notebook (clés lues par model_artifact)."""
+    return {
+        "model":         forest,
+        "feature_names": ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"],
+        "classes":       [f"culture_{c}" for c in forest.classes_],
+        "test_accuracy": 1.0,
+        "top_k":         3,
+    }
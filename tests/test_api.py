@@ -0,0 +1,78 @@
+"""
+Erreurs de requête (400 / 422) des endpoints : levées avant tout appel au
+modèle, elles sont testées sans démarrer le service (pas de lifespan).
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as service
+from batch_processor import FEATURE_NAMES
+from neighbor_index import MAX_K
+
+SAMPLE = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82, "ph": 6.5, "rainfall": 202.9}
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(service.app)
+
+
+@pytest.mark.parametrize("params, status", [
+    ("format=tableau",                   400),
+    ("mode=approche",                    400),
+    ("mode=grille&explication=true",     400),
+    (f"voisins={MAX_K + 1}",             422),
+    ("voisins=-1",                       422),
+])
+def test_batch_query_errors(client, params, status):
+    assert client.post(f"/predict/batch?{params}", json={"samples": [SAMPLE]}).status_code == status
+
+
+@pytest.mark.parametrize("body", [
+    {"samples": []},
+    {"samples": [SAMPLE] * 11},
+    {"samples": [{**SAMPLE, "ph": 15}]},
+    {"samples": [{**SAMPLE, "temperature": 60}]},
+    {"samples": [{k: v for k, v in SAMPLE.items() if k != "K"}]},
+])
+def test_batch_body_errors(client, body):
+    assert client.post("/predict/batch", json=body).status_code == 422
+
+
+def test_columns_errors_point_to_field_and_row(client):
+    body = {f: [SAMPLE[f], SAMPLE[f]] for f in FEATURE_NAMES}
+    body["ph"] = [6.5, 15]
+    response = client.post("/predict/columns", json=body)
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "ph", 1]
+
+
+def test_columns_invalid_json_and_query(client):
+    response = client.post("/predict/columns", content=b"{pas du json",
+                           headers={"content-type": "application/json"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+    body = {f: [SAMPLE[f]] for f in FEATURE_NAMES}
+    assert client.post("/predict/columns?format=tableau", json=body).status_code == 400
+    assert client.post(f"/predict/columns?voisins={MAX_K + 1}", json=body).status_code == 422
+
+
+def test_columns_row_cap(client, monkeypatch):
+    monkeypatch.setattr(service, "COLUMNAR_MAX_ROWS", 3)
+    body = {f: [SAMPLE[f]] * 4 for f in FEATURE_NAMES}
+    assert client.post("/predict/columns", json=body).status_code == 422
+
+
+def test_bulk_errors(client, monkeypatch):
+    assert client.post("/predict/bulk?format=xlsx", content=b"").status_code == 400
+    monkeypatch.setattr(service, "BULK_MAX_LINE_BYTES", 16)
+    response = client.post("/predict/bulk?format=ndjson", content=b'{"N": 90, "P": 42, "K": 43}\n')
+    assert response.status_code == 422
+    assert "octets" in response.json()["detail"]
+    assert client.post("/predict/bulk?format=csv", content=b"\xff\xfe,\n").status_code == 422
+
+
+def test_zone_body_errors(client):
+    assert client.post("/predict/zone", json={"ph": 6.5}).status_code == 422
+    assert client.post("/predict/zone", json={"zone": "savane", "ph": 15}).status_code == 422
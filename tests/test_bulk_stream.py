@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import fast_json
+from bulk_stream import LineTooLong, iter_lines, prefetch, stream_bulk_predictions
+
+CLASSES = ["a", "b", "c", "d"]
+ROW     = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82, "ph": 6.5, "rainfall": 202.9}
+
+
+async def fake_score(X):
+    """Probabilités déterministes : la classe 0 domine quand N est grand."""
+    logits = np.column_stack([X[:, 0], X[:, 1], X[:, 2], np.zeros(len(X))])
+    probas = np.exp(logits / 100)
+    return probas / probas.sum(axis=1, keepdims=True), CLASSES
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def run_stream(lines, fmt, chunk_size=2):
+    async def collect():
+        return [fast_json.loads(out) async for out in
+                stream_bulk_predictions(_aiter(lines), fmt, fake_score, chunk_size)]
+    return asyncio.run(collect())
+
+
+def test_ndjson_lines_and_errors_in_file_order():
+    lines = [fast_json.dumps(ROW).decode(),
+             "{pas du json",
+             fast_json.dumps({k: v for k, v in ROW.items() if k != "P"}).decode(),
+             "",
+             fast_json.dumps({**ROW, "ph": 15}).decode(),
+             fast_json.dumps({**ROW, "N": 10}).decode()]
+    out = run_stream(lines, "ndjson")
+    assert [o.get("ligne") for o in out[:-1]] == [1, 2, 3, 5, 6]
+    assert out[0]["top3"][0]["culture"] == "a"
+    assert out[1]["erreur"].startswith("ligne illisible")
+    assert out[2]["erreur"] == "champ manquant : P"
+    assert out[3]["erreur"] == "ph : doit être compris entre 0 et 14"
+    assert out[-1]["nb_echantillons"] == 2 and out[-1]["nb_erreurs"] == 3
+
+
+def test_csv_columns_in_any_order_and_data_line_numbers():
+    header = ",".join(reversed(list(ROW)))
+    values = ",".join(str(v) for v in reversed(list(ROW.values())))
+    out = run_stream([header, values, "1,2", values], "csv")
+    assert [o.get("ligne") for o in out[:-1]] == [1, 2, 3]           # en-tête non compté
+    assert "moins de valeurs" in out[1]["erreur"]
+    assert out[0]["top3"] == out[2]["top3"]
+
+
+def test_csv_header_missing_column_is_reported_in_stream():
+    out = run_stream(["N,P,K", "1,2,3"], "csv")
+    assert "Colonnes manquantes" in out[-1]["error"]
+
+
+def test_iter_lines_splits_across_chunks():
+    async def collect():
+        return [line async for line in iter_lines(_aiter([b"ab", b"c\r\nde", b"f\n", b"g"]), 10)]
+    assert asyncio.run(collect()) == ["abc", "def", "g"]
+
+
+def test_iter_lines_rejects_long_first_line_before_streaming():
+    async def first():
+        return await prefetch(iter_lines(_aiter([b"x" * 20, b"\n"]), max_line_bytes=10))
+    with pytest.raises(LineTooLong):
+        asyncio.run(first())
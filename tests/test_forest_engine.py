@@ -0,0 +1,47 @@
+import numpy as np
+
+import forest_engine
+from forest_engine import CompiledForest, compile_model
+
+from conftest import random_samples
+
+
+def test_predict_proba_matches_sklearn(forest):
+    engine = CompiledForest.from_sklearn(forest)
+    for n in (1, 7, forest_engine._SMALL_BLOCK + 1, forest_engine._ROWS_PER_BLOCK + 3):
+        X = random_samples(n, seed=n)
+        np.testing.assert_allclose(engine.predict_proba(X), forest.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_thresholds_compare_in_float32(forest):
+    # Valeurs exactement sur les seuils : même côté que sklearn (features converties en float32)
+    engine = CompiledForest.from_sklearn(forest)
+    tree   = forest.estimators_[0].tree_
+    nodes  = np.flatnonzero(tree.children_left != -1)
+    X      = random_samples(len(nodes), seed=1)
+    X[np.arange(len(nodes)), tree.feature[nodes]] = tree.threshold[nodes]
+    np.testing.assert_allclose(engine.predict_proba(X), forest.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_apply_matches_sklearn_leaves(forest):
+    engine = CompiledForest.from_sklearn(forest)
+    X      = random_samples(50, seed=2)
+    leaves = engine.apply(X) - engine.roots          # indices locaux à chaque arbre
+    np.testing.assert_array_equal(leaves, forest.apply(X))
+
+
+def test_contributions_are_additive(forest):
+    engine = CompiledForest.from_sklearn(forest)
+    X      = random_samples(forest_engine._EXPLAIN_ROWS * 2 + 5, seed=3)
+    contributions = engine.contributions(X)
+    assert contributions.shape == (len(X), X.shape[1], engine.n_classes)
+    np.testing.assert_allclose(engine.bias + contributions.sum(axis=1), engine.predict_proba(X),
+                               rtol=0, atol=1e-12)
+
+
+def test_compile_model_leaves_other_models_untouched(forest):
+    engine = compile_model(forest)
+    assert isinstance(engine, CompiledForest)
+    assert compile_model(engine) is engine
+    other = object()
+    assert compile_model(other) is other
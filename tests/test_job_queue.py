@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+import pytest
+
+import fast_json
+import job_queue
+from job_queue import JobQueue, JobStore
+
+CLASSES = ["a", "b", "c", "d"]
+ROW     = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82, "ph": 6.5, "rainfall": 202.9}
+
+
+def score(X, version):
+    probas = np.column_stack([X[:, 0], X[:, 1], X[:, 2], np.ones(len(X))])
+    return probas / probas.sum(axis=1, keepdims=True), CLASSES
+
+
+@pytest.fixture(autouse=True)
+def no_registry(monkeypatch):
+    # La version servie est lue dans le registre : hors sujet ici
+    monkeypatch.setattr(job_queue, "_bundle_version", lambda version: "test")
+
+
+def write_csv(path, n: int, bad_line: int = None) -> str:
+    lines = [",".join(ROW)]
+    for i in range(1, n + 1):
+        values = {**ROW, "N": i, "ph": 15 if i == bad_line else ROW["ph"]}
+        lines.append(",".join(str(v) for v in values.values()))
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def wait_finished(store, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while store.get(job_id)["statut"] not in ("termine", "echec"):
+        assert time.monotonic() < deadline, "job non terminé"
+        time.sleep(0.01)
+    return store.get(job_id)
+
+
+def test_interrupted_job_resumes_without_loss_or_duplicates(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    job   = store.create("j1", "csv", write_csv(tmp_path / "in.csv", 10, bad_line=4), "default")
+
+    # Premier passage : arrêt demandé dès le premier bloc validé
+    queue = JobQueue(store, score, workers=1, chunk_rows=3)
+    def stop_after_first_block(X, version):
+        queue._stopping.set()
+        return score(X, version)
+    queue.score = stop_after_first_block
+    store.mark_running("j1")
+    assert queue._process(job) is False
+    interrupted = store.get("j1")
+    assert interrupted["statut"] == "en_cours" and interrupted["nb_resultats"] == 3
+
+    # Redémarrage : le job non terminé reprend au dernier point de reprise
+    queue = JobQueue(store, score, workers=1, chunk_rows=3)
+    assert queue.start() == 1
+    done = wait_finished(store, "j1")
+    queue.shutdown()
+
+    results = store.results("j1", 0, 100)
+    assert done["statut"] == "termine"
+    assert [r["ligne"] for r in results] == list(range(1, 11))
+    assert [r["rang"] for r in results] == list(range(10))
+    assert done["nb_valides"] == 9 and done["nb_erreurs"] == 1
+    assert results[3]["erreur"] == "ph : doit être compris entre 0 et 14"
+    # Agrégat identique à un passage sans interruption
+    X = np.array([[i, *list(ROW.values())[1:]] for i in range(1, 11) if i != 4], dtype=np.float64)
+    np.testing.assert_allclose(np.frombuffer(done["proba_sum"]), score(X, None)[0].sum(axis=0))
+    assert fast_json.loads(done["top3_global"])[0]["culture"] == "c"
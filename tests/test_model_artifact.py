@@ -0,0 +1,56 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from model_artifact import ArtifactError, export_artifact, load_artifact, load_model_bundle
+
+from conftest import random_samples
+
+
+@pytest.fixture
+def exported(tmp_path, bundle):
+    pickle_path  = str(tmp_path / "model.pkl")
+    artifact_dir = str(tmp_path / "model.artifact")
+    with open(pickle_path, "wb") as f:
+        pickle.dump(bundle, f)
+    header = export_artifact(bundle, artifact_dir, source_path=pickle_path)
+    return pickle_path, artifact_dir, header
+
+
+def test_artifact_round_trip(exported, forest):
+    pickle_path, artifact_dir, header = exported
+    loaded = load_model_bundle(pickle_path, artifact_dir)
+    assert loaded["source"] == "artifact"
+    assert loaded["version"] == header["version"]
+    assert loaded["classes"] == [f"culture_{c}" for c in forest.classes_]
+    assert not loaded["engine"].threshold.flags.owndata     # tableaux mappés, pas copiés
+    X = random_samples(40, seed=4)
+    np.testing.assert_allclose(loaded["engine"].predict_proba(X), forest.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_header_records_source_fingerprint(exported):
+    pickle_path, _, header = exported
+    assert header["source"]["size"] == os.path.getsize(pickle_path)
+    assert len(header["source"]["sha256"]) == 64
+
+
+def test_stale_artifact_falls_back_to_pickle(exported, bundle):
+    pickle_path, artifact_dir, _ = exported
+    with open(pickle_path, "wb") as f:                  # réentraînement sans nouvel export
+        pickle.dump({**bundle, "test_accuracy": 0.5}, f)
+    loaded = load_model_bundle(pickle_path, artifact_dir)
+    assert loaded["source"] == "pickle"
+    assert loaded["test_accuracy"] == 0.5
+
+
+def test_corrupted_array_is_rejected(exported):
+    pickle_path, artifact_dir, _ = exported
+    path  = os.path.join(artifact_dir, "threshold.npy")
+    array = np.load(path)
+    array[0] += 1.0
+    np.save(path, array)
+    with pytest.raises(ArtifactError):
+        load_artifact(artifact_dir)
+    assert load_model_bundle(pickle_path, artifact_dir)["source"] == "pickle"
@@ -0,0 +1,59 @@
+import numpy as np
+
+from batch_processor import FEATURE_NAMES
+from prediction_cache import SENSOR_RESOLUTIONS, QuantizedLRUCache
+
+
+class CountingScore:
+    """Fonction de scoring qui mémorise les lignes reçues."""
+
+    def __init__(self):
+        self.rows = []
+
+    def __call__(self, X):
+        self.rows.extend(map(tuple, X))
+        return np.column_stack([X.sum(axis=1), -X.sum(axis=1)])
+
+
+def test_default_keys_are_exact_float32():
+    cache = QuantizedLRUCache(FEATURE_NAMES)
+    score = CountingScore()
+    assert cache.exact
+    X = np.array([[90, 42, 43, 20.8, 82, 6.5, 202.9]] * 2)
+    X[1, 5] = np.nextafter(np.float32(6.5), np.float32(7))   # autre valeur float32 : autre clé
+    out = cache.predict_proba(X, "v1", score)
+    assert len(score.rows) == 2
+    # Les lignes évaluées sont les lignes reçues, sans arrondi
+    np.testing.assert_array_equal(np.array(score.rows), X)
+    np.testing.assert_array_equal(out, score(X))
+
+
+def test_hits_return_the_stored_probabilities():
+    cache = QuantizedLRUCache(FEATURE_NAMES)
+    score = CountingScore()
+    X = np.array([[90, 42, 43, 20.8, 82, 6.5, 202.9], [20, 67, 20, 25.1, 60, 5.8, 900]])
+    first  = cache.predict_proba(X, "v1", score)
+    second = cache.predict_proba(X[::-1], "v1", score)
+    assert len(score.rows) == 2 and cache.hits == 2
+    np.testing.assert_array_equal(second, first[::-1])
+
+
+def test_model_version_is_part_of_the_key():
+    cache = QuantizedLRUCache(FEATURE_NAMES)
+    score = CountingScore()
+    X = np.array([[90, 42, 43, 20.8, 82, 6.5, 202.9]])
+    cache.predict_proba(X, "v1", score)
+    cache.predict_proba(X, "v2", score)
+    assert len(score.rows) == 2
+    cache.invalidate("v1")
+    assert cache.stats()["entrees"] == 1
+
+
+def test_quantized_cells_share_one_evaluation():
+    cache = QuantizedLRUCache(FEATURE_NAMES, SENSOR_RESOLUTIONS)
+    score = CountingScore()
+    assert not cache.exact
+    X = np.array([[90.1, 42, 43, 20.8, 82, 6.5, 202.9], [90.2, 42, 43, 20.8, 82, 6.5, 202.9]])
+    out = cache.predict_proba(X, "v1", score)
+    assert len(score.rows) == 1
+    np.testing.assert_array_equal(out[0], out[1])
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from batch_processor import FEATURE_NAMES, samples_to_matrix
+from validation import ColumnarValidationError, columns_to_matrix, range_errors
+
+SAMPLE = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82, "ph": 6.5, "rainfall": 202.9}
+
+
+def columns(n: int = 2, **overrides) -> dict:
+    return {**{f: [SAMPLE[f]] * n for f in FEATURE_NAMES}, **overrides}
+
+
+def test_samples_to_matrix_follows_feature_order():
+    shuffled = dict(reversed(list(SAMPLE.items())))
+    X = samples_to_matrix([shuffled, SAMPLE])
+    assert X.shape == (2, 7)
+    np.testing.assert_array_equal(X[0], [SAMPLE[f] for f in FEATURE_NAMES])
+    assert samples_to_matrix([]).shape == (0, 7)
+
+
+def test_samples_to_matrix_missing_field_raises():
+    with pytest.raises(KeyError):
+        samples_to_matrix([{k: v for k, v in SAMPLE.items() if k != "ph"}])
+
+
+def test_columns_to_matrix_round_trip():
+    X = columns_to_matrix(columns(3), max_rows=10)
+    np.testing.assert_array_equal(X, samples_to_matrix([SAMPLE] * 3))
+
+
+@pytest.mark.parametrize("body, loc, kind", [
+    ([1, 2],                                   ["body"],                "dict_type"),
+    ({f: [1] for f in FEATURE_NAMES[1:]},      ["body", "N"],           "missing"),
+    (columns(ph=6.5),                          ["body", "ph"],          "list_type"),
+    (columns(ph=[6.5]),                        ["body", "ph"],          "value_error"),
+    (columns(ph=[6.5, "acide"]),               ["body", "ph", 1],       "float_type"),
+    (columns(ph=[6.5, 15]),                    ["body", "ph", 1],       "value_error"),
+    (columns(rainfall=[None, 10]),             ["body", "rainfall", 0], "float_type"),
+])
+def test_columns_to_matrix_errors(body, loc, kind):
+    with pytest.raises(ColumnarValidationError) as info:
+        columns_to_matrix(body, max_rows=10)
+    assert [(e["loc"], e["type"]) for e in info.value.detail()][0] == (loc, kind)
+
+
+def test_columns_to_matrix_row_cap():
+    with pytest.raises(ColumnarValidationError):
+        columns_to_matrix(columns(11), max_rows=10)
+    with pytest.raises(ColumnarValidationError):
+        columns_to_matrix(columns(0), max_rows=10)
+
+
+def test_range_errors_bounds():
+    X = samples_to_matrix([SAMPLE, {**SAMPLE, "N": 0, "humidity": 100}, {**SAMPLE, "temperature": 51}])
+    assert range_errors(X) == [(1, "N", "doit être > 0"),
+                               (2, "temperature", "Température hors plage agricole (-10 °C à 50 °C).")]
@@ -0,0 +1,318 @@
+"""
+train_compact_model.py — Forêt compressée sous budget de latence
+=================================================================
+train_top3_model.ipynb entraîne une forêt de 200 arbres sans limite de
+profondeur : taille et latence du modèle servi sont subies. Ce script
+explore l'espace (nombre d'arbres × profondeur × taille des feuilles),
+mesure chaque candidat et exporte le plus petit modèle qui respecte un
+budget de latence et un plancher de précision.
+
+Découpage (même graine et même test stratifié de 20 % que le notebook) :
+   → entraînement : 80 % du reste ;
+   → validation   : 20 % du reste — ordre de sélection des arbres et
+                    contraintes (aucune fuite vers le test) ;
+   → test         : précision rapportée, jamais utilisée pour choisir.
+
+Candidats : pour chaque (max_depth, min_samples_leaf), une forêt du nombre
+d'arbres maximal est entraînée une fois, puis réduite à k arbres :
+   → "prefixe" : les k premiers arbres (forêt de k arbres, à l'identique) ;
+   → "glouton" : sélection avant, arbre par arbre, de celui qui minimise
+                 la log-vraisemblance négative de la classe vraie sur la
+                 validation (élagage d'ensemble).
+
+Mesures par candidat : précision Top-1 / Top-3 (validation, test), latence
+p50 / p99 de `CompiledForest.predict_proba` sur un lot (taille `--batch`,
+chemin de service), octets des tableaux de l'artefact. Le rapport liste le
+front de Pareto (Top-3 ↑, p99 ↓, octets ↓) ; le modèle retenu est écrit au
+format du bundle pickle + artefact attendu par `_load_bundle`.
+
+Usage :
+    python train_compact_model.py --latency-ms 0.5 --min-top3 0.95
+    python train_compact_model.py --trees 10,25,50 --depths none,10 --leaves 1,5 --report /tmp/r.json
+    # puis : PUT /admin/models/compact {"pickle_path": ..., "artifact_dir": ...}
+"""
+
+import argparse
+import copy
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+from forest_engine import CompiledForest
+from model_artifact import ENGINE_ARRAYS, export_artifact
+
+FEATURES     = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+TARGET       = "label"
+RANDOM_SEED  = 42
+SELECTIONS   = ("prefixe", "glouton")
+REFERENCES   = [
+    "[1] FAO. Crop Production Guidelines and Soil Management in Tropical Regions.",
+    "[2] IITA. Crop and Soil Fertility Management Practices in Sub-Saharan Africa.",
+    "[3] IRAD. Fiches techniques des cultures vivrières et de rente au Cameroun.",
+    "[4] CIRAD. Agronomic Practices in Tropical Agriculture.",
+]
+
+
+# ─── Données ─────────────────────────────────────────────────────────────────
+def load_splits(dataset: str, seed: int = RANDOM_SEED) -> dict:
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+
+    from dataset_store import load_dataset
+
+    df = load_dataset(dataset, FEATURES + [TARGET])
+    X  = df[FEATURES].to_numpy(dtype=np.float64)
+    le = LabelEncoder()
+    y  = le.fit_transform(df[TARGET].astype(str))
+
+    X_rest, X_test, y_rest, y_test = train_test_split(X, y, test_size=0.2, random_state=seed, stratify=y)
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_rest, y_rest, test_size=0.2, random_state=seed, stratify=y_rest)
+    return {"label_encoder": le, "X": X, "y": y,
+            "train": (X_train, y_train), "val": (X_val, y_val), "test": (X_test, y_test)}
+
+
+# ─── Mesures ─────────────────────────────────────────────────────────────────
+def top_k_accuracy(proba: np.ndarray, y: np.ndarray, k: int = 3) -> float:
+    top = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+    return float((top == y[:, None]).any(axis=1).mean())
+
+
+def tree_probas(forest, X: np.ndarray) -> np.ndarray:
+    """Probabilités de chaque arbre, shape (arbres, lignes, classes)."""
+    return np.stack([est.predict_proba(X) for est in forest.estimators_])
+
+
+def greedy_order(per_tree: np.ndarray, y: np.ndarray, n: int) -> list:
+    """
+    Sélection avant : à chaque pas, l'arbre dont l'ajout minimise la
+    log-vraisemblance négative moyenne de la classe vraie. O(arbres × lignes)
+    par pas, sur les seules probabilités de la classe vraie.
+    """
+    p_true    = per_tree[:, np.arange(len(y)), y]          # (arbres, lignes)
+    running   = np.zeros(len(y))
+    remaining = np.ones(len(p_true), dtype=bool)
+    order     = []
+    for k in range(1, n + 1):
+        nll = -np.log((running[None, :] + p_true) / k + 1e-9).mean(axis=1)
+        nll[~remaining] = np.inf
+        best = int(np.argmin(nll))
+        order.append(best)
+        remaining[best] = False
+        running += p_true[best]
+    return order
+
+
+def subset_forest(forest, indices: list):
+    """Copie de la forêt réduite aux arbres `indices` (modèle sklearn valide)."""
+    subset = copy.copy(forest)
+    subset.estimators_  = [forest.estimators_[i] for i in indices]
+    subset.n_estimators = len(indices)
+    return subset
+
+
+def engine_bytes(engine: CompiledForest) -> int:
+    return int(sum(getattr(engine, name).nbytes for name in ENGINE_ARRAYS))
+
+
+def batch_latency(engine: CompiledForest, X: np.ndarray, batch: int, repeat: int, seed: int = 0) -> dict:
+    """p50 / p99 (ms) de predict_proba sur des lots de `batch` lignes tirés de X."""
+    rng    = np.random.default_rng(seed)
+    starts = rng.integers(0, len(X) - batch + 1, size=repeat)
+    for start in starts[:10]:
+        engine.predict_proba(X[start:start + batch])       # préchauffage
+    times = np.empty(repeat)
+    for i, start in enumerate(starts):
+        t0 = time.perf_counter()
+        engine.predict_proba(X[start:start + batch])
+        times[i] = time.perf_counter() - t0
+    return {"p50_ms": round(float(np.percentile(times, 50)) * 1000, 4),
+            "p99_ms": round(float(np.percentile(times, 99)) * 1000, 4)}
+
+
+# ─── Recherche ───────────────────────────────────────────────────────────────
+def search(splits: dict, trees: list, depths: list, leaves: list, selections: tuple = SELECTIONS,
+           batch: int = 1, repeat: int = 300, seed: int = RANDOM_SEED, log=print) -> tuple:
+    """
+    Returns:
+        (candidats, forêts) — candidats : liste de dicts de mesures ;
+        forêts[id] : forêt sklearn réduite du candidat.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    X_train, y_train = splits["train"]
+    X_val, y_val     = splits["val"]
+    X_test, y_test   = splits["test"]
+    n_max            = max(trees)
+    candidates, forests = [], {}
+
+    for depth in depths:
+        for leaf in leaves:
+            started = time.perf_counter()
+            forest  = RandomForestClassifier(n_estimators=n_max, max_depth=depth, min_samples_leaf=leaf,
+                                             random_state=seed, n_jobs=-1).fit(X_train, y_train)
+            val_trees  = tree_probas(forest, X_val)
+            test_trees = tree_probas(forest, X_test)
+            orders = {"prefixe": list(range(n_max))}
+            if "glouton" in selections:
+                orders["glouton"] = greedy_order(val_trees, y_val, n_max)
+            log(f"── max_depth={depth} min_samples_leaf={leaf} : "
+                f"{n_max} arbres en {time.perf_counter() - started:.1f} s")
+
+            for selection in selections:
+                for k in sorted(trees):
+                    if selection == "glouton" and k == n_max:
+                        continue                    # mêmes arbres que le préfixe complet
+                    indices   = orders[selection][:k]
+                    subset    = subset_forest(forest, indices)
+                    engine    = CompiledForest.from_sklearn(subset)
+                    val_proba = val_trees[indices].mean(axis=0)
+                    candidate = {
+                        "id":               len(candidates),
+                        "max_depth":        depth,
+                        "min_samples_leaf": leaf,
+                        "selection":        selection,
+                        "n_trees":          k,
+                        "profondeur":       engine.max_depth,
+                        "noeuds":           int(len(engine.feature)),
+                        "top1_val":         round(float((val_proba.argmax(1) == y_val).mean()), 4),
+                        "top3_val":         round(top_k_accuracy(val_proba, y_val), 4),
+                        "top3_test":        round(top_k_accuracy(test_trees[indices].mean(axis=0), y_test), 4),
+                        "octets":           engine_bytes(engine),
+                        **batch_latency(engine, X_val, batch, repeat),
+                    }
+                    candidates.append(candidate)
+                    forests[candidate["id"]] = subset
+    mark_pareto(candidates)
+    return candidates, forests
+
+
+def mark_pareto(candidates: list):
+    """Front de Pareto : aucun autre candidat n'est meilleur ou égal partout et strictement meilleur quelque part."""
+    keys = np.array([[-c["top3_val"], c["p99_ms"], c["octets"]] for c in candidates])
+    for i, c in enumerate(candidates):
+        dominated = ((keys <= keys[i]).all(axis=1) & (keys < keys[i]).any(axis=1)).any()
+        c["pareto"] = not bool(dominated)
+
+
+def choose(candidates: list, latency_ms: float, min_top3: float):
+    """Plus petit modèle (octets) sous le budget p99 et au-dessus du plancher Top-3 (validation)."""
+    feasible = [c for c in candidates if c["p99_ms"] <= latency_ms and c["top3_val"] >= min_top3]
+    if not feasible:
+        return None
+    return min(feasible, key=lambda c: (c["octets"], -c["top3_val"], c["p99_ms"]))
+
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+def export(forest, candidate: dict, splits: dict, pickle_path: str, artifact_dir: str,
+           constraints: dict, cv: int = 5) -> dict:
+    """Écrit le bundle (mêmes clés que le notebook) et son artefact mappable."""
+    X_test, y_test = splits["test"]
+    le             = splits["label_encoder"]
+    bundle = {
+        "model":          forest,
+        "label_encoder":  le,
+        "feature_names":  FEATURES,
+        "classes":        list(le.classes_),
+        "test_accuracy":  float((forest.predict(X_test) == y_test).mean()),
+        "top_k":          3,
+        "units":          "N, P, K en mg/kg",
+        "references":     REFERENCES,
+        "training":       {"candidat": candidate, "contraintes": constraints},
+    }
+    if cv > 1:
+        # Validation croisée de la configuration (forêt de n_trees arbres, sans sélection)
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import cross_val_score
+
+        scores = cross_val_score(
+            RandomForestClassifier(n_estimators=candidate["n_trees"], max_depth=candidate["max_depth"],
+                                   min_samples_leaf=candidate["min_samples_leaf"],
+                                   random_state=RANDOM_SEED, n_jobs=-1),
+            splits["X"], splits["y"], cv=cv, scoring="accuracy", n_jobs=-1)
+        bundle["cv_accuracy_mean"] = float(scores.mean())
+        bundle["cv_accuracy_std"]  = float(scores.std())
+
+    os.makedirs(os.path.dirname(pickle_path) or ".", exist_ok=True)
+    with open(pickle_path, "wb") as f:
+        pickle.dump(bundle, f)
+    header = export_artifact(bundle, artifact_dir, source_path=pickle_path)
+    return {"version": header["version"], "test_accuracy": bundle["test_accuracy"],
+            "cv_accuracy_mean": bundle.get("cv_accuracy_mean")}
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+def _int_list(spec: str) -> list:
+    return [int(v) for v in spec.split(",") if v.strip()]
+
+
+def _depth_list(spec: str) -> list:
+    return [None if v.strip().lower() == "none" else int(v) for v in spec.split(",") if v.strip()]
+
+
+def _print_table(rows: list):
+    print(f"   {'id':>4s} {'depth':>5s} {'leaf':>4s} {'sélection':>9s} {'arbres':>6s} "
+          f"{'top3 val':>8s} {'top3 test':>9s} {'p99 ms':>8s} {'Kio':>9s}")
+    for c in rows:
+        print(f"   {c['id']:4d} {str(c['max_depth']):>5s} {c['min_samples_leaf']:4d} {c['selection']:>9s} "
+              f"{c['n_trees']:6d} {c['top3_val'] * 100:7.2f}% {c['top3_test'] * 100:8.2f}% "
+              f"{c['p99_ms']:8.3f} {c['octets'] / 1024:9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recherche d'une forêt compacte sous budget de latence.")
+    parser.add_argument("--dataset", default="data/research_based_dataset.csv")
+    parser.add_argument("--trees", default="10,25,50,100,200", help="Nombres d'arbres candidats.")
+    parser.add_argument("--depths", default="none,8,12,16", help="max_depth candidats (none = illimité).")
+    parser.add_argument("--leaves", default="1,2,5,10", help="min_samples_leaf candidats.")
+    parser.add_argument("--selection", default=",".join(SELECTIONS),
+                        help="Réduction de la forêt : prefixe, glouton ou les deux.")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="Budget p99 d'un lot (ms).")
+    parser.add_argument("--min-top3", type=float, default=0.95, help="Plancher de précision Top-3 (validation).")
+    parser.add_argument("--batch", type=int, default=1, help="Taille du lot mesuré (1–10 en service).")
+    parser.add_argument("--repeat", type=int, default=300, help="Lots mesurés par candidat.")
+    parser.add_argument("--cv", type=int, default=5, help="Plis de validation croisée du modèle exporté (0 = aucun).")
+    parser.add_argument("--report", default="model/compact_search.json")
+    parser.add_argument("--out-pickle", default="model/top3_crop_model_compact.pkl")
+    parser.add_argument("--out-artifact", default="model/top3_crop_model_compact.artifact")
+    args = parser.parse_args()
+
+    selections = tuple(s for s in args.selection.split(",") if s)
+    unknown    = set(selections) - set(SELECTIONS)
+    if unknown:
+        parser.error(f"Sélection inconnue : {', '.join(sorted(unknown))}.")
+
+    splits = load_splits(args.dataset)
+    print(f"Dataset : {args.dataset} — entraînement {len(splits['train'][1])}, "
+          f"validation {len(splits['val'][1])}, test {len(splits['test'][1])}")
+    candidates, forests = search(splits, _int_list(args.trees), _depth_list(args.depths),
+                                 _int_list(args.leaves), selections, args.batch, args.repeat)
+
+    pareto = sorted((c for c in candidates if c["pareto"]), key=lambda c: c["octets"])
+    print(f"\n── Front de Pareto ({len(pareto)} / {len(candidates)} candidats ; lot de {args.batch})")
+    _print_table(pareto)
+
+    constraints = {"latency_p99_ms": args.latency_ms, "min_top3": args.min_top3, "batch": args.batch}
+    chosen      = choose(candidates, args.latency_ms, args.min_top3)
+    report      = {"dataset": args.dataset, "contraintes": constraints, "candidats": candidates,
+                   "retenu": chosen["id"] if chosen else None}
+
+    if chosen is None:
+        print(f"\n✘ Aucun candidat ne respecte p99 ≤ {args.latency_ms} ms et Top-3 ≥ {args.min_top3:.2%}.")
+    else:
+        print(f"\n── Retenu : candidat {chosen['id']}")
+        _print_table([chosen])
+        report["export"] = export(forests[chosen["id"]], chosen, splits, args.out_pickle,
+                                  args.out_artifact, constraints, args.cv)
+        print(f"\n✔ Bundle : {args.out_pickle} | artefact : {args.out_artifact} "
+              f"(version {report['export']['version']}, accuracy test {report['export']['test_accuracy']:.2%})")
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✔ Rapport : {args.report}")
+    if chosen is None:
+        raise SystemExit(1)
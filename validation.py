@@ -0,0 +1,151 @@
+"""
+validation.py — Contrôles de plage vectorisés sur la matrice de features
+=========================================================================
+Mêmes règles que le schéma `SoilSample` de app.py, appliquées en une
+passe NumPy sur des colonnes entières au lieu d'un objet par échantillon :
+
+   N, P, K, rainfall > 0 | humidity ∈ [0, 100] | ph ∈ [0, 14]
+   temperature ∈ [-10, 50]
+
+`columns_to_matrix` valide aussi le schéma colonnaire de POST /predict/columns
+(une liste de valeurs par feature) et construit directement la matrice
+d'inférence, sans objet intermédiaire par échantillon.
+"""
+
+import numpy as np
+
+from batch_processor import FEATURE_NAMES
+
+# (borne basse, borne haute, basse incluse ?, message)
+FEATURE_BOUNDS = {
+    "N":           (0,   None, False, "doit être > 0"),
+    "P":           (0,   None, False, "doit être > 0"),
+    "K":           (0,   None, False, "doit être > 0"),
+    "temperature": (-10, 50,   True,  "Température hors plage agricole (-10 °C à 50 °C)."),
+    "humidity":    (0,   100,  True,  "doit être compris entre 0 et 100"),
+    "ph":          (0,   14,   True,  "doit être compris entre 0 et 14"),
+    "rainfall":    (0,   None, False, "doit être > 0"),
+}
+
+
+def invalid_mask(column: np.ndarray, feature: str) -> np.ndarray:
+    """Masque booléen des valeurs hors plage (ou non finies) d'une colonne."""
+    low, high, inclusive, _ = FEATURE_BOUNDS[feature]
+    bad = ~np.isfinite(column)
+    bad |= (column < low) if inclusive else (column <= low)
+    if high is not None:
+        bad |= column > high
+    return bad
+
+
+def range_errors(X: np.ndarray) -> list:
+    """
+    Vérifie toutes les colonnes de X (ordre FEATURE_NAMES).
+
+    Returns:
+        liste triée de (indice_ligne, feature, message), vide si tout est valide.
+    """
+    errors = []
+    for j, feature in enumerate(FEATURE_NAMES):
+        rows = np.flatnonzero(invalid_mask(X[:, j], feature))
+        message = FEATURE_BOUNDS[feature][3]
+        errors.extend((int(i), feature, message) for i in rows)
+    errors.sort()
+    return errors
+
+
+# ─── Schéma colonnaire ───────────────────────────────────────────────────────
+MAX_REPORTED_ERRORS = 100   # au-delà, les erreurs sont résumées en une entrée
+
+
+class ColumnarValidationError(ValueError):
+    """
+    Corps colonnaire invalide. `errors` suit le format des erreurs 422 de
+    FastAPI : {"loc": ["body", feature, ligne], "msg": ..., "type": ...}.
+    """
+
+    def __init__(self, errors: list):
+        super().__init__(f"{len(errors)} erreur(s) de validation")
+        self.errors = errors
+
+    def detail(self) -> list:
+        if len(self.errors) <= MAX_REPORTED_ERRORS:
+            return self.errors
+        return self.errors[:MAX_REPORTED_ERRORS] + [{
+            "loc":  ["body"],
+            "msg":  f"… et {len(self.errors) - MAX_REPORTED_ERRORS} autre(s) erreur(s)",
+            "type": "value_error",
+        }]
+
+
+def _error(loc: list, msg: str, kind: str = "value_error", value=None) -> dict:
+    error = {"loc": ["body", *loc], "msg": msg, "type": kind}
+    if value is not None:
+        error["input"] = value
+    return error
+
+
+def _not_a_number(value) -> bool:
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return True
+    return False
+
+
+def columns_to_matrix(columns, max_rows: int = None) -> np.ndarray:
+    """
+    {feature: [valeurs]} → matrice (n, 7) float64, ordre FEATURE_NAMES.
+
+    Chaque colonne est écrite une seule fois dans la matrice préallouée, puis
+    les plages sont contrôlées par `range_errors` sur les colonnes entières.
+    La matrice renvoyée est passée telle quelle à l'inférence.
+
+    Raises:
+        ColumnarValidationError: feature absente, longueurs différentes, valeur
+            non numérique ou hors plage (avec l'indice de ligne et le champ).
+    """
+    if not isinstance(columns, dict):
+        raise ColumnarValidationError([_error([], "Le corps doit être un objet {feature: [valeurs]}.",
+                                              "dict_type")])
+
+    errors = []
+    for f in FEATURE_NAMES:
+        if f not in columns:
+            errors.append(_error([f], "Champ requis.", "missing"))
+        elif not isinstance(columns[f], list):
+            errors.append(_error([f], "Doit être une liste de nombres.", "list_type"))
+    if errors:
+        raise ColumnarValidationError(errors)
+
+    n = len(columns[FEATURE_NAMES[0]])
+    for f in FEATURE_NAMES[1:]:
+        if len(columns[f]) != n:
+            errors.append(_error([f], f"Longueur {len(columns[f])} différente de celle de "
+                                      f"{FEATURE_NAMES[0]} ({n})."))
+    if n == 0 or (max_rows is not None and n > max_rows):
+        errors.append(_error([], f"Le lot doit contenir entre 1 et {max_rows or 'n'} échantillons (reçu : {n})."))
+    if errors:
+        raise ColumnarValidationError(errors)
+
+    X = np.empty((n, len(FEATURE_NAMES)), dtype=np.float64)
+    for j, f in enumerate(FEATURE_NAMES):
+        values = columns[f]
+        try:
+            X[:, j] = values
+        except (TypeError, ValueError):
+            # Chemin lent, uniquement en cas d'erreur : localiser les lignes fautives
+            errors.extend(_error([f, i], "Doit être un nombre.", "float_type", v)
+                          for i, v in enumerate(values) if _not_a_number(v))
+    if errors:
+        raise ColumnarValidationError(errors)
+
+    bad = range_errors(X)
+    if bad:
+        for i, f, message in bad:
+            value = float(X[i, FEATURE_NAMES.index(f)])
+            # null est converti en NaN par NumPy : signalé comme valeur non numérique
+            errors.append(_error([f, i], message, value=value) if np.isfinite(value)
+                          else _error([f, i], "Doit être un nombre fini.", "float_type"))
+        raise ColumnarValidationError(errors)
+    return X
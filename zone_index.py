@@ -0,0 +1,314 @@
+"""
+zone_index.py — Index précalculé de recommandations par zone agro-écologique
+============================================================================
+Beaucoup d'utilisateurs ne connaissent que leur zone (`foret_humide`,
+`savane`, …) et une ou deux mesures. La colonne `zone` de
+cameroon_crop_recommendation_dataset.csv sert ici à précalculer hors ligne,
+pour chaque zone :
+
+   → la distribution des 7 features (moyenne, écart-type, quantiles) ;
+   → le Top-3 « zone seule » : probabilités RF moyennées sur les
+     échantillons de la zone (les features inconnues suivent la zone) ;
+   → pour chaque feature, une table de dépendance partielle : probabilités
+     RF moyennées sur la zone, la feature étant fixée à chacun des nœuds
+     (quantiles 2,5 % → 97,5 % de la zone).
+
+En service, une requête zone + features partielles combine les tables des
+features connues (hypothèse d'indépendance conditionnelle à la zone) :
+
+   log p(c | zone, x_J) = log p(c | zone) + Σ_j∈J [log p(c | zone, x_j) − log p(c | zone)]
+
+avec interpolation linéaire entre les nœuds : aucune évaluation de la forêt
+par requête. Les tables sont construites sur 80 % des lignes de chaque zone ;
+le recouvrement avec la RF exacte (Top-1 exact dans le Top-3 de l'index) est
+mesuré sur les 20 % restants et stocké dans l'en-tête JSON.
+
+L'index est lié au modèle qui l'a construit (`model_version` de l'en-tête) :
+si le modèle servi change (rechargement à chaud, réentraînement), les
+requêtes partielles sont refusées (409) jusqu'à reconstruction de l'index.
+
+Usage :
+    python zone_index.py                                 # index par défaut
+    python zone_index.py --nodes 16 --samples 600
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from batch_processor import FEATURE_NAMES, _confidences, _load_bundle, _topk_indices, model_error
+
+INDEX_PATH    = "model/zone_index.npy"
+HEADER_PATH   = "model/zone_index.json"
+ZONE_DATASET  = "data/cameroon_crop_recommendation_dataset.csv"
+ZONE_COLUMN   = "zone"
+DEFAULT_NODES   = 12      # nœuds par feature et par zone
+DEFAULT_SAMPLES = 400     # échantillons de la zone moyennés par nœud
+QUANTILES     = (0.10, 0.25, 0.50, 0.75, 0.90)
+TEST_SIZE     = 0.2       # part de chaque zone réservée à la mesure d'accord
+_EPS          = 1e-6      # plancher des probabilités (log)
+
+
+class UnknownZoneError(KeyError):
+    """Zone absente de l'index."""
+
+
+# ─── Construction ────────────────────────────────────────────────────────────
+def _zone_stats(X: np.ndarray) -> dict:
+    q = np.quantile(X, QUANTILES, axis=0)
+    return {
+        f: {
+            "n":          int(len(X)),
+            "moyenne":    round(float(X[:, j].mean()), 4),
+            "ecart_type": round(float(X[:, j].std(ddof=1)) if len(X) > 1 else 0.0, 4),
+            "min":        round(float(X[:, j].min()), 4),
+            "max":        round(float(X[:, j].max()), 4),
+            **{f"p{int(p * 100)}": round(float(q[i, j]), 4) for i, p in enumerate(QUANTILES)},
+        }
+        for j, f in enumerate(FEATURE_NAMES)
+    }
+
+
+def _split(df, zone_column: str, seed: int, test_size: float = TEST_SIZE) -> tuple:
+    """(construction, test) : `test_size` des lignes de chaque zone mises de côté."""
+    rng  = np.random.default_rng(seed)
+    test = np.zeros(len(df), dtype=bool)
+    for rows in df.groupby(df[zone_column].astype(str)).indices.values():
+        test[rng.choice(rows, int(round(len(rows) * test_size)), replace=False)] = True
+    return df[~test], df[test]
+
+
+def build_index(dataset: str = ZONE_DATASET, zone_column: str = ZONE_COLUMN,
+                nodes: int = DEFAULT_NODES, samples: int = DEFAULT_SAMPLES, seed: int = 42,
+                index_path: str = INDEX_PATH, header_path: str = HEADER_PATH) -> dict:
+    """
+    Évalue la forêt sur les échantillons de chaque zone (feature par feature,
+    à chaque nœud) et écrit les tables (float16) dans `index_path`. Seule la
+    part de construction du dataset est utilisée (cf. `_split`, même `seed`
+    que `evaluate_agreement`).
+
+    Returns:
+        l'en-tête (dict) écrit dans `header_path`.
+    """
+    from dataset_store import load_dataset
+
+    bundle  = _load_bundle()
+    engine  = bundle["engine"]
+    classes = list(bundle["classes"])
+    df, _   = _split(load_dataset(dataset, FEATURE_NAMES + [zone_column]).dropna(), zone_column, seed)
+    zones   = sorted(df[zone_column].astype(str).unique())
+    rng     = np.random.default_rng(seed)
+
+    n_feat  = len(FEATURE_NAMES)
+    table   = np.empty((len(zones), n_feat, nodes, len(classes)), dtype=np.float16)
+    base    = np.empty((len(zones), len(classes)))
+    grid    = np.empty((len(zones), n_feat, nodes))
+    stats   = {}
+    started = time.perf_counter()
+    for z, zone in enumerate(zones):
+        X_zone = df.loc[df[zone_column].astype(str) == zone, FEATURE_NAMES].to_numpy(dtype=np.float64)
+        X      = X_zone[rng.choice(len(X_zone), samples, replace=False)] if len(X_zone) > samples else X_zone
+        stats[zone] = _zone_stats(X_zone)
+        base[z]     = engine.predict_proba(X).mean(axis=0)
+        grid[z]     = np.quantile(X_zone, np.linspace(0.025, 0.975, nodes), axis=0).T
+        for j in range(n_feat):
+            # Dépendance partielle : feature j fixée à chaque nœud, les autres suivent la zone
+            X_rep = np.repeat(X[None], nodes, axis=0)
+            X_rep[:, :, j] = grid[z, j][:, None]
+            table[z, j] = engine.predict_proba(X_rep.reshape(-1, n_feat)).reshape(nodes, len(X), -1).mean(axis=1)
+        print(f"  {zone:16s} {len(X_zone):6d} échantillons", flush=True)
+    np.save(index_path, table)
+
+    header = {
+        "format":        1,
+        "model_version": bundle["version"],
+        "classes":       classes,
+        "feature_names": FEATURE_NAMES,
+        "zones":         zones,
+        "source":        dataset,
+        "split":         {"seed": seed, "test": TEST_SIZE},
+        "noeuds":        grid.round(6).tolist(),
+        "base":          base.round(6).tolist(),
+        "distributions": stats,
+        "build_s":       round(time.perf_counter() - started, 1),
+    }
+    _write_header(header, header_path)
+    return header
+
+
+def _write_header(header: dict, header_path: str):
+    with open(header_path, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+
+
+# ─── Lecture ─────────────────────────────────────────────────────────────────
+class ZoneIndex:
+    """Index par zone chargé en mémoire (quelques dizaines de Kio)."""
+
+    def __init__(self, index_path: str = INDEX_PATH, header_path: str = HEADER_PATH):
+        with open(header_path, encoding="utf-8") as f:
+            self.header = json.load(f)
+        self.classes  = self.header["classes"]
+        self.zones    = self.header["zones"]
+        self._zone_id = {zone: z for z, zone in enumerate(self.zones)}
+        self.nodes    = np.asarray(self.header["noeuds"])                 # (Z, F, B)
+        self.log_base = np.log(np.asarray(self.header["base"]) + _EPS)    # (Z, C)
+        self.log_pd   = np.log(np.load(index_path).astype(np.float64) + _EPS)  # (Z, F, B, C)
+
+    def zone_ids(self, zones) -> np.ndarray:
+        try:
+            return np.array([self._zone_id[z] for z in zones], dtype=np.intp)
+        except KeyError as exc:
+            raise UnknownZoneError(exc.args[0]) from None
+
+    def predict_proba(self, zones, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilités pour des zones et des features partielles.
+
+        Args:
+            zones: noms de zone, un par ligne.
+            X:     (n, 7) dans l'ordre FEATURE_NAMES, NaN = feature inconnue.
+        """
+        z     = self.zone_ids(zones)
+        X     = np.asarray(X, dtype=np.float64).reshape(len(z), len(FEATURE_NAMES))
+        log_p = self.log_base[z].copy()
+        B     = self.nodes.shape[2]
+        for j in range(X.shape[1]):
+            rows = np.flatnonzero(~np.isnan(X[:, j]))
+            for zone in np.unique(z[rows]):
+                sel  = rows[z[rows] == zone]
+                pos  = np.interp(X[sel, j], self.nodes[zone, j], np.arange(B))
+                low  = np.minimum(pos.astype(np.intp), B - 2)
+                frac = (pos - low)[:, None]
+                pd_j = (1 - frac) * self.log_pd[zone, j, low] + frac * self.log_pd[zone, j, low + 1]
+                log_p[sel] += pd_j - self.log_base[zone]
+        proba = np.exp(log_p - log_p.max(axis=1, keepdims=True))
+        return proba / proba.sum(axis=1, keepdims=True)
+
+    def out_of_distribution(self, zone: str, features: dict) -> list:
+        """Features connues hors de l'intervalle des nœuds de la zone (valeur bornée)."""
+        z = self._zone_id[zone]
+        return [f for f, v in features.items()
+                if not self.nodes[z, FEATURE_NAMES.index(f), 0] <= v <= self.nodes[z, FEATURE_NAMES.index(f), -1]]
+
+
+_index = None
+
+
+def get_zone_index() -> ZoneIndex:
+    """Index chargé paresseusement (une fois par processus)."""
+    global _index
+    if _index is None:
+        _index = ZoneIndex()
+    return _index
+
+
+def predict_zone(zone: str, features: dict) -> dict:
+    """
+    Top-3 pour une zone et des features partielles ({feature: valeur}, sans None).
+
+    Refusée ({"error", "status": 409}) si l'index n'a pas été construit avec
+    le modèle actuellement servi (même contrôle que la grille).
+
+    Raises:
+        UnknownZoneError: zone absente de l'index.
+    """
+    try:
+        index = get_zone_index()
+    except FileNotFoundError:
+        return {"error": f"Index des zones introuvable : '{INDEX_PATH}'. Lancez d'abord build_models.py."}
+    try:
+        served = _load_bundle()["version"]
+        if index.header["model_version"] != served:
+            return {
+                "error": (f"Index des zones construit pour le modèle {index.header['model_version']}, "
+                          f"modèle servi : {served}. Relancez zone_index.py."),
+                "status": 409,
+            }
+        x      = np.array([[features.get(f, np.nan) for f in FEATURE_NAMES]], dtype=np.float64)
+        proba  = index.predict_proba([zone], x)
+        idx    = _topk_indices(proba)
+        conf   = _confidences(proba, idx)
+        known  = [f for f in FEATURE_NAMES if f in features]
+        typical = index.header["distributions"][zone]
+        return {
+            "zone":              zone,
+            "features_connues":  known,
+            "top3": [
+                {"rang": r + 1, "culture": index.classes[j], "confiance": c}
+                for r, (j, c) in enumerate(zip(idx[0].tolist(), conf[0].tolist()))
+            ],
+            "hors_distribution": index.out_of_distribution(zone, features),
+            "valeurs_typiques":  {f: {k: typical[f][k] for k in ("p10", "p50", "p90")}
+                                  for f in FEATURE_NAMES if f not in features},
+            "approximation": {
+                "methode":          "index_zone",
+                "recouvrement_top1": index.header.get("accord", {}).get(str(len(known))),
+                "model_version":    index.header["model_version"],
+            },
+        }
+    except UnknownZoneError:
+        raise
+    except Exception as exc:
+        return model_error(exc)
+
+
+# ─── Accord avec la RF exacte ────────────────────────────────────────────────
+def evaluate_agreement(index: ZoneIndex, dataset: str = ZONE_DATASET, zone_column: str = ZONE_COLUMN,
+                       seed: int = 42) -> dict:
+    """
+    Part des échantillons dont le Top-1 de la RF exacte (vecteur complet) est
+    dans le Top-3 de l'index, selon le nombre de features connues (tirées au
+    hasard, 0 = zone seule). Mesurée sur la part de test de `_split` (lignes
+    absentes de la construction, même `seed` que `build_index`).
+
+    Returns:
+        {"0": taux, "1": taux, …, "6": taux}
+    """
+    from dataset_store import load_dataset
+
+    _, df = _split(load_dataset(dataset, FEATURE_NAMES + [zone_column]).dropna(), zone_column, seed)
+    X     = df[FEATURE_NAMES].to_numpy(dtype=np.float64)
+    zones = df[zone_column].astype(str).tolist()
+    exact = _load_bundle()["engine"].predict_proba(X).argmax(axis=1)
+    rng   = np.random.default_rng(seed)
+
+    report = {}
+    for k in range(len(FEATURE_NAMES)):
+        hidden = np.argsort(rng.random(X.shape), axis=1)[:, k:]       # 7 − k features masquées
+        X_part = X.copy()
+        np.put_along_axis(X_part, hidden, np.nan, axis=1)
+        top3   = _topk_indices(index.predict_proba(zones, X_part))
+        report[str(k)] = round(float((top3 == exact[:, None]).any(axis=1).mean()), 4)
+    return report
+
+
+def build_and_evaluate(dataset: str = ZONE_DATASET, zone_column: str = ZONE_COLUMN,
+                       nodes: int = DEFAULT_NODES, samples: int = DEFAULT_SAMPLES, seed: int = 42) -> dict:
+    """Construit l'index puis enregistre dans son en-tête l'accord mesuré sur la part de test."""
+    build_index(dataset, zone_column, nodes, samples, seed)
+    index = ZoneIndex()
+    index.header["accord"] = evaluate_agreement(index, dataset, zone_column, seed)
+    _write_header(index.header, HEADER_PATH)
+    return index.header
+
+
+# ─── Point d'entrée ──────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construit l'index de recommandations par zone.")
+    parser.add_argument("--dataset", default=ZONE_DATASET, help="Jeu avec une colonne de zone (.csv, .parquet, .arrow).")
+    parser.add_argument("--zone-column", default=ZONE_COLUMN)
+    parser.add_argument("--nodes", type=int, default=DEFAULT_NODES, help="Nœuds par feature et par zone.")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES, help="Échantillons moyennés par nœud.")
+    args = parser.parse_args()
+
+    print(f"Construction de l'index des zones ({args.nodes} nœuds, {args.samples} échantillons / zone)")
+    header = build_and_evaluate(args.dataset, args.zone_column, args.nodes, args.samples)
+
+    size_kb = (os.path.getsize(INDEX_PATH) + os.path.getsize(HEADER_PATH)) / 1024
+    print(f"✔ Index : {INDEX_PATH} + {HEADER_PATH} ({size_kb:.0f} Kio, zones : {header['zones']})")
+    for k, rate in header["accord"].items():
+        print(f"  {k} feature(s) connue(s) : Top-1 RF dans le Top-3 de l'index {rate * 100:.1f} % (test)")